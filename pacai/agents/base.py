@@ -25,6 +25,9 @@ class BaseAgent(abc.ABC):
         self.index = index
         self.kwargs = kwargs
 
+        # How long this agent can take to move before getting a warning (if known).
+        self._moveWarningTime = None
+
     @abc.abstractmethod
     def getAction(self, state):
         """
@@ -56,6 +59,22 @@ class BaseAgent(abc.ABC):
 
         pass
 
+    def getMoveWarningTime(self):
+        """
+        Get the number of seconds this agent can take to move before the game warns it
+        (or None if this agent is not being run by a game).
+        """
+
+        return self._moveWarningTime
+
+    def setMoveWarningTime(self, seconds):
+        """
+        Called by the game (before `BaseAgent.registerInitialState`)
+        with how long this agent's moves can take.
+        """
+
+        self._moveWarningTime = seconds
+
     @staticmethod
     def loadAgent(name, index, args = {}):
         """
@@ -0,0 +1,527 @@
+import logging
+import math
+import random
+import time
+
+from pacai.agents.capture.capture import CaptureAgent
+from pacai.core import distanceCalculator
+from pacai.core.actions import Actions
+
+# The fraction of the move warning time that a search will use.
+DEFAULT_TIME_FRACTION = 0.5
+
+# The number of moves (by any agent) in a rollout.
+DEFAULT_ROLLOUT_DEPTH = 20
+
+# The exploration constant for UCT (rewards are between zero and one).
+DEFAULT_EXPLORATION = 0.7
+
+# The chance that a rollout move is random instead of following the rollout policy.
+ROLLOUT_EPSILON = 0.1
+
+# Ghosts chase invaders that are this close (in maze distance) during rollouts.
+DEFENSE_RADIUS = 5
+# Pacmen avoid brave ghosts that are this close during rollouts.
+DANGER_RADIUS = 2
+
+# Rollouts are scored as the game score plus how much closer red is to food than blue
+# (weighted by this), and then squashed into a reward between zero and one.
+FOOD_DISTANCE_WEIGHT = 0.05
+REWARD_SCALE = 1.0
+
+class MCTSNode(object):
+    """
+    A node in a Monte Carlo search tree.
+    Nodes do not hold states, the state is rebuilt from the root by applying each node's move.
+
+    A node's value is the total reward for the team of the agent that moved into it.
+    """
+
+    __slots__ = ('children', 'untried', 'value', 'visits')
+
+    def __init__(self):
+        # {action: MCTSNode, ...}
+        self.children = {}
+        # Legal actions that do not have a child yet (None until the node is first visited).
+        self.untried = None
+
+        self.value = 0.0
+        self.visits = 0
+
+class MCTSCaptureAgent(CaptureAgent):
+    """
+    A capture agent that uses Monte Carlo Tree Search (with UCT selection).
+
+    Every agent in the tree (teammates and opponents) picks its own best move.
+    Instead of evaluating states, each new node is scored with a short rollout
+    where every agent follows a cheap policy that only looks up maze distances
+    (from the `pacai.core.distanceCalculator.DistanceMatrix` for the layout):
+    head for the closest food, ghosts chase nearby invaders,
+    and pacmen stay away from nearby ghosts.
+
+    The search runs until it has used `timeFraction` of the game's move warning time
+    (or `moveTime` seconds, if given), or until it has run `simulations` simulations (if positive).
+    The part of the tree that is still reachable is kept for the next move.
+    The number of simulations per second is logged after each move and at the end of the game.
+    """
+
+    def __init__(self, index, moveTime = None, timeFraction = DEFAULT_TIME_FRACTION,
+            simulations = 0, rolloutDepth = DEFAULT_ROLLOUT_DEPTH,
+            exploration = DEFAULT_EXPLORATION, **kwargs):
+        super().__init__(index, **kwargs)
+
+        self._moveTime = None
+        if (moveTime is not None):
+            self._moveTime = float(moveTime)
+
+        self._timeFraction = float(timeFraction)
+        self._maxSimulations = int(simulations)
+        self._rolloutDepth = int(rolloutDepth)
+        self._exploration = float(exploration)
+
+        # The maze distances as a flat matrix, and a map of positions to rows.
+        self._distances = None
+        self._distanceSize = 0
+        self._cellIndexes = None
+        # {position: [(action, next position's row), ...], ...}
+        self._moves = None
+
+        # The tree from the last search, the state it was built from, and the move that was made.
+        self._root = None
+        self._rootState = None
+        self._lastAction = None
+
+        # Food for each team at the root of the current search,
+        # and the closest of it to each position that has been asked about.
+        self._redFood = []
+        self._blueFood = []
+        # {(position, if the eater is red): (distance, food position), ...}
+        self._nearestFood = {}
+
+        self._numSimulations = 0
+        self._searchTime = 0.0
+        self._lastSimulations = 0
+        self._lastSearchTime = 0.0
+        self._lastReused = 0
+
+    def chooseAction(self, gameState):
+        maxSimulations = self._maxSimulations
+        timeLimit = self.getMoveTime()
+        if (maxSimulations <= 0 and timeLimit is None):
+            raise ValueError('%s needs a move time or a number of simulations.'
+                    % (type(self).__name__))
+
+        startTime = time.perf_counter()
+
+        deadline = None
+        if (timeLimit is not None):
+            deadline = startTime + timeLimit
+
+        root = self._reuseTree(gameState)
+        reused = root.visits
+
+        self._redFood = gameState.getRedFood().asList()
+        self._blueFood = gameState.getBlueFood().asList()
+        self._nearestFood = {}
+
+        simulations = 0
+        while (True):
+            self._simulate(gameState, root)
+            simulations += 1
+
+            if (maxSimulations > 0 and simulations >= maxSimulations):
+                break
+
+            if (deadline is not None and time.perf_counter() >= deadline):
+                break
+
+        # The most visited move is the most trusted one.
+        action = max(root.children, key = lambda action: root.children[action].visits)
+
+        timeTaken = time.perf_counter() - startTime
+
+        self._numSimulations += simulations
+        self._searchTime += timeTaken
+        self._lastSimulations = simulations
+        self._lastSearchTime = timeTaken
+        self._lastReused = reused
+
+        logging.debug('Agent %d ran %d simulations in %.3f seconds (%.0f per second, %d reused).'
+                % (self.index, simulations, timeTaken, simulations / timeTaken, reused))
+
+        self._root = root
+        self._rootState = gameState
+        self._lastAction = action
+
+        return action
+
+    # Override
+    def final(self, gameState):
+        super().final(gameState)
+
+        stats = self.getSimulationStats()
+        if (stats['simulations'] > 0):
+            logging.info('Agent %d ran %d simulations in %.2f seconds (%.0f per second).'
+                    % (self.index, stats['simulations'], stats['time'], stats['perSecond']))
+
+        self._root = None
+        self._rootState = None
+        self._lastAction = None
+
+    def getMoveTime(self):
+        """
+        Get the number of seconds a search can take (or None if there is no limit).
+        """
+
+        if (self._moveTime is not None):
+            return self._moveTime
+
+        warningTime = self.getMoveWarningTime()
+        if (warningTime is None):
+            return None
+
+        return warningTime * self._timeFraction
+
+    def getSimulationStats(self):
+        """
+        Get the total number of 'simulations' and the 'time' spent on them (in seconds),
+        the overall simulations 'perSecond', and the same for just the last move
+        ('lastSimulations', 'lastTime', and 'lastPerSecond').
+        'lastReused' is the number of simulations the last move got from the move before it.
+        """
+
+        return {
+            'simulations': self._numSimulations,
+            'time': self._searchTime,
+            'perSecond': _rate(self._numSimulations, self._searchTime),
+            'lastSimulations': self._lastSimulations,
+            'lastTime': self._lastSearchTime,
+            'lastPerSecond': _rate(self._lastSimulations, self._lastSearchTime),
+            'lastReused': self._lastReused,
+        }
+
+    # Override
+    def registerInitialState(self, gameState):
+        super().registerInitialState(gameState)
+
+        layout = gameState.getInitialLayout()
+        matrix = distanceCalculator.getDistanceMatrix(layout)
+
+        self._distances = matrix.getData()
+        self._distanceSize = len(matrix.getCells())
+        self._cellIndexes = {cell: matrix.getIndex(cell) for cell in matrix.getCells()}
+
+        walls = gameState.getWalls()
+        self._moves = {}
+        for cell in matrix.getCells():
+            actions = layout.getPossibleActions(cell)
+            if (actions is None):
+                actions = Actions.getPossibleActions(cell, None, walls)
+
+            self._moves[cell] = [(action, matrix.getIndex(Actions.getSuccessor(cell, action)))
+                    for action in actions]
+
+        self._root = None
+        self._rootState = None
+        self._lastAction = None
+
+        self._numSimulations = 0
+        self._searchTime = 0.0
+
+    def _backpropagate(self, path, redReward):
+        for (node, isRed) in path:
+            node.visits += 1
+            if (isRed):
+                node.value += redReward
+            else:
+                node.value += 1.0 - redReward
+
+    def _distance(self, position1, position2):
+        index1 = self._cellIndexes.get(position1)
+        index2 = self._cellIndexes.get(position2)
+
+        if (index1 is None or index2 is None):
+            return distanceCalculator.DEFAULT_DISTANCE
+
+        return self._distances[index1 * self._distanceSize + index2]
+
+    def _evaluate(self, state):
+        """
+        Get the reward (between zero and one) for the red team.
+        """
+
+        value = state.getScore()
+
+        if (not state.isOver()):
+            distance = 0
+            for agentIndex in range(state.getNumAgents()):
+                position = state.getAgentState(agentIndex).getPosition()
+
+                if (state.isOnRedTeam(agentIndex)):
+                    distance -= self._getNearestFood(position, True)[0]
+                else:
+                    distance += self._getNearestFood(position, False)[0]
+
+            value += FOOD_DISTANCE_WEIGHT * distance
+
+        return 1.0 / (1.0 + math.exp(-value / REWARD_SCALE))
+
+    def _getNearestFood(self, position, isRed, state = None):
+        """
+        Get the (distance, position) of the closest food that the given team can eat
+        (or (0, None) if there is none).
+        Food is taken from the root of the search (and remembered for each position),
+        unless a state is given (then only food still in that state counts, and nothing is saved).
+        """
+
+        key = (position, isRed)
+        if (state is None and key in self._nearestFood):
+            return self._nearestFood[key]
+
+        food = self._redFood
+        if (isRed):
+            food = self._blueFood
+
+        if (state is not None):
+            food = [cell for cell in food if (state.hasFood(*cell))]
+
+        nearest = (0, None)
+        if (len(food) > 0):
+            nearest = min([(self._distance(position, cell), cell) for cell in food])
+
+        if (state is None):
+            self._nearestFood[key] = nearest
+
+        return nearest
+
+    def _getRolloutAction(self, state, agentIndex, targets):
+        """
+        Pick a move for an agent during a rollout.
+        `targets` holds the food each agent is currently heading for.
+        """
+
+        agentState = state.getAgentState(agentIndex)
+        position = agentState.getPosition()
+
+        moves = self._moves.get(position)
+        if (moves is None):
+            return random.choice(state.getLegalActions(agentIndex))
+
+        if (random.random() < ROLLOUT_EPSILON):
+            return random.choice(moves)[0]
+
+        distances = self._distances
+        size = self._distanceSize
+        isRed = state.isOnRedTeam(agentIndex)
+        isPacman = agentState.isPacman()
+        positionRow = self._cellIndexes[position] * size
+
+        # The rows of brave ghosts (for pacmen to avoid) and the cell of the closest nearby invader.
+        ghostRows = []
+        targetCell = None
+        targetDistance = DEFENSE_RADIUS + 1
+
+        for enemyIndex in range(state.getNumAgents()):
+            if (state.isOnRedTeam(enemyIndex) == isRed):
+                continue
+
+            enemyState = state.getAgentState(enemyIndex)
+            enemyCell = self._cellIndexes.get(enemyState.getPosition())
+            if (enemyCell is None):
+                continue
+
+            if (enemyState.isPacman()):
+                if (not isPacman and not agentState.isScared()
+                        and distances[positionRow + enemyCell] < targetDistance):
+                    targetCell = enemyCell
+                    targetDistance = distances[positionRow + enemyCell]
+            elif (isPacman and not enemyState.isScared()):
+                ghostRows.append(enemyCell * size)
+
+        if (targetCell is None):
+            food = targets.get(agentIndex)
+            if (food is None or food == position or not state.hasFood(*food)):
+                food = self._getNearestFood(position, isRed)[1]
+
+                # Someone already ate it during this simulation.
+                if (food is not None and not state.hasFood(*food)):
+                    food = self._getNearestFood(position, isRed, state)[1]
+
+                if (food is None):
+                    return random.choice(moves)[0]
+
+                targets[agentIndex] = food
+
+            targetCell = self._cellIndexes[food]
+
+        targetRow = targetCell * size
+
+        bestAction = None
+        bestCost = None
+
+        for (action, nextIndex) in moves:
+            cost = distances[targetRow + nextIndex]
+
+            for ghostRow in ghostRows:
+                if (distances[ghostRow + nextIndex] <= DANGER_RADIUS):
+                    cost += distanceCalculator.DEFAULT_DISTANCE
+
+            if (bestCost is None or cost < bestCost):
+                bestAction = action
+                bestCost = cost
+
+        return bestAction
+
+    def _rollout(self, state, agentIndex):
+        """
+        Play out the rest of a simulation from the state (with `agentIndex` to move).
+        Returns the reward for the red team.
+        """
+
+        numAgents = state.getNumAgents()
+        targets = {}
+        tokens = []
+
+        try:
+            for _ in range(self._rolloutDepth):
+                if (state.isOver()):
+                    break
+
+                action = self._getRolloutAction(state, agentIndex, targets)
+                tokens.append(state.applyMove(agentIndex, action))
+                agentIndex = (agentIndex + 1) % numAgents
+
+            return self._evaluate(state)
+        finally:
+            for token in reversed(tokens):
+                state.undoMove(token)
+
+    def _reuseTree(self, state):
+        """
+        Find the node for this state in the last search's tree
+        (by following this agent's last move and the moves every other agent made since).
+        Returns a new root if the state cannot be found.
+        """
+
+        if (self._root is None or self._lastAction not in self._root.children):
+            return MCTSNode()
+
+        oldState = self._rootState
+        numAgents = oldState.getNumAgents()
+
+        node = self._root.children[self._lastAction]
+        tokens = [oldState.applyMove(self.index, self._lastAction)]
+
+        try:
+            agentIndex = (self.index + 1) % numAgents
+            while (agentIndex != self.index):
+                if (oldState.isOver()):
+                    return MCTSNode()
+
+                # Find the move that puts this agent where it is now.
+                actualState = state.getAgentState(agentIndex)
+                nextNode = None
+
+                for (action, child) in node.children.items():
+                    tokens.append(oldState.applyMove(agentIndex, action))
+                    if (oldState.getAgentState(agentIndex) == actualState):
+                        nextNode = child
+                        break
+
+                    oldState.undoMove(tokens.pop())
+
+                if (nextNode is None):
+                    return MCTSNode()
+
+                node = nextNode
+                agentIndex = (agentIndex + 1) % numAgents
+
+            # Moves can affect other agents (and the board), so make sure it all matches.
+            if (hash(oldState) != hash(state)):
+                return MCTSNode()
+
+            return node
+        finally:
+            for token in reversed(tokens):
+                oldState.undoMove(token)
+
+    def _select(self, node):
+        """
+        Pick the child with the best upper confidence bound.
+        """
+
+        logVisits = math.log(node.visits)
+
+        bestAction = None
+        bestScore = None
+
+        for (action, child) in node.children.items():
+            score = (child.value / child.visits
+                    + self._exploration * math.sqrt(logVisits / child.visits))
+
+            if (bestScore is None or score > bestScore):
+                bestAction = action
+                bestScore = score
+
+        return bestAction
+
+    def _simulate(self, state, root):
+        """
+        Run a single simulation: select a path down the tree, add a node,
+        roll out from that node, and back up the reward.
+        The state is put back the way it was.
+        """
+
+        numAgents = state.getNumAgents()
+        agentIndex = self.index
+
+        node = root
+        # (node, if the agent that moved into the node is red).
+        path = [(root, not state.isOnRedTeam(self.index))]
+        tokens = []
+
+        try:
+            while (not state.isOver()):
+                if (node.untried is None):
+                    node.untried = state.getLegalActions(agentIndex)
+                    random.shuffle(node.untried)
+
+                isRed = state.isOnRedTeam(agentIndex)
+
+                if (len(node.untried) > 0):
+                    # Expand a new child and roll out from it.
+                    action = node.untried.pop()
+                    child = MCTSNode()
+                    node.children[action] = child
+
+                    tokens.append(state.applyMove(agentIndex, action))
+                    path.append((child, isRed))
+                    agentIndex = (agentIndex + 1) % numAgents
+                    break
+
+                # Nothing to expand or select.
+                if (len(node.children) == 0):
+                    break
+
+                action = self._select(node)
+                node = node.children[action]
+
+                tokens.append(state.applyMove(agentIndex, action))
+                path.append((node, isRed))
+                agentIndex = (agentIndex + 1) % numAgents
+
+            if (state.isOver()):
+                redReward = self._evaluate(state)
+            else:
+                redReward = self._rollout(state, agentIndex)
+        finally:
+            for token in reversed(tokens):
+                state.undoMove(token)
+
+        self._backpropagate(path, redReward)
+
+def _rate(count, seconds):
+    if (seconds <= 0.0):
+        return 0.0
+
+    return count / seconds
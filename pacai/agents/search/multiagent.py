@@ -1,4 +1,9 @@
+import logging
+import multiprocessing
+
 from pacai.agents.base import BaseAgent
+from pacai.core.adversarial import AlphaBetaSearch
+from pacai.core.adversarial import RootParallelSearch
 from pacai.util import reflection
 
 class MultiAgentSearchAgent(BaseAgent):
@@ -17,3 +22,82 @@ class MultiAgentSearchAgent(BaseAgent):
 
     def getTreeDepth(self):
         return self._treeDepth
+
+class AlphaBetaSearchAgent(MultiAgentSearchAgent):
+    """
+    A minimax agent that uses `pacai.core.adversarial.AlphaBetaSearch`
+    (iterative deepening alpha-beta with a transposition table and move ordering).
+    All other agents are assumed to be working against this one.
+
+    Subclasses only need to supply an evaluation function
+    (through `evalFn` or by overriding `MultiAgentSearchAgent.getEvaluationFunction`).
+
+    By default, the search always goes exactly `depth` deep.
+    If `moveTime` (in seconds) or `timeFraction` (of the game's move warning time, e.g. 0.5)
+    is given, the search also stops early once it has used that much time.
+    A `depth` of zero (or less) only stops for time.
+
+    With more than one of `workers`, each of this agent's actions is searched on its own process
+    (see `pacai.core.adversarial.RootParallelSearch`).
+    Agents that are already running on a worker process (e.g. parallel games) search serially.
+    """
+
+    def __init__(self, index, moveTime = None, timeFraction = None, workers = 1, **kwargs):
+        super().__init__(index, **kwargs)
+
+        self._moveTime = None
+        if (moveTime is not None):
+            self._moveTime = float(moveTime)
+
+        self._timeFraction = None
+        if (timeFraction is not None):
+            self._timeFraction = float(timeFraction)
+
+        workers = int(workers)
+        if (workers > 1 and multiprocessing.current_process().daemon):
+            logging.warning('Agent %d is running on a worker process, so it will search serially.'
+                    % (self.index))
+            workers = 1
+
+        if (workers > 1):
+            self._search = RootParallelSearch(self.getEvaluationFunction(), workers)
+        else:
+            self._search = AlphaBetaSearch(self.getEvaluationFunction())
+
+    # Override
+    def final(self, state):
+        if (isinstance(self._search, RootParallelSearch)):
+            self._search.close()
+
+    def getAction(self, state):
+        maxDepth = self.getTreeDepth()
+        if (maxDepth <= 0):
+            maxDepth = None
+
+        timeLimit = self.getMoveTime()
+        if (maxDepth is None and timeLimit is None):
+            raise ValueError('%s needs a positive depth or a move time.' % (type(self).__name__))
+
+        return self._search.search(state, self.index, maxDepth = maxDepth, timeLimit = timeLimit)
+
+    def getMoveTime(self):
+        """
+        Get the number of seconds a search can take (or None if there is no limit).
+        """
+
+        if (self._moveTime is not None):
+            return self._moveTime
+
+        warningTime = self.getMoveWarningTime()
+        if (self._timeFraction is None or warningTime is None):
+            return None
+
+        return warningTime * self._timeFraction
+
+    def getSearch(self):
+        return self._search
+
+    # Override
+    def registerInitialState(self, state):
+        # A new game starts with a fresh table (and new workers for a parallel search).
+        self._search.clear()
@@ -31,6 +31,11 @@ def getParser(description, name):
             action = 'store_true', default = False,
             help = 'turns on exception handling and timeouts during games (default: %(default)s)')
 
+    parser.add_argument('--dirty-regions', dest = 'dirtyRegions',
+            action = 'store_true', default = False,
+            help = 'only redraw the parts of the window that changed (faster on large windows) '
+                + '(default: %(default)s)')
+
     parser.add_argument('--fps', dest = 'fps',
             action = 'store', type = float, default = 15,
             help = 'cap the game to this fps, at zero frames will be animated as fast as possible'
@@ -48,6 +53,16 @@ def getParser(description, name):
             action = 'store', type = int, default = view.DEFAULT_SKIP_FRAMES,
             help = 'skip X actual frames between each frame of the gif (default: %(default)s)')
 
+    parser.add_argument('--gif-thread', dest = 'gifThread',
+            action = 'store_true', default = False,
+            help = 'encode the gif on a background thread while the game runs '
+                + '(default: %(default)s)')
+
+    parser.add_argument('--headless', dest = 'headless',
+            action = 'store_true', default = False,
+            help = 'play without any display or move history, and only time agents when '
+                + 'enforcing timeouts, requires --null-graphics (default: %(default)s)')
+
     parser.add_argument('--null-graphics', dest = 'nullGraphics',
             action = 'store_true', default = False,
             help = 'generate no graphics (default: %(default)s)')
@@ -56,18 +71,48 @@ def getParser(description, name):
             action = 'store', type = int, default = 0,
             help = 'set how many episodes of training (suppresses output) (default: %(default)s)')
 
+    parser.add_argument('--profile', dest = 'profile',
+            action = 'store', type = str, default = None,
+            help = 'write a JSON report of where the time in each game went '
+                + '(per agent and per phase) to this path (default: %(default)s)')
+
+    parser.add_argument('--profile-cprofile', dest = 'profileCProfile',
+            action = 'store_true', default = False,
+            help = 'also run each agent under cProfile and dump its stats next to the '
+                + '--profile report (default: %(default)s)')
+
     parser.add_argument('--record', dest = 'record',
             action = 'store', type = str, default = None,
-            help = 'writes the moves of a game to the named pickle file (default: %(default)s)')
+            help = 'writes the moves of all games to the named replay file (default: %(default)s)')
 
     parser.add_argument('--replay', dest = 'replay',
             action = 'store', type = str, default = None,
-            help = 'load a recorded pickle game file to replay (default: %(default)s)')
+            help = 'load a recorded game file to replay (default: %(default)s)')
+
+    parser.add_argument('--replay-game', dest = 'replayGame',
+            action = 'store', type = int, default = 0,
+            help = 'the index of the game to replay from a file with many games '
+                + '(default: %(default)s)')
+
+    parser.add_argument('--replay-start', dest = 'replayStart',
+            action = 'store', type = int, default = 0,
+            help = 'start the replay at this move, '
+                + 'skipping ahead using the saved keyframes (default: %(default)s)')
 
     parser.add_argument('--sprites', dest = 'spritesPath',
             action = 'store', type = str, default = view.DEFAULT_SPRITES,
             help = 'use the specified spritesheet for graphics (default: %(default)s)')
 
+    parser.add_argument('--text-ansi', dest = 'textANSI',
+            action = 'store_true', default = False,
+            help = 'with --text-graphics, redraw the board in place using ANSI escape codes '
+                + '(default: %(default)s)')
+
+    parser.add_argument('--text-fps', dest = 'textFPS',
+            action = 'store', type = float, default = 0,
+            help = 'with --text-graphics, draw at most this many frames per second '
+                + '(skipping the rest), at zero every frame is drawn (default: %(default)s)')
+
     parser.add_argument('--text-graphics', dest = 'textGraphics',
             action = 'store_true', default = False,
             help = 'display output as text only (default: %(default)s)')
@@ -0,0 +1,428 @@
+"""
+Benchmarks for the code that dominates the time spent playing games.
+
+Each benchmark times a single operation (e.g. generating every legal successor of a state).
+Results can be written as JSON and compared against a saved baseline,
+so slowdowns can be caught (e.g. after upgrading Python or a dependency).
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import textwrap
+import timeit
+
+from pacai.agents.capture.mcts import MCTSCaptureAgent
+from pacai.bin.capture import CaptureGameState
+from pacai.bin.pacman import PacmanGameState
+from pacai.core import distanceCalculator
+from pacai.core.layout import getLayout
+from pacai.core.search import heuristic
+from pacai.core.search.food import FoodSearchProblem
+from pacai.core.search.position import PositionSearchProblem
+from pacai.student import search
+from pacai.util.logs import initLogging
+from pacai.util.logs import updateLoggingLevel
+
+LAYOUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+        'core', 'layouts')
+
+DEFAULT_REPEAT = 3
+# Each timing runs an operation enough times to take at least this long (in seconds).
+DEFAULT_MIN_TIME = 0.1
+# Changes smaller than this (as a fraction of the baseline) are considered noise.
+DEFAULT_THRESHOLD = 0.10
+
+CAPTURE_LENGTH = 1200
+
+PACMAN_LAYOUT = 'mediumClassic'
+CAPTURE_LAYOUT = 'defaultCapture'
+POSITION_SEARCH_LAYOUT = 'mediumMaze'
+FOOD_SEARCH_LAYOUT = 'greedySearch'
+
+# The number of simulations in each MCTS search.
+MCTS_SIMULATIONS = 50
+
+class Benchmark(object):
+    """
+    A named operation to time.
+    `setup` is called once (untimed) and returns the function to time.
+    """
+
+    def __init__(self, name, setup):
+        self.name = name
+        self.setup = setup
+
+    def run(self, repeat = DEFAULT_REPEAT, minTime = DEFAULT_MIN_TIME):
+        """
+        Time the operation and return its result (the times are per operation, in seconds).
+        """
+
+        function = self.setup()
+        timer = timeit.Timer(function)
+
+        # Find how many times to run the operation (the first timing also counts as a sample).
+        number = 1
+        while (True):
+            totalTime = timer.timeit(number)
+            if (totalTime >= minTime):
+                break
+
+            number *= 10
+
+        times = [totalTime] + timer.repeat(repeat = max(0, repeat - 1), number = number)
+        times = [time / number for time in times]
+
+        return {
+            'number': number,
+            'best': min(times),
+            'mean': sum(times) / len(times),
+            'opsPerSecond': 1.0 / min(times),
+        }
+
+def getBenchmarks():
+    benchmarks = []
+
+    for (name, buildState) in [('pacman', _pacmanState), ('capture', _captureState)]:
+        benchmarks += [
+            Benchmark(name + '.generateSuccessor', _bindState(_successorsBench, buildState)),
+            Benchmark(name + '.getLegalActions', _bindState(_legalActionsBench, buildState)),
+            Benchmark(name + '.hash', _bindState(_hashBench, buildState)),
+            Benchmark(name + '.eq', _bindState(_eqBench, buildState)),
+        ]
+
+    benchmarks += [
+        Benchmark('grid.copy', lambda: _pacmanState().getFood().copy),
+        Benchmark('grid.count', lambda: _pacmanState().getFood().count),
+        Benchmark('search.bfs.position', lambda: _searchBench(search.breadthFirstSearch,
+                PositionSearchProblem, POSITION_SEARCH_LAYOUT)),
+        Benchmark('search.astar.position', lambda: _searchBench(search.aStarSearch,
+                PositionSearchProblem, POSITION_SEARCH_LAYOUT, heuristic.manhattan)),
+        Benchmark('search.bfs.food', lambda: _searchBench(search.breadthFirstSearch,
+                FoodSearchProblem, FOOD_SEARCH_LAYOUT)),
+        Benchmark('search.astar.food', lambda: _searchBench(search.aStarSearch,
+                FoodSearchProblem, FOOD_SEARCH_LAYOUT, heuristic.numFood)),
+        Benchmark('capture.mcts', _mctsBench),
+        Benchmark('frame.toImage', lambda: _frameBench(False)),
+        Benchmark('frame.toImage.cached', lambda: _frameBench(True)),
+    ]
+
+    for layoutName in getLayoutNames():
+        benchmarks += [
+            Benchmark('computeDistances.' + layoutName,
+                    _bindLayout(distanceCalculator.computeDistances, layoutName)),
+            Benchmark('computeDistanceMatrix.' + layoutName,
+                    _bindLayout(distanceCalculator.computeDistanceMatrix, layoutName)),
+        ]
+
+    return benchmarks
+
+def getLayoutNames():
+    """
+    Get the names of all the bundled layouts.
+    """
+
+    names = [os.path.splitext(filename)[0] for filename in os.listdir(LAYOUT_DIR)]
+    return sorted([name for name in names if (not name.startswith('.'))])
+
+def runBenchmarks(benchmarks, repeat = DEFAULT_REPEAT, minTime = DEFAULT_MIN_TIME):
+    """
+    Run benchmarks and get the results (with some information about the environment).
+    Benchmarks that need a missing optional dependency are skipped.
+    """
+
+    results = {}
+
+    for benchmark in benchmarks:
+        try:
+            results[benchmark.name] = benchmark.run(repeat, minTime)
+        except ImportError as ex:
+            logging.warning("Skipping benchmark '%s': %s" % (benchmark.name, ex))
+            continue
+
+        logging.info('%-40s %12.3f us' % (benchmark.name, results[benchmark.name]['best'] * 1e6))
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'benchmarks': results,
+    }
+
+def compareResults(baseline, results, threshold = DEFAULT_THRESHOLD):
+    """
+    Compare results against a baseline (both as returned by `runBenchmarks`).
+    Returns a dict of {name: comparison, ...} for every benchmark that appears in both,
+    where each comparison has the ratio of the current time to the baseline time
+    (above one is slower) and a status of 'regression', 'improvement', or 'same'.
+    """
+
+    comparisons = {}
+
+    for (name, result) in results['benchmarks'].items():
+        if (name not in baseline['benchmarks']):
+            continue
+
+        ratio = result['best'] / baseline['benchmarks'][name]['best']
+
+        status = 'same'
+        if (ratio > 1.0 + threshold):
+            status = 'regression'
+        elif (ratio < 1.0 - threshold):
+            status = 'improvement'
+
+        comparisons[name] = {
+            'baseline': baseline['benchmarks'][name]['best'],
+            'current': result['best'],
+            'ratio': ratio,
+            'status': status,
+        }
+
+    return comparisons
+
+def formatComparisons(comparisons):
+    nameWidth = max([len('Benchmark')] + [len(name) for name in comparisons])
+
+    rowFormat = '%-' + str(nameWidth) + 's  %14s  %14s  %7s  %s'
+    lines = [rowFormat % ('Benchmark', 'Baseline (us)', 'Current (us)', 'Ratio', 'Status')]
+
+    for name in sorted(comparisons):
+        comparison = comparisons[name]
+        lines.append(rowFormat % (name, '%.3f' % (comparison['baseline'] * 1e6),
+                '%.3f' % (comparison['current'] * 1e6), '%.2f' % (comparison['ratio']),
+                comparison['status']))
+
+    return '\n'.join(lines)
+
+def _bindLayout(function, layoutName):
+    def setup():
+        layout = getLayout(layoutName)
+        return lambda: function(layout)
+
+    return setup
+
+def _bindState(bench, buildState):
+    return lambda: bench(buildState())
+
+def _captureState():
+    return CaptureGameState(getLayout(CAPTURE_LAYOUT), CAPTURE_LENGTH)
+
+def _eqBench(state):
+    # Two equal states that are not the same object.
+    action = state.getLegalActions(0)[0]
+    first = state.generateSuccessor(0, action)
+    second = state.generateSuccessor(0, action)
+
+    return lambda: first == second
+
+def _frameBench(cached):
+    # Defer importing the UI (and PIL) unless this benchmark is run.
+    from pacai.ui import spritesheet
+    from pacai.ui import view
+    from pacai.ui.frame import BoardImageCache
+    from pacai.ui.pacman.frame import PacmanFrame
+
+    sprites = spritesheet.getSpriteSheet(view.DEFAULT_SPRITES)
+    font = view.getFont()
+
+    # Alternate between two frames, so the cache has something to redraw.
+    state = _pacmanState()
+    successor = state.generateSuccessor(0, state.getLegalActions(0)[0])
+    frames = [PacmanFrame(0, state, 0), PacmanFrame(1, successor, 1)]
+
+    cache = None
+    if (cached):
+        cache = BoardImageCache()
+
+    counter = [0]
+
+    def bench():
+        counter[0] += 1
+        frames[counter[0] % 2].toImage(sprites, font, cache)
+
+    return bench
+
+def _hashBench(state):
+    def bench():
+        # States remember their hash.
+        state._hash = None
+        hash(state)
+
+    return bench
+
+def _legalActionsBench(state):
+    agentIndexes = range(state.getNumAgents())
+
+    def bench():
+        for agentIndex in agentIndexes:
+            state.getLegalActions(agentIndex)
+
+    return bench
+
+def _mctsBench():
+    state = _captureState()
+
+    agent = MCTSCaptureAgent(0, simulations = MCTS_SIMULATIONS)
+    agent.registerInitialState(state)
+
+    # The state does not change, so every search starts a new tree.
+    return lambda: agent.chooseAction(state)
+
+def _pacmanState():
+    return PacmanGameState(getLayout(PACMAN_LAYOUT))
+
+def _searchBench(searchFunction, problemClass, layoutName, searchHeuristic = None):
+    state = PacmanGameState(getLayout(layoutName))
+
+    if (searchHeuristic is None):
+        return lambda: searchFunction(problemClass(state))
+
+    return lambda: searchFunction(problemClass(state), searchHeuristic)
+
+def _successorsBench(state):
+    # Every legal move of every agent.
+    moves = []
+    for agentIndex in range(state.getNumAgents()):
+        moves += [(agentIndex, action) for action in state.getLegalActions(agentIndex)]
+
+    def bench():
+        for (agentIndex, action) in moves:
+            state.generateSuccessor(agentIndex, action)
+
+    return bench
+
+def readCommand(argv):
+    """
+    Processes the command used to run the benchmarks from the command line.
+    """
+
+    description = """
+    DESCRIPTION:
+        This program will time the core operations of pacai (generating successors,
+        hashing states, computing maze distances, searching, drawing frames, etc.).
+        Results can be saved as JSON and compared against a saved baseline.
+
+    EXAMPLES:
+        (1) python -m pacai.bin.bench --output baseline.json
+          - Runs every benchmark and saves the results.
+        (2) python -m pacai.bin.bench --baseline baseline.json --filter generateSuccessor
+          - Runs the successor benchmarks and compares them against the saved results.
+    """
+
+    parser = argparse.ArgumentParser(description = textwrap.dedent(description),
+            prog = os.path.basename(__file__), formatter_class = argparse.RawTextHelpFormatter)
+
+    parser.add_argument('-b', '--baseline', dest = 'baseline',
+            action = 'store', type = str, default = None,
+            help = 'compare against the results saved at this path (default: %(default)s)')
+
+    parser.add_argument('-d', '--debug', dest = 'debug',
+            action = 'store_true', default = False,
+            help = 'set logging level to debug (default: %(default)s)')
+
+    parser.add_argument('-f', '--filter', dest = 'filter',
+            action = 'store', type = str, default = None,
+            help = 'only run benchmarks whose name matches this regular expression '
+                + '(default: %(default)s)')
+
+    parser.add_argument('-o', '--output', dest = 'output',
+            action = 'store', type = str, default = None,
+            help = 'write the results as JSON to this path (default: %(default)s)')
+
+    parser.add_argument('-q', '--quiet', dest = 'quiet',
+            action = 'store_true', default = False,
+            help = 'set logging level to warning (default: %(default)s)')
+
+    parser.add_argument('-r', '--repeat', dest = 'repeat',
+            action = 'store', type = int, default = DEFAULT_REPEAT,
+            help = 'time each benchmark this many times and keep the best '
+                + '(default: %(default)s)')
+
+    parser.add_argument('--min-time', dest = 'minTime',
+            action = 'store', type = float, default = DEFAULT_MIN_TIME,
+            help = 'run each benchmark for at least this many seconds per timing '
+                + '(default: %(default)s)')
+
+    parser.add_argument('--threshold', dest = 'threshold',
+            action = 'store', type = float, default = DEFAULT_THRESHOLD,
+            help = 'changes from the baseline smaller than this fraction are ignored '
+                + '(default: %(default)s)')
+
+    options = parser.parse_args(argv)
+
+    if options.quiet and options.debug:
+        raise ValueError('Logging cannont be set to both debug and quiet.')
+
+    if options.quiet:
+        updateLoggingLevel(logging.WARNING)
+    elif options.debug:
+        updateLoggingLevel(logging.DEBUG)
+
+    if (options.repeat < 1):
+        raise ValueError('The number of repeats must be positive.')
+
+    benchmarks = getBenchmarks()
+    if (options.filter is not None):
+        pattern = re.compile(options.filter)
+        benchmarks = [benchmark for benchmark in benchmarks if (pattern.search(benchmark.name))]
+
+    if (len(benchmarks) == 0):
+        raise ValueError("No benchmarks match '%s'." % (options.filter))
+
+    return {
+        'benchmarks': benchmarks,
+        'repeat': options.repeat,
+        'minTime': options.minTime,
+        'threshold': options.threshold,
+        'baseline': options.baseline,
+        'output': options.output,
+    }
+
+def main(argv):
+    """
+    Entry point for the benchmarks.
+    The args are a blind pass of `sys.argv` with the executable stripped.
+    Returns the results and the comparisons against the baseline (None if there is no baseline).
+    """
+
+    initLogging()
+
+    args = readCommand(argv)
+
+    results = runBenchmarks(args['benchmarks'], args['repeat'], args['minTime'])
+
+    if (args['output'] is not None):
+        with open(args['output'], 'w') as file:
+            json.dump(results, file, indent = 4)
+
+        logging.info("Results written to: '%s'." % (args['output']))
+
+    comparisons = None
+    if (args['baseline'] is not None):
+        with open(args['baseline'], 'r') as file:
+            baseline = json.load(file)
+
+        comparisons = compareResults(baseline, results, args['threshold'])
+        logging.info('Comparison against %s:\n%s' % (args['baseline'],
+                formatComparisons(comparisons)))
+
+        regressions = [name for (name, comparison) in comparisons.items()
+                if (comparison['status'] == 'regression')]
+        if (len(regressions) > 0):
+            logging.warning('%d benchmark(s) regressed: %s' % (len(regressions),
+                    ', '.join(sorted(regressions))))
+
+    return results, comparisons
+
+if __name__ == '__main__':
+    results, comparisons = main(sys.argv[1:])
+
+    # Fail if anything got slower, so this can be used as a check.
+    if (comparisons is not None
+            and any([comparison['status'] == 'regression' for comparison in comparisons.values()])):
+        sys.exit(1)
@@ -7,7 +7,6 @@ On your opponents side of the map, you are a pacman and can eat food and capsule
 
 import logging
 import os
-import pickle
 import random
 import sys
 
@@ -21,6 +20,9 @@ from pacai.core.gamestate import AbstractGameState
 from pacai.core.grid import Grid
 from pacai.core.layout import Layout
 from pacai.core.layout import getLayout
+from pacai.core.profile import GameProfiler
+from pacai.core.replay import ReplayReader
+from pacai.core.replay import ReplayWriter
 from pacai.ui.capture.null import CaptureNullView
 from pacai.ui.capture.text import CaptureTextView
 from pacai.util import reflection
@@ -91,6 +93,8 @@ class CaptureGameState(AbstractGameState):
                 else:
                     self._blueFood[x][y] = True
 
+        self._countFood()
+
     # Override
     def generateSuccessor(self, agentIndex, action):
         # Check that successors exist.
@@ -128,12 +132,17 @@ class CaptureGameState(AbstractGameState):
             self._redFood = self._redFood.copy()
             self._blueFood = self._blueFood.copy()
 
-        super().eatFood(x, y)
+        if (not super().eatFood(x, y)):
+            return False
 
         if (self.isOnRedSide((x, y))):
             self._redFood[x][y] = False
+            self._numRedFood -= 1
         else:
             self._blueFood[x][y] = False
+            self._numBlueFood -= 1
+
+        return True
 
     def getBlueCapsules(self):
         """
@@ -161,6 +170,34 @@ class CaptureGameState(AbstractGameState):
 
         return self._blueTeam
 
+    def getNumBlueCapsules(self):
+        """
+        Get the number of capsules left on the blue side.
+        """
+
+        return len(self._blueCapsules)
+
+    def getNumBlueFood(self):
+        """
+        Get the amount of food left on the blue side.
+        """
+
+        return self._numBlueFood
+
+    def getNumRedCapsules(self):
+        """
+        Get the number of capsules left on the red side.
+        """
+
+        return len(self._redCapsules)
+
+    def getNumRedFood(self):
+        """
+        Get the amount of food left on the red side.
+        """
+
+        return self._numRedFood
+
     def getRedCapsules(self):
         """
         Get a list of remaining capsules on the red side.
@@ -224,6 +261,7 @@ class CaptureGameState(AbstractGameState):
 
         return self._teams[agentIndex]
 
+    # Override
     def _applySuccessorAction(self, agentIndex, action):
         """
         Apply the action to the context state (self).
@@ -232,7 +270,7 @@ class CaptureGameState(AbstractGameState):
         # Find appropriate rules for the agent.
         AgentRules.applyAction(self, action, agentIndex)
         AgentRules.checkDeath(self, agentIndex)
-        AgentRules.decrementTimer(self.getAgentState(agentIndex))
+        AgentRules.decrementTimer(self.getMutableAgentState(agentIndex))
 
         # Book keeping.
         self._lastAgentMoved = agentIndex
@@ -240,23 +278,32 @@ class CaptureGameState(AbstractGameState):
 
         self._hash = None
 
+    # Override
+    def _countFood(self):
+        super()._countFood()
+
+        self._numRedFood = self._redFood.count()
+        self._numBlueFood = self._blueFood.count()
+
 class CaptureRules:
     """
     These game rules manage the control flow of a game, deciding when
     and how the game starts and ends.
     """
 
-    def newGame(self, layout, agents, display, length, catchExceptions):
+    def newGame(self, layout, agents, display, length, catchExceptions,
+            headless = False, recordHistory = True):
         initState = CaptureGameState(layout, length)
         starter = random.randint(0, 1)
         logging.info('%s team starts' % ['Red', 'Blue'][starter])
         game = Game(agents, display, self, startingIndex = starter,
-                catchExceptions = catchExceptions)
+                catchExceptions = catchExceptions,
+                headless = headless, recordHistory = recordHistory)
         game.state = initState
         game.length = length
 
-        self._totalBlueFood = initState.getBlueFood().count()
-        self._totalRedFood = initState.getRedFood().count()
+        self._totalBlueFood = initState.getNumBlueFood()
+        self._totalRedFood = initState.getNumRedFood()
 
         return game
 
@@ -279,10 +326,10 @@ class CaptureRules:
         redWin = False
         blueWin = False
 
-        if (state.getRedFood().count() <= MIN_FOOD):
+        if (state.getNumRedFood() <= MIN_FOOD):
             logging.info("The Blue team ate all but %d of the opponents' dots." % MIN_FOOD)
             blueWin = True
-        elif (state.getBlueFood().count() <= MIN_FOOD):
+        elif (state.getNumBlueFood() <= MIN_FOOD):
             logging.info("The Red team ate all but %d of the opponents' dots." % MIN_FOOD)
             redWin = True
         else:
@@ -342,6 +389,11 @@ class AgentRules:
         """
 
         agentState = state.getAgentState(agentIndex)
+
+        actions = state.getInitialLayout().getPossibleActions(agentState.getPosition())
+        if (actions is not None):
+            return list(actions)
+
         return Actions.getPossibleActions(agentState.getPosition(), agentState.getDirection(),
                 state.getWalls())
 
@@ -355,7 +407,7 @@ class AgentRules:
         if (action not in legal):
             raise ValueError('Illegal action: ' + str(action))
 
-        agentState = state.getAgentState(agentIndex)
+        agentState = state.getMutableAgentState(agentIndex)
 
         # Update position.
         vector = Actions.directionToVector(action, AgentRules.AGENT_SPEED)
@@ -392,8 +444,8 @@ class AgentRules:
             else:
                 state.addScore(-FOOD_POINTS)
 
-            if ((isRed and state.getBlueFood().count() <= MIN_FOOD)
-                    or (not isRed and state.getRedFood().count() <= MIN_FOOD)):
+            if ((isRed and state.getNumBlueFood() <= MIN_FOOD)
+                    or (not isRed and state.getNumRedFood() <= MIN_FOOD)):
                 state.endGame(True)
 
             return
@@ -414,7 +466,7 @@ class AgentRules:
                 otherTeam = state.getRedTeamIndices()
 
             for agentIndex in otherTeam:
-                state.getAgentState(agentIndex).setScaredTimer(SCARED_TIME)
+                state.getMutableAgentState(agentIndex).setScaredTimer(SCARED_TIME)
 
     @staticmethod
     def decrementTimer(agentState):
@@ -455,10 +507,10 @@ class AgentRules:
             # Otherwise, we are being eatten.
             if (agentState.isBraveGhost() or otherAgentState.isScaredGhost()):
                 state.addScore(teamPointModifier * KILL_POINTS)
-                otherAgentState.respawn()
+                state.getMutableAgentState(otherAgentIndex).respawn()
             else:
                 state.addScore(teamPointModifier * -KILL_POINTS)
-                agentState.respawn()
+                state.getMutableAgentState(agentIndex).respawn()
 
 #############################
 # FRAMEWORK TO START A GAME #
@@ -559,16 +611,24 @@ def readCommand(argv):
     elif options.debug:
         updateLoggingLevel(logging.DEBUG)
 
+    if (options.headless and (not options.nullGraphics or options.gif is not None)):
+        raise ValueError('Headless games require --null-graphics (and no --gif).')
+
+    if (options.profileCProfile and options.profile is None):
+        raise ValueError('--profile-cprofile requires --profile.')
+
     viewOptions = {
         'gifFPS': options.gifFPS,
         'gifPath': options.gif,
+        'gifThread': options.gifThread,
         'skipFrames': options.gifSkipFrames,
         'spritesPath': options.spritesPath,
     }
 
     # Choose a display format.
     if options.textGraphics:
-        args['display'] = CaptureTextView(**viewOptions)
+        args['display'] = CaptureTextView(ansi = options.textANSI, refreshRate = options.textFPS,
+                **viewOptions)
     elif options.nullGraphics:
         args['display'] = CaptureNullView(**viewOptions)
     else:
@@ -576,7 +636,8 @@ def readCommand(argv):
         # This allows people to not have tkinter installed.
         from pacai.ui.capture.gui import CaptureGUIView
 
-        args['display'] = CaptureGUIView(fps = options.fps, title = 'Capture', **viewOptions)
+        args['display'] = CaptureGUIView(fps = options.fps, title = 'Capture',
+                dirtyRegions = options.dirtyRegions, **viewOptions)
 
     args['redTeamName'] = options.red
     args['blueTeamName'] = options.blue
@@ -619,29 +680,45 @@ def readCommand(argv):
         args['agents'][index] = agent
 
     # Choose a layout.
-    if options.layout.startswith('RANDOM'):
-        layoutSeed = None
-        if (options.layout != 'RANDOM'):
-            layoutSeed = int(options.layout[6:])
-
-        args['layout'] = Layout(generateMaze(layoutSeed).split('\n'))
-    elif options.layout.lower().find('capture') == -1:
-        raise ValueError('You must use a capture layout with capture.py.')
-    else:
-        args['layout'] = getLayout(options.layout)
-
-    if (args['layout'] is None):
-        raise ValueError('The layout ' + options.layout + ' cannot be found.')
+    args['layout'] = loadLayout(options.layout)
 
     args['length'] = options.maxMoves
     args['numGames'] = options.numGames
     args['numTraining'] = options.numTraining
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
+    args['headless'] = options.headless
+    args['profile'] = options.profile
+    args['profileCProfile'] = options.profileCProfile
     args['replay'] = options.replay
+    args['replayGame'] = options.replayGame
+    args['replayStart'] = options.replayStart
 
     return args
 
+def loadLayout(layoutName):
+    """
+    Load a capture layout by name.
+    RANDOM<seed> (e.g. RANDOM23) generates a seeded random maze,
+    and RANDOM alone generates an unseeded one.
+    """
+
+    if layoutName.startswith('RANDOM'):
+        layoutSeed = None
+        if (layoutName != 'RANDOM'):
+            layoutSeed = int(layoutName[6:])
+
+        layout = Layout(generateMaze(layoutSeed).split('\n'))
+    elif layoutName.lower().find('capture') == -1:
+        raise ValueError('You must use a capture layout with capture.py.')
+    else:
+        layout = getLayout(layoutName)
+
+    if (layout is None):
+        raise ValueError('The layout ' + layoutName + ' cannot be found.')
+
+    return layout
+
 def loadAgents(isRed, agentModule, textgraphics, args):
     """
     Calls agent factories and returns lists of agents.
@@ -660,16 +737,33 @@ def loadAgents(isRed, agentModule, textgraphics, args):
 
     return createTeamFunction(indices[0], indices[1], isRed, **args)
 
-def replayGame(layout, agents, actions, display, length, redTeamName, blueTeamName):
+def replayGame(layout, agents, actions, display, length, redTeamName, blueTeamName,
+        startMove = 0, keyframe = None):
+    """
+    Replay a recorded game.
+    If a starting move is given, the moves before it are not shown,
+    and the state is restored from the keyframe (if there is one) instead of replaying every move.
+    """
+
     agents = [DummyAgent(index) for index in range(len(agents))]
     rules = CaptureRules()
     game = rules.newGame(layout, agents, display, length, False)
     state = game.state
+
+    firstMove = 0
+    if (keyframe is not None):
+        firstMove, state = keyframe
+
+    # Catch up to the starting move without drawing anything.
+    for action in actions[firstMove:startMove]:
+        state = state.generateSuccessor(*action)
+        rules.process(state, game)
+
     display.redTeam = redTeamName
     display.blueTeam = blueTeamName
     display.initialize(state)
 
-    for action in actions:
+    for action in actions[startMove:]:
         # Execute the action
         state = state.generateSuccessor(*action)
         # Change the display
@@ -680,7 +774,16 @@ def replayGame(layout, agents, actions, display, length, redTeamName, blueTeamNa
     display.finish()
 
 def runGames(layout, agents, display, length, numGames, record, numTraining,
-        redTeamName, blueTeamName, catchExceptions = False, **kwargs):
+        redTeamName, blueTeamName, catchExceptions = False, headless = False,
+        profile = None, profileCProfile = False, **kwargs):
+    """
+    Play games.
+    Headless games (see `pacai.core.game.Game`) skip the display and do not keep their history.
+    Training games are always headless.
+    If a profile path is given, the (non-training) games are profiled
+    (see `pacai.core.profile.GameProfiler`) and the report is written there.
+    """
+
     rules = CaptureRules()
     games = []
 
@@ -689,6 +792,18 @@ def runGames(layout, agents, display, length, numGames, record, numTraining,
         logging.info('Playing %d training games.' % numTraining)
         nullView = CaptureNullView()
 
+    writer = None
+    if (record):
+        path = 'replay'
+        if (isinstance(record, str)):
+            path = record
+
+        writer = ReplayWriter(path)
+
+    profiler = None
+    if (profile is not None):
+        profiler = GameProfiler(useCProfile = profileCProfile)
+
     for i in range(numGames):
         isTraining = (i < numTraining)
 
@@ -698,32 +813,36 @@ def runGames(layout, agents, display, length, numGames, record, numTraining,
         else:
             gameDisplay = display
 
-        g = rules.newGame(layout, agents, gameDisplay, length, catchExceptions)
-        g.run()
+        gameHeadless = (headless or isTraining)
+        g = rules.newGame(layout, agents, gameDisplay, length, catchExceptions,
+                headless = gameHeadless, recordHistory = not gameHeadless)
+
+        if (writer is not None):
+            writer.startGame(layout,
+                    agents = [agent.__class__.__name__ for agent in agents],
+                    length = length,
+                    redTeamName = redTeamName,
+                    blueTeamName = blueTeamName)
+            g.recorder = writer
 
         if (not isTraining):
-            games.append(g)
+            g.profiler = profiler
+
+        g.run()
 
-        g.record = None
-        if record:
-            components = {
-                'layout': layout,
-                'agents': [agent.__class__.__name__ for agent in agents],
-                'actions': g.moveHistory,
-                'length': length,
-                'redTeamName': redTeamName,
-                'blueTeamName': blueTeamName
-            }
+        if (writer is not None):
+            writer.endGame()
 
-            path = 'replay'
-            if (isinstance(record, str)):
-                path = record
+        if (not isTraining):
+            games.append(g)
 
-            g.record = pickle.dumps(components)
-            with open(path, 'wb') as file:
-                file.write(g.record)
+    if (writer is not None):
+        writer.close()
+        logging.info("Games recorded to: '%s'." % (writer.getPath()))
 
-            logging.info("Game recorded to: '%s'." % (path))
+    if (profiler is not None):
+        profiler.writeReport(profile)
+        logging.info("Profile written to: '%s'." % (profile))
 
     if (numGames > 0):
         scores = [game.state.getScore() for game in games]
@@ -756,10 +875,8 @@ def main(argv):
     if (options['replay'] is not None):
         logging.info('Replaying recorded game %s.' % options['replay'])
 
-        recorded = None
-        with open(options['replay'], 'rb') as file:
-            recorded = pickle.load(file)
-
+        recorded = ReplayReader(options['replay']).getGame(options['replayGame'],
+                options['replayStart'])
         recorded['display'] = options['display']
         replayGame(**recorded)
 
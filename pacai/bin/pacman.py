@@ -8,8 +8,8 @@ Have fun!
 """
 
 import logging
+import multiprocessing
 import os
-import pickle
 import random
 import sys
 
@@ -23,6 +23,10 @@ from pacai.core.distance import manhattan
 from pacai.core.game import Game
 from pacai.core.gamestate import AbstractGameState
 from pacai.core.layout import getLayout
+from pacai.core.profile import GameProfiler
+from pacai.core.replay import KeyframeRecorder
+from pacai.core.replay import ReplayReader
+from pacai.core.replay import ReplayWriter
 from pacai.ui.pacman.null import PacmanNullView
 from pacai.ui.pacman.text import PacmanTextView
 from pacai.util.logs import initLogging
@@ -118,6 +122,7 @@ class PacmanGameState(AbstractGameState):
 
         return self._agentStates[PACMAN_AGENT_INDEX]
 
+    # Override
     def _applySuccessorAction(self, agentIndex, action):
         """
         Apply the action to the context state (self).
@@ -134,7 +139,7 @@ class PacmanGameState(AbstractGameState):
             # Penalty for waiting around.
             self.addScore(-TIME_PENALTY)
         else:
-            GhostRules.decrementTimer(self.getAgentState(agentIndex))
+            GhostRules.decrementTimer(self.getMutableAgentState(agentIndex))
 
         # Resolve multi-agent effects.
         GhostRules.checkDeath(self, agentIndex)
@@ -153,10 +158,12 @@ class ClassicGameRules(object):
     def __init__(self, timeout = 30):
         self.timeout = timeout
 
-    def newGame(self, layout, pacmanAgent, ghostAgents, display, catchExceptions = False):
+    def newGame(self, layout, pacmanAgent, ghostAgents, display, catchExceptions = False,
+            headless = False, recordHistory = True):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = PacmanGameState(layout)
-        game = Game(agents, display, self, catchExceptions = catchExceptions)
+        game = Game(agents, display, self, catchExceptions = catchExceptions,
+                headless = headless, recordHistory = recordHistory)
         game.state = initState
 
         self._initialFoodCount = initState.getNumFood()
@@ -217,6 +224,11 @@ class PacmanRules:
         """
 
         agentState = state.getPacmanState()
+
+        actions = state.getInitialLayout().getPossibleActions(agentState.getPosition())
+        if (actions is not None):
+            return list(actions)
+
         return Actions.getPossibleActions(agentState.getPosition(), agentState.getDirection(),
                 state.getWalls())
 
@@ -230,7 +242,7 @@ class PacmanRules:
         if (action not in legal):
             raise ValueError('Illegal pacman action: ' + str(action))
 
-        pacmanState = state.getPacmanState()
+        pacmanState = state.getMutableAgentState(PACMAN_AGENT_INDEX)
 
         # Update position.
         vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
@@ -260,8 +272,8 @@ class PacmanRules:
             state.eatCapsule(x, y)
 
             # Reset all ghosts' scared timers.
-            for ghostState in state.getGhostStates():
-                ghostState.setScaredTimer(SCARED_TIME)
+            for ghostIndex in state.getGhostIndexes():
+                state.getMutableAgentState(ghostIndex).setScaredTimer(SCARED_TIME)
 
 class GhostRules:
     """
@@ -278,6 +290,13 @@ class GhostRules:
         """
 
         agentState = state.getGhostState(ghostIndex)
+
+        actions = state.getInitialLayout().getGhostActions(agentState.getPosition(),
+                agentState.getDirection())
+        if (actions is not None):
+            return list(actions)
+
+        # Scared ghosts can be in between grid points.
         possibleActions = Actions.getPossibleActions(agentState.getPosition(),
                 agentState.getDirection(), state.getWalls())
         reverse = Actions.reverseDirection(agentState.getDirection())
@@ -296,7 +315,7 @@ class GhostRules:
         if (action not in legal):
             raise ValueError('Illegal ghost action: ' + str(action))
 
-        ghostState = state.getGhostState(ghostIndex)
+        ghostState = state.getMutableAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if (ghostState.isScared()):
             speed /= 2.0
@@ -341,7 +360,7 @@ class GhostRules:
         if (ghostState.isScared()):
             # Pacman ate a ghost.
             state.addScore(GHOST_POINTS)
-            ghostState.respawn()
+            state.getMutableAgentState(agentIndex).respawn()
         elif (not state.isOver()):
             # A ghost ate pacman.
             state.addScore(LOSE_POINTS)
@@ -415,6 +434,12 @@ def readCommand(argv):
             help = 'maximum time limit (seconds) an agent can spend computing per game '
                 + '(default: %(default)s)')
 
+    parser.add_argument('--workers', dest = 'workers',
+            action = 'store', type = int, default = None,
+            help = 'play games in parallel on this many processes, '
+                + 'each game is seeded from the main seed so results do not depend on '
+                + 'the number of workers (requires --null-graphics) (default: %(default)s)')
+
     options, otherjunk = parser.parse_known_args(argv)
     args = dict()
 
@@ -430,6 +455,25 @@ def readCommand(argv):
     elif options.debug:
         updateLoggingLevel(logging.DEBUG)
 
+    if (options.workers is not None):
+        if (options.workers < 1):
+            raise ValueError('The number of workers must be positive.')
+
+        if (not options.nullGraphics or options.gif is not None):
+            raise ValueError('Parallel games require --null-graphics (and no --gif).')
+
+        if (options.numTraining > 0):
+            raise ValueError('Training games cannot be played in parallel.')
+
+        if (options.profile is not None):
+            raise ValueError('Parallel games cannot be profiled.')
+
+    if (options.headless and (not options.nullGraphics or options.gif is not None)):
+        raise ValueError('Headless games require --null-graphics (and no --gif).')
+
+    if (options.profileCProfile and options.profile is None):
+        raise ValueError('--profile-cprofile requires --profile.')
+
     # If seed value is not entered generate a random seed value.
     seed = options.seed
     if seed is None:
@@ -461,6 +505,7 @@ def readCommand(argv):
     viewOptions = {
         'gifFPS': options.gifFPS,
         'gifPath': options.gif,
+        'gifThread': options.gifThread,
         'skipFrames': options.gifSkipFrames,
         'spritesPath': options.spritesPath,
     }
@@ -469,26 +514,47 @@ def readCommand(argv):
     if options.nullGraphics:
         args['display'] = PacmanNullView(**viewOptions)
     elif options.textGraphics:
-        args['display'] = PacmanTextView(**viewOptions)
+        args['display'] = PacmanTextView(ansi = options.textANSI, refreshRate = options.textFPS,
+                **viewOptions)
     else:
         # Defer importing the GUI unless we actually need it.
         # This allows people to not have tkinter installed.
         from pacai.ui.pacman.gui import PacmanGUIView
 
-        args['display'] = PacmanGUIView(fps = options.fps, title = 'Pacman', **viewOptions)
+        args['display'] = PacmanGUIView(fps = options.fps, title = 'Pacman',
+                dirtyRegions = options.dirtyRegions, **viewOptions)
         agentOpts['keyboard'] = args['display'].getKeyboard()
 
     args['catchExceptions'] = options.catchExceptions
     args['gameToReplay'] = options.replay
+    args['headless'] = options.headless
+    args['profile'] = options.profile
+    args['profileCProfile'] = options.profileCProfile
+    args['replayGame'] = options.replayGame
+    args['replayStart'] = options.replayStart
     args['ghosts'] = [BaseAgent.loadAgent(options.ghost, i + 1) for i in range(options.numGhosts)]
     args['numGames'] = options.numGames
     args['pacman'] = BaseAgent.loadAgent(options.pacman, PACMAN_AGENT_INDEX, agentOpts)
     args['record'] = options.record
     args['timeout'] = options.timeout
 
+    # Parallel games rebuild their agents in each worker.
+    args['workers'] = options.workers
+    args['seed'] = seed
+    args['pacmanName'] = options.pacman
+    args['ghostName'] = options.ghost
+    args['numGhosts'] = options.numGhosts
+    args['agentOpts'] = agentOpts
+
     return args
 
-def replayGame(layout, actions, display):
+def replayGame(layout, actions, display, startMove = 0, keyframe = None):
+    """
+    Replay a recorded game.
+    If a starting move is given, the moves before it are not shown,
+    and the state is restored from the keyframe (if there is one) instead of replaying every move.
+    """
+
     rules = ClassicGameRules()
 
     agents = []
@@ -497,9 +563,19 @@ def replayGame(layout, actions, display):
 
     game = rules.newGame(layout, agents[PACMAN_AGENT_INDEX], agents[1:], display)
     state = game.state
+
+    firstMove = 0
+    if (keyframe is not None):
+        firstMove, state = keyframe
+
+    # Catch up to the starting move without drawing anything.
+    for action in actions[firstMove:startMove]:
+        state = state.generateSuccessor(*action)
+        rules.process(state, game)
+
     display.initialize(state)
 
-    for action in actions:
+    for action in actions[startMove:]:
         # Execute the action
         state = state.generateSuccessor(*action)
 
@@ -512,7 +588,23 @@ def replayGame(layout, actions, display):
     display.finish()
 
 def runGames(layout, pacman, ghosts, display, numGames, record = None, numTraining = 0,
-        catchExceptions = False, timeout = 30, **kwargs):
+        catchExceptions = False, timeout = 30, workers = None, headless = False,
+        profile = None, profileCProfile = False, **kwargs):
+    """
+    Play games.
+    Headless games (see `pacai.core.game.Game`) skip the display and do not keep their history.
+    Training games are always headless.
+    If a profile path is given, the (non-training) games are profiled
+    (see `pacai.core.profile.GameProfiler`) and the report is written there.
+    Returns the (non-training) `pacai.core.game.Game`s,
+    or a `GameResult` for each game if they were played on workers (see `runParallelGames`).
+    """
+
+    if (workers is not None):
+        return runParallelGames(layout, numGames, workers, record = record,
+                catchExceptions = catchExceptions, timeout = timeout, headless = headless,
+                **kwargs)
+
     rules = ClassicGameRules(timeout)
     games = []
 
@@ -521,6 +613,14 @@ def runGames(layout, pacman, ghosts, display, numGames, record = None, numTraini
         logging.info('Playing %d training games.' % numTraining)
         nullView = PacmanNullView()
 
+    writer = None
+    if (record):
+        writer = ReplayWriter(_getRecordPath(record))
+
+    profiler = None
+    if (profile is not None):
+        profiler = GameProfiler(useCProfile = profileCProfile)
+
     for i in range(numGames):
         isTraining = (i < numTraining)
 
@@ -530,32 +630,145 @@ def runGames(layout, pacman, ghosts, display, numGames, record = None, numTraini
         else:
             gameDisplay = display
 
-        game = rules.newGame(layout, pacman, ghosts, gameDisplay, catchExceptions)
+        gameHeadless = (headless or isTraining)
+        game = rules.newGame(layout, pacman, ghosts, gameDisplay, catchExceptions,
+                headless = gameHeadless, recordHistory = not gameHeadless)
+
+        if (writer is not None):
+            writer.startGame(layout)
+            game.recorder = writer
+
+        if (not isTraining):
+            game.profiler = profiler
+
         game.run()
 
+        if (writer is not None):
+            writer.endGame()
+
         if (not isTraining):
             games.append(game)
 
-        if (record):
-            path = 'pacman.replay'
-            if (isinstance(record, str)):
-                path = record
+    if (writer is not None):
+        writer.close()
+        logging.info("Games recorded to: '%s'." % (writer.getPath()))
 
-            components = {'layout': layout, 'actions': game.moveHistory}
-            with open(path, 'wb') as file:
-                pickle.dump(components, file)
+    if (profiler is not None):
+        profiler.writeReport(profile)
+        logging.info("Profile written to: '%s'." % (profile))
 
     if ((numGames - numTraining) > 0):
-        scores = [game.state.getScore() for game in games]
-        wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True) / float(len(wins))
-        logging.info('Average Score: %s', sum(scores) / float(len(scores)))
-        logging.info('Scores:        %s', ', '.join([str(score) for score in scores]))
-        logging.info('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate))
-        logging.info('Record:        %s', ', '.join([['Loss', 'Win'][int(w)] for w in wins]))
+        _logSummary([game.state.getScore() for game in games],
+                [game.state.isWin() for game in games])
 
     return games
 
+class GameResult(object):
+    """
+    The outcome of a game played by `runParallelGames`.
+    Like a `pacai.core.game.Game`, it has the final `state`, the `moveHistory`,
+    and whether an agent crashed or timed out,
+    but not the agents, rules, or display (which stay on the worker).
+    """
+
+    def __init__(self, seed, state, moveHistory, agentCrashed, agentTimeout):
+        self.seed = seed
+        self.state = state
+        self.score = state.getScore()
+        self.win = state.isWin()
+        self.moveHistory = moveHistory
+        self.agentCrashed = agentCrashed
+        self.agentTimeout = agentTimeout
+
+def runParallelGames(layout, numGames, workers, pacmanName, ghostName, numGhosts, seed,
+        agentOpts = {}, record = None, catchExceptions = False, timeout = 30, headless = False,
+        **kwargs):
+    """
+    Play games on a pool of worker processes.
+
+    Each game gets its own seed derived from the main seed,
+    and its agents are rebuilt (from their names and args) after seeding,
+    so the results are the same for any number of workers.
+    Only the final state (as a snapshot), the moves, and (when recording) the keyframes
+    are sent back from the workers.
+    Returns a list of `GameResult` in the order the games were scheduled.
+    """
+
+    seedGenerator = random.Random(seed)
+    tasks = []
+    for i in range(numGames):
+        gameSeed = seedGenerator.randint(0, 2**32)
+        tasks.append((layout, pacmanName, ghostName, numGhosts, agentOpts,
+                catchExceptions, timeout, headless, bool(record), gameSeed))
+
+    logging.info('Playing %d games on %d workers.' % (numGames, workers))
+
+    if (workers == 1):
+        outcomes = [_runParallelGame(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            outcomes = pool.map(_runParallelGame, tasks)
+
+    results = []
+    keyframes = []
+    for (gameSeed, snapshot, moveHistory, agentCrashed, agentTimeout, gameKeyframes) in outcomes:
+        state = PacmanGameState.fromSnapshot(snapshot, layout)
+        results.append(GameResult(gameSeed, state, moveHistory, agentCrashed, agentTimeout))
+        keyframes.append(gameKeyframes)
+
+    if (record):
+        with ReplayWriter(_getRecordPath(record)) as writer:
+            for (result, gameKeyframes) in zip(results, keyframes):
+                writer.startGame(layout)
+                writer.recordMoves(result.moveHistory, gameKeyframes)
+                writer.endGame()
+
+    if (numGames > 0):
+        _logSummary([result.score for result in results], [result.win for result in results])
+
+    return results
+
+def _runParallelGame(task):
+    layout, pacmanName, ghostName, numGhosts, agentOpts = task[:5]
+    catchExceptions, timeout, headless, record, seed = task[5:]
+
+    random.seed(seed)
+
+    pacman = BaseAgent.loadAgent(pacmanName, PACMAN_AGENT_INDEX, agentOpts)
+    ghosts = [BaseAgent.loadAgent(ghostName, i + 1) for i in range(numGhosts)]
+
+    rules = ClassicGameRules(timeout)
+    # The moves are only sent back if they will be recorded.
+    game = rules.newGame(layout, pacman, ghosts, PacmanNullView(), catchExceptions,
+            headless = headless, recordHistory = (record or not headless))
+
+    recorder = None
+    if (record):
+        recorder = KeyframeRecorder()
+        game.recorder = recorder
+
+    game.run()
+
+    keyframes = []
+    if (recorder is not None):
+        keyframes = recorder.keyframes
+
+    return (seed, game.state.getSnapshot(), game.moveHistory, game.agentCrashed,
+            game.agentTimeout, keyframes)
+
+def _logSummary(scores, wins):
+    winRate = wins.count(True) / float(len(wins))
+    logging.info('Average Score: %s', sum(scores) / float(len(scores)))
+    logging.info('Scores:        %s', ', '.join([str(score) for score in scores]))
+    logging.info('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate))
+    logging.info('Record:        %s', ', '.join([['Loss', 'Win'][int(w)] for w in wins]))
+
+def _getRecordPath(record):
+    if (isinstance(record, str)):
+        return record
+
+    return 'pacman.replay'
+
 def main(argv):
     """
     Entry point for a pacman game.
@@ -571,10 +784,8 @@ def main(argv):
     if (args['gameToReplay'] is not None):
         logging.info('Replaying recorded game %s.' % args['gameToReplay'])
 
-        recorded = None
-        with open(args['gameToReplay'], 'rb') as file:
-            recorded = pickle.load(file)
-
+        recorded = ReplayReader(args['gameToReplay']).getGame(args['replayGame'],
+                args['replayStart'])
         recorded['display'] = args['display']
         replayGame(**recorded)
 
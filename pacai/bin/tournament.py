@@ -0,0 +1,462 @@
+"""
+A round-robin tournament between capture teams.
+
+Every team plays every other team on every layout, once as red and once as blue.
+Matches are played in parallel, each in a fresh worker process,
+so a team that crashes (or leaks state) cannot affect any other match.
+A match whose process dies, or that runs past its time limit (e.g. an agent stuck in a loop),
+is stopped and recorded as a no contest.
+"""
+
+import argparse
+import contextlib
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import sys
+import textwrap
+import time
+
+from pacai.bin import capture
+from pacai.core import distanceCalculator
+from pacai.ui.capture.null import CaptureNullView
+from pacai.util.logs import initLogging
+from pacai.util.logs import updateLoggingLevel
+
+WIN_POINTS = 3
+TIE_POINTS = 1
+LOSS_POINTS = 0
+
+# The score given when a team fails to load (from red's perspective).
+FORFEIT_SCORE = 1
+
+DEFAULT_LENGTH = 1200
+
+# How often (in seconds) to check on running matches that have not sent a result.
+POLL_INTERVAL = 1.0
+
+class MatchResult(object):
+    """
+    The outcome of a single match.
+    The score is from red's perspective (positive means red won),
+    and is None if the match could not be played for reasons that are not either team's fault.
+    """
+
+    def __init__(self, redTeam, blueTeam, layoutName, seed, score, error = None):
+        self.redTeam = redTeam
+        self.blueTeam = blueTeam
+        self.layoutName = layoutName
+        self.seed = seed
+        self.score = score
+        self.error = error
+
+    def getWinner(self):
+        """
+        Get the name of the winning team, or None on a tie or no contest.
+        """
+
+        if (self.score is None or self.score == 0):
+            return None
+
+        if (self.score > 0):
+            return self.redTeam
+
+        return self.blueTeam
+
+    def __str__(self):
+        outcome = 'Tie'
+        if (self.score is None):
+            outcome = 'No Contest'
+        elif (self.getWinner() is not None):
+            outcome = self.getWinner() + ' wins'
+
+        text = "%s (red) vs %s (blue) on %s: %s (score: %s)" % (self.redTeam, self.blueTeam,
+                self.layoutName, outcome, self.score)
+
+        if (self.error is not None):
+            text += " [%s]" % (self.error)
+
+        return text
+
+class TeamRecord(object):
+    """
+    A team's standing in a tournament.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.scoreDifference = 0
+
+    def addMatch(self, score):
+        """
+        Add a match with the given score (from this team's perspective).
+        """
+
+        self.scoreDifference += score
+
+        if (score > 0):
+            self.wins += 1
+        elif (score < 0):
+            self.losses += 1
+        else:
+            self.ties += 1
+
+    def getPlayed(self):
+        return self.wins + self.losses + self.ties
+
+    def getPoints(self):
+        return self.wins * WIN_POINTS + self.ties * TIE_POINTS + self.losses * LOSS_POINTS
+
+def scheduleMatches(teams, layoutNames, seed, length = DEFAULT_LENGTH):
+    """
+    Schedule every ordered pairing of teams on every layout.
+    Each match gets its own seed derived from the tournament seed,
+    so the results do not depend on the order matches are played in.
+    """
+
+    rng = random.Random(seed)
+
+    tasks = []
+    for layoutName in layoutNames:
+        # Every match has to play the same maze, so pick a seed for unseeded random mazes.
+        if (layoutName == 'RANDOM'):
+            layoutName = 'RANDOM%d' % (rng.randint(1, 10000))
+
+        for redTeam in teams:
+            for blueTeam in teams:
+                if (redTeam == blueTeam):
+                    continue
+
+                tasks.append((redTeam, blueTeam, layoutName, length, rng.randint(0, 2**32)))
+
+    return tasks
+
+def computeStandings(teams, results):
+    """
+    Get a list of `TeamRecord`, sorted by points, then score difference, then name.
+    Matches with no contest are not counted.
+    """
+
+    records = {team: TeamRecord(team) for team in teams}
+
+    for result in results:
+        if (result.score is None):
+            continue
+
+        records[result.redTeam].addMatch(result.score)
+        records[result.blueTeam].addMatch(-result.score)
+
+    return sorted(records.values(),
+            key = lambda record: (-record.getPoints(), -record.scoreDifference, record.name))
+
+def formatStandings(standings):
+    nameWidth = max([len('Team')] + [len(record.name) for record in standings])
+
+    rowFormat = '%4s  %-' + str(nameWidth) + 's  %6s  %4s  %6s  %4s  %6s  %6s'
+    lines = [rowFormat % ('Rank', 'Team', 'Played', 'Wins', 'Losses', 'Ties', 'Points', 'Score')]
+
+    for (rank, record) in enumerate(standings):
+        lines.append(rowFormat % (rank + 1, record.name, record.getPlayed(), record.wins,
+                record.losses, record.ties, record.getPoints(), record.scoreDifference))
+
+    return '\n'.join(lines)
+
+def getDefaultMatchTimeout():
+    """
+    Get the longest (in seconds) that a well-behaved match can take:
+    every agent using all of its startup time and all of its total time.
+    """
+
+    rules = capture.CaptureRules()
+    numAgents = 4
+
+    return sum([rules.getMaxStartupTime(index) + rules.getMaxTotalTime(index)
+            for index in range(numAgents)])
+
+def runTournament(teams, layoutNames, workers = 1, seed = None, length = DEFAULT_LENGTH,
+        matchTimeout = None):
+    """
+    Play a full round-robin tournament.
+    A match that takes longer than `matchTimeout` seconds (see `getDefaultMatchTimeout`)
+    is stopped and does not count.
+    Returns the list of `MatchResult` (in schedule order) and the standings.
+    """
+
+    if (matchTimeout is None):
+        matchTimeout = getDefaultMatchTimeout()
+
+    if (len(set(teams)) != len(teams)):
+        raise ValueError('Each team may only be entered once.')
+
+    tasks = scheduleMatches(teams, layoutNames, seed, length)
+    logging.info('Playing %d matches on %d workers.' % (len(tasks), workers))
+
+    with contextlib.ExitStack() as stack:
+        # Compute each maze's distances once and share them with all the workers.
+        _publishDistances(stack, set([task[2] for task in tasks]))
+
+        results = _runMatches(tasks, workers, matchTimeout)
+
+    for result in results:
+        logging.info(str(result))
+
+    return results, computeStandings(teams, results)
+
+def _publishDistances(stack, layoutNames):
+    if (distanceCalculator.shared_memory is None):
+        return
+
+    published = set()
+    for layoutName in layoutNames:
+        try:
+            layout = capture.loadLayout(layoutName)
+        except Exception:
+            # The match itself will report a bad layout.
+            continue
+
+        if (layout.walls in published):
+            continue
+
+        # Segments are named for this run, so they never collide with an earlier (crashed) run.
+        stack.enter_context(distanceCalculator.SharedDistanceMatrix(layout))
+        published.add(layout.walls)
+
+def _runMatches(tasks, workers, matchTimeout):
+    """
+    Play each match in a fresh process (so teams cannot affect each other),
+    with at most `workers` running at once.
+    Matches whose process dies or times out are killed and recorded as a no contest.
+    """
+
+    results = [None] * len(tasks)
+    pending = list(enumerate(tasks))
+    # {process: (match index, connection, deadline)}
+    running = {}
+
+    while (len(pending) > 0 or len(running) > 0):
+        while (len(pending) > 0 and len(running) < workers):
+            index, task = pending.pop(0)
+
+            receiver, sender = multiprocessing.Pipe(duplex = False)
+            process = multiprocessing.Process(target = _playMatchProcess, args = (task, sender))
+            process.start()
+            sender.close()
+
+            running[process] = (index, receiver, time.monotonic() + matchTimeout)
+
+        waitables = [process.sentinel for process in running]
+        waitables += [receiver for (index, receiver, deadline) in running.values()]
+        multiprocessing.connection.wait(waitables, timeout = POLL_INTERVAL)
+
+        for process in list(running):
+            index, receiver, deadline = running[process]
+            redTeam, blueTeam, layoutName, length, seed = tasks[index]
+
+            error = None
+            if (receiver.poll()):
+                try:
+                    results[index] = receiver.recv()
+                except EOFError:
+                    # The process exited (closing its end) without sending a result.
+                    process.join()
+                    error = 'Match process died (exit code: %s).' % (process.exitcode)
+            elif (not process.is_alive()):
+                error = 'Match process died (exit code: %s).' % (process.exitcode)
+            elif (time.monotonic() > deadline):
+                process.kill()
+                error = 'Match timed out after %s seconds.' % (matchTimeout)
+            else:
+                continue
+
+            if (error is not None):
+                logging.error('%s vs %s on %s: %s' % (redTeam, blueTeam, layoutName, error))
+                results[index] = MatchResult(redTeam, blueTeam, layoutName, seed, None, error)
+
+            # A process that sent its result gets a moment to exit on its own.
+            process.join(POLL_INTERVAL)
+            if (process.is_alive()):
+                process.kill()
+                process.join()
+
+            receiver.close()
+            del running[process]
+
+    return results
+
+def _playMatchProcess(task, connection):
+    connection.send(_playMatch(task))
+    connection.close()
+
+def _loadTeam(isRed, teamName):
+    try:
+        return capture.loadAgents(isRed, teamName, True, {}), None
+    except BaseException as ex:
+        # Teams may also exit (or be interrupted) while loading.
+        error = "%s failed to load: %s" % (teamName, ex)
+        logging.warning(error)
+        return None, error
+
+def _playMatch(task):
+    redTeam, blueTeam, layoutName, length, seed = task
+
+    random.seed(seed)
+
+    try:
+        layout = capture.loadLayout(layoutName)
+    except Exception as ex:
+        return MatchResult(redTeam, blueTeam, layoutName, seed, None, str(ex))
+
+    redAgents, redError = _loadTeam(True, redTeam)
+    blueAgents, blueError = _loadTeam(False, blueTeam)
+
+    # A team that does not load forfeits, and there is no contest if neither team loads.
+    if (redError is not None or blueError is not None):
+        score = None
+        if (redError is None):
+            score = FORFEIT_SCORE
+        elif (blueError is None):
+            score = -FORFEIT_SCORE
+
+        error = '; '.join([error for error in [redError, blueError] if (error is not None)])
+        return MatchResult(redTeam, blueTeam, layoutName, seed, score, error)
+
+    agents = sum([list(pair) for pair in zip(redAgents, blueAgents)], [])
+
+    # Agent crashes and timeouts are handled (and scored) by the game itself.
+    try:
+        game = capture.CaptureRules().newGame(layout, agents, CaptureNullView(), length, True)
+        game.run()
+    except Exception as ex:
+        logging.error('Match failed: %s vs %s on %s.' % (redTeam, blueTeam, layoutName),
+                exc_info = ex)
+        return MatchResult(redTeam, blueTeam, layoutName, seed, None, str(ex))
+
+    return MatchResult(redTeam, blueTeam, layoutName, seed, game.state.getScore())
+
+def readCommand(argv):
+    """
+    Processes the command used to run a tournament from the command line.
+    """
+
+    description = """
+    DESCRIPTION:
+        This program will run a round-robin capture tournament.
+        Every team plays every other team on every layout, once on each side.
+        A win is worth %d points, a tie %d, and a loss %d.
+
+    EXAMPLES:
+        (1) python -m pacai.bin.tournament --teams pacai.core.baselineTeam pacai.student.myTeam
+          - Plays the baseline team against pacai.student.myTeam on the default layout.
+        (2) python -m pacai.bin.tournament --teams teamA teamB teamC
+                --layouts defaultCapture RANDOM13 --workers 8 --output standings.txt
+          - Plays three teams against each other on two layouts using eight processes,
+            and saves the standings.
+    """ % (WIN_POINTS, TIE_POINTS, LOSS_POINTS)
+
+    parser = argparse.ArgumentParser(description = textwrap.dedent(description),
+            prog = os.path.basename(__file__), formatter_class = argparse.RawTextHelpFormatter)
+
+    parser.add_argument('-d', '--debug', dest = 'debug',
+            action = 'store_true', default = False,
+            help = 'set logging level to debug (default: %(default)s)')
+
+    parser.add_argument('-l', '--layouts', dest = 'layouts',
+            action = 'store', type = str, nargs = '+', default = ['defaultCapture'],
+            help = 'the layouts to play on, RANDOM<seed> can be used for a random seeded map '
+                + '(default: %(default)s)')
+
+    parser.add_argument('-o', '--output', dest = 'output',
+            action = 'store', type = str, default = None,
+            help = 'write the standings table to this path (default: %(default)s)')
+
+    parser.add_argument('-q', '--quiet', dest = 'quiet',
+            action = 'store_true', default = False,
+            help = 'set logging level to warning (default: %(default)s)')
+
+    parser.add_argument('-s', '--seed', dest = 'seed',
+            action = 'store', type = int, default = None,
+            help = 'Enter seed value to randomize the tournament')
+
+    parser.add_argument('-t', '--teams', dest = 'teams',
+            action = 'store', type = str, nargs = '+', required = True,
+            help = 'the team modules to enter, each must have a createTeam function')
+
+    parser.add_argument('-w', '--workers', dest = 'workers',
+            action = 'store', type = int, default = multiprocessing.cpu_count(),
+            help = 'play this many matches at once (default: %(default)s)')
+
+    parser.add_argument('--max-moves', dest = 'maxMoves',
+            action = 'store', type = int, default = DEFAULT_LENGTH,
+            help = 'set maximum number of moves in a match (default: %(default)s)')
+
+    parser.add_argument('--match-timeout', dest = 'matchTimeout',
+            action = 'store', type = float, default = None,
+            help = 'stop (and do not count) a match that takes more than this many seconds, '
+                + 'the default is the most time the agents are allowed in total '
+                + '(default: %(default)s)')
+
+    options = parser.parse_args(argv)
+
+    if options.quiet and options.debug:
+        raise ValueError('Logging cannont be set to both debug and quiet.')
+
+    if options.quiet:
+        updateLoggingLevel(logging.WARNING)
+    elif options.debug:
+        updateLoggingLevel(logging.DEBUG)
+
+    if (len(options.teams) < 2):
+        raise ValueError('A tournament needs at least two teams.')
+
+    if (options.workers < 1):
+        raise ValueError('The number of workers must be positive.')
+
+    if (options.matchTimeout is not None and options.matchTimeout <= 0):
+        raise ValueError('The match timeout must be positive.')
+
+    seed = options.seed
+    if seed is None:
+        seed = random.randint(0, 2**32)
+    logging.debug('Seed value: ' + str(seed))
+
+    return {
+        'teams': options.teams,
+        'layoutNames': options.layouts,
+        'workers': options.workers,
+        'seed': seed,
+        'length': options.maxMoves,
+        'matchTimeout': options.matchTimeout,
+        'output': options.output,
+    }
+
+def main(argv):
+    """
+    Entry point for a capture tournament.
+    The args are a blind pass of `sys.argv` with the executable stripped.
+    """
+
+    initLogging()
+
+    args = readCommand(argv)
+    output = args.pop('output')
+
+    results, standings = runTournament(**args)
+
+    table = formatStandings(standings)
+    logging.info('Standings:\n' + table)
+
+    if (output is not None):
+        with open(output, 'w') as file:
+            file.write(table + '\n')
+
+        logging.info("Standings written to: '%s'." % (output))
+
+    return results, standings
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
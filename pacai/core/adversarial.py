@@ -0,0 +1,509 @@
+"""
+A reusable engine for adversarial (multi-agent) search.
+
+`AlphaBetaSearch` runs an iterative deepening alpha-beta search over a game state,
+where some agents (the maximizers) try to raise the value of the evaluation function
+and every other agent tries to lower it.
+Instead of making a successor for every node, the search walks a single state
+down and back up with `pacai.core.gamestate.AbstractGameState.applyMove`.
+
+Each depth is searched with the results of the last one:
+a transposition table (keyed by the state's hash) remembers values and best moves,
+and moves are tried in the order of the table's best move, the killer moves for that ply
+(moves that caused cutoffs in sibling nodes), and then the history heuristic
+(how often and how deep each move caused a cutoff).
+A search can be given a time limit, in which case the best move from the deepest finished depth
+is returned once time runs out.
+
+`RootParallelSearch` runs the same search with each of the searching agent's actions
+on a different process.
+"""
+
+import multiprocessing
+import pickle
+import time
+
+# The bounds of values in the transposition table.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Once the transposition table has this many entries, it is cleared.
+DEFAULT_MAX_TABLE_SIZE = 1000000
+
+# The number of killer moves kept for each ply.
+NUM_KILLER_MOVES = 2
+
+# How long a root-parallel search waits on its workers after the deadline.
+DEADLINE_GRACE = 0.1
+
+# The search used by each worker process of a `RootParallelSearch`,
+# and the layout that states are rebuilt on.
+_workerSearch = None
+_workerLayout = None
+
+class _SearchTimeout(Exception):
+    pass
+
+class AlphaBetaSearch(object):
+    """
+    An iterative deepening alpha-beta search with a transposition table and move ordering.
+
+    Depths are counted like `pacai.agents.search.multiagent.MultiAgentSearchAgent`'s:
+    a depth of one is a single move for every agent.
+    The transposition table and the history heuristic are kept between searches,
+    so it pays to keep a single engine around for an entire game.
+    """
+
+    def __init__(self, evaluationFunction, maxTableSize = DEFAULT_MAX_TABLE_SIZE):
+        self._evaluationFunction = evaluationFunction
+        self._maxTableSize = maxTableSize
+
+        # {(state hash, agent index): (plies, value, bound, best action), ...}
+        self._table = {}
+        # {ply: [action, ...], ...}
+        self._killers = {}
+        # {(agent index, position, action): score, ...}
+        self._history = {}
+
+        self._maximizers = set()
+        self._numAgents = 0
+        self._deadline = None
+        self._hitHorizon = False
+
+        self._stats = {}
+
+    def clear(self):
+        """
+        Forget everything learned from past searches.
+        """
+
+        self._table = {}
+        self._killers = {}
+        self._history = {}
+
+    def getStats(self):
+        """
+        Get information about the last search:
+        the deepest finished 'depth', its 'value', the number of 'nodes' visited,
+        the number of 'tableHits' (nodes answered by the transposition table),
+        and the 'time' taken (in seconds).
+        """
+
+        return dict(self._stats)
+
+    def search(self, state, agentIndex, maxDepth = None, timeLimit = None, maximizers = None):
+        """
+        Get the best action for an agent.
+
+        The search goes one depth deeper at a time until `maxDepth` is finished,
+        `timeLimit` seconds have passed, or the rest of the game has been searched.
+        At least one of `maxDepth` and `timeLimit` must be given.
+        The first depth is always finished (even if it takes longer than the time limit),
+        so there is always an action to return.
+
+        `maximizers` are the indexes of the agents on the searching agent's side
+        (by default, just the searching agent).
+
+        The state is modified during the search, but is put back the way it was before returning.
+        """
+
+        def searchDepth(plies):
+            return self._alphaBeta(state, agentIndex, plies, 0, float('-inf'), float('inf'))
+
+        results, _ = self._deepen(state, agentIndex, maxDepth, timeLimit, maximizers, searchDepth)
+        return results[-1][1]
+
+    def searchAction(self, state, agentIndex, action, maxDepth = None, timeLimit = None,
+            maximizers = None):
+        """
+        Search a single action of the agent to move (deepening the same way as `search`).
+        This is how `RootParallelSearch` splits up a search.
+
+        Returns the value of the action at each finished depth (as a list),
+        and if the whole game after the action was searched
+        (so the last value holds for any deeper depth).
+        """
+
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+
+        def searchDepth(plies):
+            token = state.applyMove(agentIndex, action)
+            try:
+                value, _ = self._alphaBeta(state, nextAgent, plies - 1, 1,
+                        float('-inf'), float('inf'))
+            finally:
+                state.undoMove(token)
+
+            return value, action
+
+        results, complete = self._deepen(state, agentIndex, maxDepth, timeLimit, maximizers,
+                searchDepth)
+        return [value for (value, _) in results], complete
+
+    def _alphaBeta(self, state, agentIndex, plies, ply, alpha, beta):
+        """
+        Get the (value, best action) of a state with `plies` moves left to search.
+        `ply` is the number of moves made since the root.
+        """
+
+        self._stats['nodes'] += 1
+
+        if (self._deadline is not None and time.perf_counter() > self._deadline):
+            raise _SearchTimeout()
+
+        if (state.isOver()):
+            return self._evaluationFunction(state), None
+
+        if (plies == 0):
+            self._hitHorizon = True
+            return self._evaluationFunction(state), None
+
+        key = (hash(state), agentIndex)
+        tableAction = None
+
+        entry = self._table.get(key)
+        if (entry is not None):
+            entryPlies, value, bound, tableAction = entry
+
+            # The root always gets searched, so that the returned action is known to be legal.
+            if (ply > 0 and entryPlies >= plies and (bound == EXACT
+                    or (bound == LOWER_BOUND and value >= beta)
+                    or (bound == UPPER_BOUND and value <= alpha))):
+                self._stats['tableHits'] += 1
+                # The table does not know if this line reached the horizon, so assume it did.
+                self._hitHorizon = True
+                return value, tableAction
+
+        actions = self._orderActions(state, agentIndex, ply, tableAction)
+        if (len(actions) == 0):
+            return self._evaluationFunction(state), None
+
+        maximizing = (agentIndex in self._maximizers)
+        nextAgent = (agentIndex + 1) % self._numAgents
+
+        originalAlpha = alpha
+        originalBeta = beta
+
+        bestValue = None
+        bestAction = None
+
+        for action in actions:
+            token = state.applyMove(agentIndex, action)
+            try:
+                value, _ = self._alphaBeta(state, nextAgent, plies - 1, ply + 1, alpha, beta)
+            finally:
+                state.undoMove(token)
+
+            if (maximizing):
+                if (bestValue is None or value > bestValue):
+                    bestValue = value
+                    bestAction = action
+                alpha = max(alpha, value)
+            else:
+                if (bestValue is None or value < bestValue):
+                    bestValue = value
+                    bestAction = action
+                beta = min(beta, value)
+
+            if (alpha >= beta):
+                self._recordCutoff(state, agentIndex, action, plies, ply)
+                break
+
+        if (bestValue <= originalAlpha):
+            bound = UPPER_BOUND
+        elif (bestValue >= originalBeta):
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+
+        self._table[key] = (plies, bestValue, bound, bestAction)
+
+        return bestValue, bestAction
+
+    def _deepen(self, state, agentIndex, maxDepth, timeLimit, maximizers, searchDepth):
+        """
+        Call `searchDepth` with the number of plies for one depth at a time.
+        Returns the (value, action) for each finished depth,
+        and if the last depth searched the rest of the game.
+        """
+
+        if (maxDepth is None and timeLimit is None):
+            raise ValueError('An adversarial search needs a max depth or a time limit.')
+
+        startTime = time.perf_counter()
+
+        deadline = None
+        if (timeLimit is not None):
+            deadline = startTime + timeLimit
+
+        if (maximizers is None):
+            maximizers = [agentIndex]
+
+        self._maximizers = set(maximizers)
+        self._numAgents = state.getNumAgents()
+        self._killers = {}
+
+        # Older cutoffs count for less.
+        for key in self._history:
+            self._history[key] //= 2
+
+        if (len(self._table) > self._maxTableSize):
+            self._table = {}
+
+        self._stats = {
+            'depth': 0,
+            'value': None,
+            'nodes': 0,
+            'tableHits': 0,
+            'time': 0.0,
+        }
+
+        results = []
+        complete = False
+        depth = 0
+
+        while (maxDepth is None or depth < maxDepth):
+            depth += 1
+
+            self._hitHorizon = False
+            self._deadline = None
+            if (depth > 1):
+                self._deadline = deadline
+
+            try:
+                value, action = searchDepth(depth * self._numAgents)
+            except _SearchTimeout:
+                break
+
+            results.append((value, action))
+            self._stats['depth'] = depth
+            self._stats['value'] = value
+
+            # Every line of play ended before the depth limit, so going deeper will not help.
+            if (not self._hitHorizon):
+                complete = True
+                break
+
+            if (deadline is not None and time.perf_counter() >= deadline):
+                break
+
+        self._deadline = None
+        self._stats['time'] = time.perf_counter() - startTime
+
+        return results, complete
+
+    def _orderActions(self, state, agentIndex, ply, tableAction):
+        """
+        Order an agent's legal actions from most to least likely to cause a cutoff.
+        Ties keep the order of the legal actions, so searches are repeatable.
+        """
+
+        killers = self._killers.get(ply, [])
+        history = self._history
+        position = state.getAgentPosition(agentIndex)
+
+        def priority(action):
+            if (action == tableAction):
+                return (0, 0)
+
+            if (action in killers):
+                return (1, killers.index(action))
+
+            return (2, -history.get((agentIndex, position, action), 0))
+
+        return sorted(state.getLegalActions(agentIndex), key = priority)
+
+    def _recordCutoff(self, state, agentIndex, action, plies, ply):
+        killers = self._killers.setdefault(ply, [])
+        if (action not in killers):
+            killers.insert(0, action)
+            del killers[NUM_KILLER_MOVES:]
+
+        key = (agentIndex, state.getAgentPosition(agentIndex), action)
+        self._history[key] = self._history.get(key, 0) + plies * plies
+
+class RootParallelSearch(object):
+    """
+    Splits an `AlphaBetaSearch` up by the searching agent's legal actions,
+    and searches each action on its own worker process (with a shared deadline).
+
+    Workers are started with the layout (which never changes during a game),
+    so only a snapshot of the state (see `pacai.core.gamestate.AbstractGameState.getSnapshot`)
+    and the depth are sent to the workers for each search.
+    Each worker rebuilds states on its own copy of the layout, so its state hashes are consistent
+    from one search to the next,
+    and it keeps its own `AlphaBetaSearch` (and transposition table) until the pool is closed.
+    Searching a state on a different layout starts new workers.
+    An action's value is taken from the deepest depth that every action finished,
+    so actions are always compared at the same depth.
+
+    Root actions are not searched with each other's bounds,
+    so this does more work than a serial search to the same depth
+    and only pays off with more than a couple of workers.
+    """
+
+    def __init__(self, evaluationFunction, workers):
+        self._evaluationFunction = evaluationFunction
+        self._workers = workers
+        self._pool = None
+        self._layout = None
+
+        self._stats = {}
+
+    def clear(self):
+        """
+        Forget everything learned from past searches.
+        The workers are stopped, and new ones are started by the next search.
+        """
+
+        self.close()
+
+    def close(self):
+        if (self._pool is not None):
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._layout = None
+
+    def getStats(self):
+        """
+        Get information about the last search (the same as `AlphaBetaSearch.getStats`).
+        """
+
+        return dict(self._stats)
+
+    def search(self, state, agentIndex, maxDepth = None, timeLimit = None, maximizers = None):
+        """
+        Get the best action for an agent (see `AlphaBetaSearch.search`).
+
+        Once the time limit (and a short grace period) is up, actions that have not come back
+        from the workers are left out, and the workers are restarted.
+        """
+
+        if (maxDepth is None and timeLimit is None):
+            raise ValueError('An adversarial search needs a max depth or a time limit.')
+
+        startTime = time.time()
+
+        actions = state.getLegalActions(agentIndex)
+        if (len(actions) == 1):
+            self._stats = {'depth': 0, 'value': None, 'nodes': 0, 'tableHits': 0, 'time': 0.0}
+            return actions[0]
+
+        if (maximizers is None):
+            maximizers = [agentIndex]
+
+        deadline = None
+        if (timeLimit is not None):
+            deadline = startTime + timeLimit
+
+        snapshot = pickle.dumps(state.getSnapshot(), protocol = pickle.HIGHEST_PROTOCOL)
+
+        pool = self._getPool(state.getInitialLayout())
+
+        pending = []
+        for action in actions:
+            task = (snapshot, agentIndex, action, maxDepth, maximizers, deadline)
+            pending.append(pool.apply_async(_searchRootAction, (task,)))
+
+        # {action: (values, complete), ...}
+        results = {}
+        nodes = 0
+        tableHits = 0
+
+        for (action, result) in zip(actions, pending):
+            waitTime = None
+            if (deadline is not None):
+                waitTime = max(0.0, deadline + DEADLINE_GRACE - time.time())
+
+            try:
+                values, complete, stats = result.get(waitTime)
+            except multiprocessing.TimeoutError:
+                # The workers are still busy with this search, so start over with new ones.
+                self.close()
+                break
+
+            results[action] = (values, complete)
+            nodes += stats['nodes']
+            tableHits += stats['tableHits']
+
+        depth, value, bestAction = _mergeRootActions(actions, results,
+                (agentIndex in maximizers))
+
+        self._stats = {
+            'depth': depth,
+            'value': value,
+            'nodes': nodes,
+            'tableHits': tableHits,
+            'time': time.time() - startTime,
+        }
+
+        return bestAction
+
+    def _getPool(self, layout):
+        if (self._pool is not None and self._layout is not layout):
+            self.close()
+
+        if (self._pool is None):
+            self._pool = multiprocessing.Pool(self._workers, initializer = _initWorker,
+                    initargs = (self._evaluationFunction, layout))
+            self._layout = layout
+
+        return self._pool
+
+def _initWorker(evaluationFunction, layout):
+    global _workerSearch, _workerLayout
+    _workerSearch = AlphaBetaSearch(evaluationFunction)
+    _workerLayout = layout
+
+def _mergeRootActions(actions, results, maximizing):
+    """
+    Pick the best action from the values of each action at each depth.
+    Returns the depth used, the best value, and the best action
+    (the first action if no action finished a depth).
+    """
+
+    depths = [len(values) for (values, complete) in results.values() if (not complete)]
+    if (len(depths) > 0):
+        depth = min(depths)
+    else:
+        depth = max([len(values) for (values, _) in results.values()] + [0])
+
+    if (depth == 0):
+        return 0, None, actions[0]
+
+    bestValue = None
+    bestAction = None
+
+    # Actions are checked in their legal order, so ties go to the earliest one.
+    for action in actions:
+        if (action not in results):
+            continue
+
+        # The whole game after a complete action was searched, so its last value is exact.
+        values, _ = results[action]
+        value = values[min(depth, len(values)) - 1]
+
+        if (bestValue is None
+                or (maximizing and value > bestValue)
+                or (not maximizing and value < bestValue)):
+            bestValue = value
+            bestAction = action
+
+    return depth, bestValue, bestAction
+
+def _searchRootAction(task):
+    snapshot, agentIndex, action, maxDepth, maximizers, deadline = task
+
+    snapshot = pickle.loads(snapshot)
+    state = snapshot[0].fromSnapshot(snapshot, _workerLayout)
+
+    timeLimit = None
+    if (deadline is not None):
+        timeLimit = max(0.0, deadline - time.time())
+
+    values, complete = _workerSearch.searchAction(state, agentIndex, action,
+            maxDepth = maxDepth, timeLimit = timeLimit, maximizers = maximizers)
+
+    return values, complete, _workerSearch.getStats()
@@ -9,8 +9,13 @@ class AgentState:
     The convention for positions, like a graph, is that (0, 0) is the lower left corner,
     x increases horizontally and y increases vertically.
     Therefore, north is the direction of increasing y, or (0, 1).
+
+    Game states make a lot of agent states, so they are kept small (with slots) and cheap to copy.
     """
 
+    __slots__ = ['_startPosition', '_startDirection', '_startIsPacman',
+            '_position', '_direction', '_isPacman', '_scaredTimer']
+
     def __init__(self, position, direction, isPacman):
         # Save the starting information for later use.
         self._startPosition = position
@@ -24,7 +29,12 @@ class AgentState:
         self._scaredTimer = 0
 
     def copy(self):
-        state = AgentState(self._startPosition, self._startDirection, self._startIsPacman)
+        # Skip __init__, every field is about to be set.
+        state = AgentState.__new__(AgentState)
+
+        state._startPosition = self._startPosition
+        state._startDirection = self._startDirection
+        state._startIsPacman = self._startIsPacman
 
         state._isPacman = self._isPacman
         state._position = self._position
@@ -114,6 +124,14 @@ class AgentState:
                 and self._isPacman == other._isPacman
                 and self._scaredTimer == other._scaredTimer)
 
+    def __setstate__(self, state):
+        # Agent states that were pickled before slots (e.g. in old replays) are a plain dict.
+        if (isinstance(state, tuple)):
+            state = state[1]
+
+        for (name, value) in state.items():
+            setattr(self, name, value)
+
     def __hash__(self):
         return util.buildHash(self._position, self._direction, self._isPacman, self._scaredTimer)
 
@@ -1,10 +1,61 @@
+import array
+import collections
+import hashlib
+import logging
+import mmap
+import os
+import secrets
+import struct
 import sys
+import tempfile
 
 from pacai.core.distance import manhattan
 from pacai.util import priorityQueue
 
+# Shared memory is only available in Python >= 3.8.
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# NumPy is optional.
+# When it is available, distance matrices can also be viewed as NumPy arrays.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 DEFAULT_DISTANCE = 10000
 
+# The type used to store distances.
+# All distances (including DEFAULT_DISTANCE) must fit in a signed 16-bit int.
+DISTANCE_TYPECODE = 'h'
+
+# Distance matrices are only cached on disk (keyed by a digest of the walls)
+# if this environment variable is set to the directory to use.
+# The directory is created as private to the current user,
+# and files that are not owned by the current user (or that others can write to) are ignored.
+CACHE_DIR_ENV = 'PACAI_DISTANCE_CACHE'
+CACHE_DIR_MODE = 0o700
+
+CACHE_FILE_EXTENSION = '.dist'
+# Magic, format version, byte order, number of cells, digest of the walls.
+CACHE_HEADER = struct.Struct('<4sBcI32s')
+CACHE_MAGIC = b'PACD'
+CACHE_VERSION = 2
+
+# Published distance matrices are named by a prefix, a token for the publishing process,
+# and a (truncated) digest of the walls.
+# So, segments left behind by a crashed run are never picked up by a later one.
+# Some platforms limit shared memory names to 31 characters.
+SHARED_MEMORY_PREFIX = 'pacai_'
+SHARED_MEMORY_TOKEN_BYTES = 4
+SHARED_MEMORY_DIGEST_LENGTH = 14
+
+# The token of the process that published distance matrices,
+# set by that process so that workers it starts can find them.
+SHARED_MEMORY_TOKEN_ENV = 'PACAI_SHARED_DISTANCES'
+
 class Distancer(object):
     """
     A class for computing and caching the shortest path between any two points in a given maze.
@@ -48,11 +99,11 @@ class Distancer(object):
         return bestDistance
 
     def getDistanceOnGrid(self, pos1, pos2):
-        key = (pos1, pos2)
-        if key in self._distances:
-            return self._distances[key]
+        distance = self._distances.getDistance(pos1, pos2)
+        if (distance is not None):
+            return distance
 
-        raise Exception("Position not in grid: " + str(key))
+        raise Exception("Position not in grid: " + str((pos1, pos2)))
 
     def isReadyForMazeDistance(self):
         return (self._distances is not None)
@@ -88,13 +139,433 @@ class DistanceCalculator:
 
     def run(self):
         if self.layout.walls not in self.cache:
-            self.cache[self.layout.walls] = computeDistances(self.layout)
+            self.cache[self.layout.walls] = getDistanceMatrix(self.layout)
 
         self.distancer._distances = self.cache[self.layout.walls]
 
+class DistanceMatrix(object):
+    """
+    All-pairs maze distances stored as a dense V x V matrix of signed 16-bit ints
+    (where V is the number of open cells), along with a map of cells to matrix indexes.
+    Unreachable pairs have a distance of DEFAULT_DISTANCE.
+
+    The matrix is kept as a flat row-major buffer.
+    When NumPy is available, `DistanceMatrix.getMatrix` exposes it as a V x V int16 array
+    without copying.
+    If the buffer is in shared memory, the matrix keeps the memory open until it is deleted.
+    """
+
+    def __init__(self, cells, data, memory = None):
+        self._cells = cells
+        self._indexes = {cell: index for (index, cell) in enumerate(cells)}
+        self._size = len(cells)
+        self._data = data
+        self._memory = memory
+
+    def __del__(self):
+        if (self._memory is None):
+            return
+
+        # Shared memory can only be closed once nothing is looking into it.
+        try:
+            self._data.release()
+        except BufferError:
+            # The distances are still in use (e.g. an array from `DistanceMatrix.getMatrix`),
+            # so the memory stays open for the rest of the process.
+            _openMemory.append(self._memory)
+            return
+
+        self._memory.close()
+
+    def getCells(self):
+        return self._cells
+
+    def getDistance(self, pos1, pos2):
+        """
+        Get the maze distance between two integral positions.
+        Returns None if either position is not an open cell.
+        """
+
+        index1 = self._indexes.get(pos1)
+        index2 = self._indexes.get(pos2)
+
+        if (index1 is None or index2 is None):
+            return None
+
+        return int(self._data[index1 * self._size + index2])
+
+    def getData(self):
+        """
+        Get the flat row-major buffer of distances.
+        """
+
+        return self._data
+
+    def getIndex(self, position):
+        return self._indexes.get(position)
+
+    def getMatrix(self):
+        """
+        Get the distances as a read-only V x V NumPy int16 array
+        (indexed by `DistanceMatrix.getIndex`).
+        Returns None if NumPy is not installed.
+        """
+
+        if (numpy is None):
+            return None
+
+        matrix = numpy.frombuffer(self._data, dtype = numpy.int16).reshape(self._size, self._size)
+
+        # Matrices are shared between all users of the same walls.
+        matrix.flags.writeable = False
+
+        return matrix
+
+def computeDistanceMatrix(layout):
+    """
+    Runs a unit-cost BFS from every open position and
+    collects the results in a `DistanceMatrix`.
+    """
+
+    cells = layout.walls.asList(False)
+    indexes = {cell: index for (index, cell) in enumerate(cells)}
+    size = len(cells)
+
+    # The index of each cell's open neighbors.
+    neighbors = []
+    for (x, y) in cells:
+        adjacent = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+        neighbors.append([indexes[cell] for cell in adjacent if (cell in indexes)])
+
+    data = array.array(DISTANCE_TYPECODE)
+    unreached = array.array(DISTANCE_TYPECODE, [DEFAULT_DISTANCE]) * size
+
+    for source in range(size):
+        row = unreached[:]
+        row[source] = 0
+
+        queue = [source]
+        for node in queue:
+            nextDistance = row[node] + 1
+            for other in neighbors[node]:
+                if (row[other] == DEFAULT_DISTANCE):
+                    row[other] = nextDistance
+                    queue.append(other)
+
+        data.extend(row)
+
+    return DistanceMatrix(cells, data)
+
+##############
+# DISK CACHE #
+##############
+
+def getCacheDir():
+    """
+    Get the directory used to cache distance matrices on disk,
+    or None if the disk cache is disabled (the default).
+    """
+
+    cacheDir = os.environ.get(CACHE_DIR_ENV, '')
+    if (cacheDir == ''):
+        return None
+
+    return cacheDir
+
+def getCachePath(layout, cacheDir):
+    """
+    Get the path of a layout's cached distance matrix.
+    The cache is content-addressed, so any layouts with the same walls share a file.
+    """
+
+    return os.path.join(cacheDir, getWallsDigest(layout) + CACHE_FILE_EXTENSION)
+
+def getWallsDigest(layout):
+    return _getWallsKey(layout).hex()
+
+def loadDistanceMatrix(layout, cacheDir = None):
+    """
+    Get the `DistanceMatrix` for a layout.
+    The matrix is memory-mapped from the disk cache when possible,
+    otherwise it is computed and written to the cache for later calls (in any process).
+    """
+
+    if (cacheDir is None):
+        cacheDir = getCacheDir()
+
+    if (cacheDir is None):
+        return computeDistanceMatrix(layout)
+
+    path = getCachePath(layout, cacheDir)
+    wallsKey = _getWallsKey(layout)
+
+    distances = readDistanceMatrix(path, wallsKey)
+    if (distances is not None and distances.getCells() == layout.walls.asList(False)):
+        return distances
+
+    distances = computeDistanceMatrix(layout)
+
+    try:
+        writeDistanceMatrix(path, distances, wallsKey)
+    except OSError as ex:
+        logging.debug("Could not write distance cache '%s': %s" % (path, ex))
+
+    return distances
+
+def readDistanceMatrix(path, wallsKey):
+    """
+    Memory-map a distance matrix written by `writeDistanceMatrix` for the walls with the given key
+    (see `getWallsDigest`, as raw bytes).
+    Returns None if the file does not exist, is not usable, is for other walls,
+    or could have been written by another user.
+    """
+
+    try:
+        with open(path, 'rb') as file:
+            if (not _isTrustedFile(file)):
+                logging.warning("Ignoring an untrusted distance cache file: '%s'."
+                        % (path))
+                return None
+
+            data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    distances = _unpackDistanceMatrix(memoryview(data), wallsKey, exact = True)
+    if (distances is None):
+        data.close()
+
+    return distances
+
+def writeDistanceMatrix(path, distances, wallsKey):
+    """
+    Write a distance matrix in a memory-mappable format:
+    a header, the cells as pairs of int16, and then the row-major int16 matrix.
+    The file is written atomically, so concurrent readers never see a partial file.
+    """
+
+    os.makedirs(os.path.dirname(path), mode = CACHE_DIR_MODE, exist_ok = True)
+
+    handle, tempPath = tempfile.mkstemp(dir = os.path.dirname(path))
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            for chunk in _packDistanceMatrix(distances, wallsKey):
+                file.write(chunk)
+
+        os.replace(tempPath, path)
+    except BaseException:
+        os.remove(tempPath)
+        raise
+
+def _byteOrderCode():
+    return sys.byteorder[0].encode('ascii')
+
+def _getWallsKey(layout):
+    return hashlib.sha256(str(layout.walls).encode('utf-8')).digest()
+
+def _isTrustedFile(file):
+    """
+    Check that an open file belongs to the current user and that no one else can write to it.
+    Platforms without user ids trust every file.
+    """
+
+    if (not hasattr(os, 'getuid')):
+        return True
+
+    info = os.fstat(file.fileno())
+    return (info.st_uid == os.getuid() and (info.st_mode & 0o022) == 0)
+
+def _packDistanceMatrix(distances, wallsKey):
+    """
+    Get the chunks of bytes-like objects that make up a packed distance matrix.
+    """
+
+    cells = distances.getCells()
+    coordinates = array.array(DISTANCE_TYPECODE, [value for cell in cells for value in cell])
+
+    return [
+        CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, _byteOrderCode(), len(cells), wallsKey),
+        coordinates.tobytes(),
+        distances.getData(),
+    ]
+
+def _packedSize(numCells):
+    # Cells are two int16, distances are one int16.
+    return CACHE_HEADER.size + (numCells * 2 * 2) + (numCells * numCells * 2)
+
+def _unpackDistanceMatrix(view, wallsKey, exact = False, memory = None):
+    """
+    Build a `DistanceMatrix` that uses a packed buffer in place
+    (and owns the shared memory the buffer is in, if given).
+    Returns None if the buffer does not hold a valid distance matrix for the walls with this key.
+    An `exact` buffer must be exactly the size of the matrix
+    (shared memory may be rounded up to a page size, so it is only checked for truncation).
+    """
+
+    if (len(view) < CACHE_HEADER.size):
+        return None
+
+    magic, version, byteOrder, size, key = CACHE_HEADER.unpack_from(view, 0)
+    if (magic != CACHE_MAGIC or version != CACHE_VERSION or byteOrder != _byteOrderCode()
+            or key != wallsKey):
+        return None
+
+    end = _packedSize(size)
+    if (len(view) < end or (exact and len(view) != end)):
+        return None
+
+    cellsEnd = CACHE_HEADER.size + (size * 2 * 2)
+
+    coordinates = view[CACHE_HEADER.size:cellsEnd].cast(DISTANCE_TYPECODE)
+    cells = [(coordinates[2 * i], coordinates[2 * i + 1]) for i in range(size)]
+
+    return DistanceMatrix(cells, view[cellsEnd:end].cast(DISTANCE_TYPECODE), memory)
+
+############################
+# SHARED DISTANCE REGISTRY #
+############################
+
+# The most distance matrices to keep loaded (the least recently used are dropped).
+MAX_REGISTERED_MATRICES = 8
+
+# Distance matrices already loaded by this process, keyed by walls.
+_registry = collections.OrderedDict()
+
+# Shared memory that could not be closed when its matrix was deleted (see `DistanceMatrix`).
+_openMemory = []
+
+# The (process id, token) used to name the matrices this process publishes.
+_publishToken = None
+
+def getDistanceMatrix(layout):
+    """
+    Get the `DistanceMatrix` for a layout,
+    building it at most once per process (as long as the layout has been used recently).
+    All callers with the same walls share the same (read-only) matrix.
+
+    The matrix is found (in order) in this process,
+    in shared memory published by a `SharedDistanceMatrix`,
+    in the disk cache (see `loadDistanceMatrix`),
+    or finally by computing it.
+    """
+
+    distances = _registry.get(layout.walls)
+    if (distances is not None):
+        _registry.move_to_end(layout.walls)
+        return distances
+
+    distances = _attachDistanceMatrix(layout)
+    if (distances is None):
+        distances = loadDistanceMatrix(layout)
+
+    _registry[layout.walls.copy()] = distances
+    while (len(_registry) > MAX_REGISTERED_MATRICES):
+        _registry.popitem(last = False)
+
+    return distances
+
+def getSharedMemoryName(layout, token):
+    return (SHARED_MEMORY_PREFIX + token + '_'
+            + getWallsDigest(layout)[:SHARED_MEMORY_DIGEST_LENGTH])
+
+class SharedDistanceMatrix(object):
+    """
+    Publishes a layout's distance matrix in shared memory,
+    so that worker processes can use it without computing or copying it.
+    Any `getDistanceMatrix` call for a layout with the same walls (in any process)
+    will attach to the published matrix.
+
+    Create this in the parent process before starting workers,
+    and call `SharedDistanceMatrix.close` (or use it as a context manager) once they are done.
+    Shared memory requires Python 3.8 or later.
+
+    Example:
+    ```
+    with SharedDistanceMatrix(layout):
+        pool.map(runGame, games)
+    ```
+    """
+
+    def __init__(self, layout):
+        if (shared_memory is None):
+            raise RuntimeError('Shared memory distance matrices require Python 3.8 or later.')
+
+        distances = getDistanceMatrix(layout)
+        chunks = _packDistanceMatrix(distances, _getWallsKey(layout))
+
+        token = _getPublishToken()
+        self._memory = shared_memory.SharedMemory(name = getSharedMemoryName(layout, token),
+                create = True, size = _packedSize(len(distances.getCells())))
+
+        # Workers started from here on (forked or spawned) will look for this process' token.
+        os.environ[SHARED_MEMORY_TOKEN_ENV] = token
+
+        offset = 0
+        for chunk in chunks:
+            chunk = memoryview(chunk).cast('B')
+            self._memory.buf[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+
+    def close(self):
+        """
+        Stop publishing the matrix.
+        Processes that already attached to it can keep using it.
+        """
+
+        if (self._memory is None):
+            return
+
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+def _attachDistanceMatrix(layout):
+    if (shared_memory is None):
+        return None
+
+    token = os.environ.get(SHARED_MEMORY_TOKEN_ENV, '')
+    if (token == ''):
+        return None
+
+    try:
+        memory = shared_memory.SharedMemory(name = getSharedMemoryName(layout, token))
+    except (OSError, ValueError):
+        return None
+
+    # The matrix uses the memory in place, and closes it once the matrix is no longer used.
+    distances = _unpackDistanceMatrix(memory.buf, _getWallsKey(layout), memory = memory)
+    if (distances is None):
+        memory.close()
+        return None
+
+    return distances
+
+def _getPublishToken():
+    """
+    Get the random token that names the matrices published by this process.
+    A forked child gets its own token, instead of sharing its parent's.
+    """
+
+    global _publishToken
+
+    if (_publishToken is None or _publishToken[0] != os.getpid()):
+        _publishToken = (os.getpid(), secrets.token_hex(SHARED_MEMORY_TOKEN_BYTES))
+
+    return _publishToken[1]
+
 def computeDistances(layout):
     """
     Runs UCS to all other positions from each position.
+    Returns a dict of {(target, source): distance, ...}.
+
+    `Distancer` uses the more compact `computeDistanceMatrix`,
+    this is kept for callers that want distances as a dict.
     """
 
     distances = {}
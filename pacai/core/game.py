@@ -8,9 +8,17 @@ import time
 class Game:
     """
     The Game manages the control flow, soliciting actions from agents.
+
+    A headless game never touches its display,
+    only keeps its move history if `recordHistory` is set,
+    and only times agents when timeouts are enforced.
+    This is meant for playing many games in batches (e.g. training).
+
+    A game with a profiler (see `pacai.core.profile.GameProfiler`) is never headless.
     """
 
-    def __init__(self, agents, display, rules, startingIndex = 0, catchExceptions = False):
+    def __init__(self, agents, display, rules, startingIndex = 0, catchExceptions = False,
+            headless = False, recordHistory = True):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -18,6 +26,14 @@ class Game:
         self.startingIndex = startingIndex
         self.gameOver = False
         self.moveHistory = []
+
+        self.headless = headless
+        self.recordHistory = recordHistory
+
+        # An optional `pacai.core.replay.ReplayWriter` that moves are streamed to.
+        self.recorder = None
+        # An optional `pacai.core.profile.GameProfiler` that collects timings.
+        self.profiler = None
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.agentTimeout = False
@@ -32,6 +48,20 @@ class Game:
 
         self.numMoves = 0
 
+        if (self.profiler is not None):
+            with self.profiler.profileGame(self):
+                return self._runWithDisplay()
+
+        if (self.headless):
+            return self._runHeadless()
+
+        return self._runWithDisplay()
+
+    def _runWithDisplay(self):
+        """
+        The main control loop, updating the display after every move.
+        """
+
         agentIndex = self.startingIndex
         numAgents = len(self.agents)
 
@@ -68,7 +98,9 @@ class Game:
                 return False
 
             # Execute the action.
-            self.moveHistory.append((agentIndex, action))
+            if (self.recordHistory):
+                self.moveHistory.append((agentIndex, action))
+
             try:
                 self.state = self.state.generateSuccessor(agentIndex, action)
             except Exception as ex:
@@ -84,6 +116,9 @@ class Game:
             # Allow for game specific conditions (winning, losing, etc.).
             self.rules.process(self.state, self)
 
+            if (self.recorder is not None):
+                self.recorder.recordMove(agentIndex, action, self.state)
+
             # Track progress.
             if (agentIndex == numAgents + 1):
                 self.numMoves += 1
@@ -96,6 +131,71 @@ class Game:
 
         self.display.finish()
 
+    def _runHeadless(self):
+        """
+        The main control loop, without any display and with as little bookkeeping as possible.
+        """
+
+        agentIndex = self.startingIndex
+        agents = self.agents
+        numAgents = len(agents)
+
+        rules = self.rules
+        recorder = self.recorder
+        enforceTimeouts = self.enforceTimeouts
+        recordHistory = self.recordHistory
+
+        if (not self._registerInitialState()):
+            return False
+
+        while (not self.gameOver):
+            agent = agents[agentIndex]
+
+            if (enforceTimeouts):
+                startTime = time.time()
+
+            # Get an action from the agent.
+            try:
+                agent.observationFunction(self.state)
+                action = agent.getAction(self.state)
+            except Exception as ex:
+                if (not self.catchExceptions):
+                    raise ex
+
+                self._agentCrash(agentIndex, ex)
+                return False
+
+            if (enforceTimeouts):
+                timeTaken = time.time() - startTime
+                self.totalAgentTimes[agentIndex] += timeTaken
+
+                if (self._checkForTimeouts(agentIndex, timeTaken)):
+                    return False
+
+            # Execute the action.
+            if (recordHistory):
+                self.moveHistory.append((agentIndex, action))
+
+            try:
+                self.state = self.state.generateSuccessor(agentIndex, action)
+            except Exception as ex:
+                if (not self.catchExceptions):
+                    raise ex
+
+                self._agentCrash(agentIndex, ex)
+                return False
+
+            # Allow for game specific conditions (winning, losing, etc.).
+            rules.process(self.state, self)
+
+            if (recorder is not None):
+                recorder.recordMove(agentIndex, action, self.state)
+
+            agentIndex = (agentIndex + 1) % numAgents
+
+        if (not self._registerFinalState()):
+            return False
+
     def _agentCrash(self, agentIndex, exception = None):
         """
         Helper method for handling agent crashes.
@@ -168,6 +268,11 @@ class Game:
             startTime = time.time()
 
             try:
+                # Agents do not have to be `pacai.agents.base.BaseAgent`s.
+                setMoveWarningTime = getattr(agent, 'setMoveWarningTime', None)
+                if (setMoveWarningTime is not None):
+                    setMoveWarningTime(self.rules.getMoveWarningTime(agentIndex))
+
                 agent.registerInitialState(self.state)
             except Exception as ex:
                 if (not self.catchExceptions):
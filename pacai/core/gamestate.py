@@ -1,9 +1,7 @@
 import abc
-import copy
 
 from pacai.core.agentstate import AgentState
 from pacai.core.directions import Directions
-from pacai.util import util
 
 class AbstractGameState(abc.ABC):
     """
@@ -26,6 +24,12 @@ class AbstractGameState(abc.ABC):
         # Any children should be sure to clear the hash when modifications are made.
         self._hash = None
 
+        # The board components (food, capsules, score, and game over status) are
+        # Zobrist hashed incrementally as they change.
+        # See `pacai.core.zobrist`.
+        self._zobrist = layout.getZobristTable()
+        self._boardHash = self._zobrist.getInitialHash()
+
         # For food and capsules, we will only copy on write (if we eat one of them).
         # This avoid additional copies on successors that don't eat.
 
@@ -33,6 +37,9 @@ class AbstractGameState(abc.ABC):
         self._food = layout.food.copy()
         self._lastFoodEaten = None
 
+        # Food is counted as it is eaten, so counts never have to look at the grid.
+        self._numFood = self._food.count()
+
         self._capsulesCopied = False
         self._capsules = layout.capsules.copy()
         self._lastCapsuleEaten = None
@@ -45,6 +52,11 @@ class AbstractGameState(abc.ABC):
         for (isPacman, position) in layout.agentPositions:
             self._agentStates.append(AgentState(position, Directions.STOP, isPacman))
 
+        # Successors share agent states with their parent until they change them
+        # (see getMutableAgentState()).
+        # This is a bitmask of the agents whose states belong to only this state.
+        self._ownedAgentStates = (1 << len(self._agentStates)) - 1
+
         self._score = 0
 
     @abc.abstractmethod
@@ -65,8 +77,40 @@ class AbstractGameState(abc.ABC):
         pass
 
     def addScore(self, score):
-        self._hash = None
-        self._score += score
+        self.setScore(self._score + score)
+
+    def applyMove(self, agentIndex, action):
+        """
+        Apply a move to this state in place, instead of making a successor.
+        Returns a token that can be given to undoMove() to put this state back the way it was.
+
+        This lets a search walk down and back up a line of play using a single state.
+        Moves must be undone in the reverse order that they were applied,
+        and each token can only be used once.
+        Anything the move changes (food, capsules, agent states) is copied on write,
+        so successors of this state (and states it was generated from) are never affected.
+        """
+
+        if (self.isOver()):
+            raise RuntimeError("Can't apply a move to a terminal state.")
+
+        # Nothing is owned by this state anymore, since the token shares all of it.
+        self._foodCopied = False
+        self._capsulesCopied = False
+        self._ownedAgentStates = 0
+
+        token = self.__dict__.copy()
+
+        # Agent states are replaced (not changed) in this list.
+        self._agentStates = self._agentStates.copy()
+
+        try:
+            self._applySuccessorAction(agentIndex, action)
+        except Exception:
+            self.__dict__ = token
+            raise
+
+        return token
 
     def eatCapsule(self, x, y):
         """
@@ -83,6 +127,7 @@ class AbstractGameState(abc.ABC):
         self._capsules.remove((x, y))
         self._lastCapsuleEaten = (x, y)
 
+        self._boardHash ^= self._zobrist.capsuleKey(x, y)
         self._hash = None
         return True
 
@@ -100,16 +145,48 @@ class AbstractGameState(abc.ABC):
 
         self._food[x][y] = False
         self._lastFoodEaten = (x, y)
+        self._numFood -= 1
 
+        self._boardHash ^= self._zobrist.foodKey(x, y)
         self._hash = None
         return True
 
     def endGame(self, win):
+        self._boardHash ^= self._zobrist.endKey(self._gameover, self._win)
+        self._boardHash ^= self._zobrist.endKey(True, win)
+
         self._gameover = True
         self._win = win
 
         self._hash = None
 
+    @classmethod
+    def fromSnapshot(cls, snapshot, layout):
+        """
+        Rebuild a state from `AbstractGameState.getSnapshot`
+        and the layout the original state was played on.
+        """
+
+        stateClass, data = snapshot
+        if (not issubclass(stateClass, cls)):
+            raise ValueError("Snapshot is of a %s, not a %s." % (stateClass.__name__, cls.__name__))
+
+        state = stateClass.__new__(stateClass)
+        state.__dict__.update(data)
+
+        state._layout = layout
+        state._zobrist = layout.getZobristTable()
+        state._boardHash = state._computeBoardHash()
+        state._hash = None
+
+        # Older snapshots may not have counts.
+        state._countFood()
+
+        # Every agent state was just unpickled.
+        state._ownedAgentStates = (1 << len(state._agentStates)) - 1
+
+        return state
+
     def getAgentPosition(self, index):
         """
         Returns a location tuple of the agent with the given index.
@@ -125,6 +202,11 @@ class AbstractGameState(abc.ABC):
         return tuple(int(pos) for pos in position)
 
     def getAgentState(self, index):
+        """
+        Get an agent's state.
+        Agent states may be shared with other game states, so the caller should not modify it.
+        """
+
         return self._agentStates[index]
 
     def getAgentStates(self):
@@ -173,6 +255,19 @@ class AbstractGameState(abc.ABC):
     def getLastFoodEaten(self):
         return self._lastFoodEaten
 
+    def getMutableAgentState(self, index):
+        """
+        Get an agent's state that can be modified (without changing any other game state).
+        This is meant for the game rules, agents should use getAgentState().
+        """
+
+        if (not (self._ownedAgentStates >> index) & 1):
+            self._agentStates[index] = self._agentStates[index].copy()
+            self._ownedAgentStates |= (1 << index)
+
+        self._hash = None
+        return self._agentStates[index]
+
     def getNumAgents(self):
         return len(self._agentStates)
 
@@ -188,11 +283,26 @@ class AbstractGameState(abc.ABC):
         Get the amount of food left on the board.
         """
 
-        return self._food.count()
+        return self._numFood
 
     def getScore(self):
         return self._score
 
+    def getSnapshot(self):
+        """
+        Get a picklable snapshot of this state that does not include the layout
+        (which is usually much larger than the state and never changes).
+        Use `AbstractGameState.fromSnapshot` to get the state back.
+        """
+
+        data = dict(self.__dict__)
+
+        # Zobrist keys are not the same in every process, so the hash is rebuilt on restore.
+        for name in ['_layout', '_zobrist', '_boardHash', '_hash']:
+            del data[name]
+
+        return (type(self), data)
+
     def getWalls(self):
         """
         Returns a Grid of boolean wall indicator variables.
@@ -239,25 +349,70 @@ class AbstractGameState(abc.ABC):
         self._highlightLocations = list(locations)
 
     def setScore(self, score):
+        self._boardHash ^= self._zobrist.scoreKey(self._score)
+        self._boardHash ^= self._zobrist.scoreKey(score)
+
         self._score = score
         self._hash = None
 
+    def undoMove(self, token):
+        """
+        Undo a move made with applyMove().
+        """
+
+        self.__dict__ = token
+
+    @abc.abstractmethod
+    def _applySuccessorAction(self, agentIndex, action):
+        """
+        Apply the action to this state (used for both successors and applyMove()).
+        """
+
+        pass
+
+    def _computeBoardHash(self):
+        """
+        Compute the hash of the board components from scratch.
+        """
+
+        hashCode = self._zobrist.scoreKey(self._score)
+        hashCode ^= self._zobrist.endKey(self._gameover, self._win)
+
+        for (x, y) in self._food.asList():
+            hashCode ^= self._zobrist.foodKey(x, y)
+
+        for (x, y) in self._capsules:
+            hashCode ^= self._zobrist.capsuleKey(x, y)
+
+        return hashCode
+
+    def _countFood(self):
+        """
+        Count the food from scratch.
+        """
+
+        self._numFood = self._food.count()
+
     def _initSuccessor(self):
         """
         Get a state that will eventually serve as a successor.
         Initialize the successor to look like this state.
         """
 
-        # Start with a shallow copy.
-        successor = copy.copy(self)
+        # Start with a shallow copy (copying the dict directly is much faster than copy.copy()).
+        successor = self.__class__.__new__(self.__class__)
+        successor.__dict__ = self.__dict__.copy()
         successor._hash = None
 
         # Leave food and capsules as a shallow copy, but mark them to be copied on write.
         successor._foodCopied = False
         successor._capsulesCopied = False
 
-        # Agent states need to be deep copied.
-        successor._agentStates = [agentState.copy() for agentState in self._agentStates]
+        # Agent states are also copied on write, see getMutableAgentState().
+        # Since they are now shared, neither state owns any of them.
+        successor._agentStates = self._agentStates.copy()
+        successor._ownedAgentStates = 0
+        self._ownedAgentStates = 0
 
         return successor
 
@@ -289,7 +444,17 @@ class AbstractGameState(abc.ABC):
 
     def __hash__(self):
         if (self._hash is None):
-            self._hash = util.buildHash(self._score, self._gameover, self._win, *self._capsules,
-                self._food, *self._agentStates, self._layout)
+            # Agent states are mutated directly by the rules,
+            # so their (memoized) keys are folded in here instead of being tracked as they move.
+            hashCode = self._boardHash
+            for agentIndex in range(len(self._agentStates)):
+                agentState = self._agentStates[agentIndex]
+                key = self._zobrist.agentKey(agentIndex, agentState.getPosition(),
+                        agentState.getDirection(), agentState.getScaredTimer(),
+                        agentState.isPacman())
+
+                hashCode ^= key
+
+            self._hash = hash(hashCode)
 
         return self._hash
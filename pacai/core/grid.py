@@ -1,8 +1,12 @@
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.
+    A 2-dimensional array of booleans backed by a bitboard (a single Python int).
     Data is accessed via grid[x][y] where (x, y) are positions on a Pacman map with x horizontal,
     y vertical and the origin (0, 0) in the bottom left corner.
+
+    The cell (x, y) is stored in bit (x * height + y).
+    Since ints are immutable, copies can share the same bits and
+    copying, counting, comparing, and hashing never have to walk the cells in Python.
     """
 
     def __init__(self, width, height, initialValue = False):
@@ -11,25 +15,41 @@ class Grid:
 
         self._width = width
         self._height = height
-        self._data = [[initialValue for y in range(height)] for x in range(width)]
+
+        self._bits = 0
+        if (initialValue):
+            self._bits = self._fullMask()
 
     def asList(self, key = True):
+        bits = self._bits
+        if (not key):
+            bits = ~bits & self._fullMask()
+
         values = []
 
-        for x in range(self._width):
-            for y in range(self._height):
-                if self[x][y] == key:
-                    values.append((x, y))
+        # Walk the set bits from lowest to highest (x-major, then y).
+        while (bits):
+            lowBit = bits & -bits
+            index = lowBit.bit_length() - 1
+            values.append(self._cellIndexToPosition(index))
+            bits ^= lowBit
 
         return values
 
     def copy(self):
-        grid = Grid(self._width, self._height)
-        grid._data = [row.copy() for row in self._data]
+        grid = Grid.__new__(Grid)
+        grid._width = self._width
+        grid._height = self._height
+        grid._bits = self._bits
         return grid
 
-    def count(self, item =True):
-        return sum([x.count(item) for x in self._data])
+    def count(self, item = True):
+        numSet = bin(self._bits).count('1')
+
+        if (item):
+            return numSet
+
+        return self._width * self._height - numSet
 
     def deepCopy(self):
         return self.copy()
@@ -41,44 +61,99 @@ class Grid:
         return self._width
 
     def shallowCopy(self):
-        grid = Grid(self._width, self._height)
-        grid._data = self._data
-        return grid
+        return self.copy()
 
     def _cellIndexToPosition(self, index):
-        x = index / self._height
+        x = index // self._height
         y = index % self._height
 
         return x, y
 
+    def _fullMask(self):
+        return (1 << (self._width * self._height)) - 1
+
+    def _getCell(self, x, y):
+        return (self._bits >> (x * self._height + y)) & 1 == 1
+
+    def _setCell(self, x, y, value):
+        bit = 1 << (x * self._height + y)
+
+        if (value):
+            self._bits |= bit
+        else:
+            self._bits &= ~bit
+
     def __eq__(self, other):
         if (other is None):
             return False
 
-        return self._data == other._data
+        return (self._bits == other._bits
+                and self._width == other._width
+                and self._height == other._height)
 
-    def __getitem__(self, i):
-        return self._data[i]
+    def __getitem__(self, x):
+        if (x < 0):
+            x += self._width
 
-    def __hash__(self):
-        hashcode = 0
-        base = 1
+        if (x < 0 or x >= self._width):
+            raise IndexError('Grid column out of range: %d' % (x))
 
-        for row in self._data:
-            for value in row:
-                if (value):
-                    hashcode += base
-                base *= 2
+        return _GridColumn(self, x)
 
-        return hash(hashcode)
+    def __hash__(self):
+        return hash(self._bits)
 
     def __lt__(self, other):
         return self.__hash__() < other.__hash__()
 
-    def __setitem__(self, key, item):
-        self._data[key] = item
+    def __setitem__(self, x, column):
+        if (len(column) != self._height):
+            raise ValueError('Grid columns must have exactly %d values.' % (self._height))
+
+        for y in range(self._height):
+            self[x][y] = column[y]
 
     def __str__(self):
-        out = [[str(self._data[x][y])[0] for x in range(self._width)] for y in range(self._height)]
+        out = [[str(self._getCell(x, y))[0] for x in range(self._width)]
+            for y in range(self._height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
+
+class _GridColumn:
+    """
+    A lightweight view of a single column of a `Grid`.
+    This is what makes the grid[x][y] syntax work for both reads and writes.
+    """
+
+    __slots__ = ('_grid', '_x')
+
+    def __init__(self, grid, x):
+        self._grid = grid
+        self._x = x
+
+    def __getitem__(self, y):
+        height = self._grid._height
+        if (y < 0):
+            y += height
+
+        if (y < 0 or y >= height):
+            raise IndexError('Grid row out of range: %d' % (y))
+
+        return self._grid._getCell(self._x, y)
+
+    def __iter__(self):
+        for y in range(self._grid._height):
+            yield self._grid._getCell(self._x, y)
+
+    def __len__(self):
+        return self._grid._height
+
+    def __setitem__(self, y, value):
+        height = self._grid._height
+        if (y < 0):
+            y += height
+
+        if (y < 0 or y >= height):
+            raise IndexError('Grid row out of range: %d' % (y))
+
+        self._grid._setCell(self._x, y, bool(value))
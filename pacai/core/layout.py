@@ -1,8 +1,11 @@
 import os
 import random
 
+from pacai.core.actions import Actions
+from pacai.core.directions import Directions
 from pacai.core.distance import manhattan
 from pacai.core.grid import Grid
+from pacai.core.zobrist import ZobristTable
 
 # By default, the layout directory is adjacent to this file.
 DEFAULT_LAYOUT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'layouts')
@@ -24,11 +27,56 @@ class Layout(object):
         self.numGhosts = 0
         self.layoutText = layoutText
 
+        # Built on demand, since not every game hashes its states.
+        self._zobristTable = None
+
+        # Legal actions for each integral non-wall cell, built on demand.
+        # {(x, y): (action, ...), ...}
+        self._possibleActions = None
+        # {((x, y), direction): (action, ...), ...}
+        self._ghostActions = None
+
         self.processLayoutText(layoutText, maxGhosts)
 
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getGhostActions(self, position, direction):
+        """
+        Get the precomputed actions for a ghost at an integral position facing the given direction.
+        These are the possible actions minus STOP and the reverse direction
+        (unless reversing is the only option).
+        Returns None if the position is not an integral non-wall position inside the border.
+        """
+
+        if (self._ghostActions is None):
+            self._buildActionTables()
+
+        return self._ghostActions.get((position, direction))
+
+    def getPossibleActions(self, position):
+        """
+        Get the precomputed tuple of possible actions at an integral position.
+        This matches `pacai.core.actions.Actions.getPossibleActions` for that position.
+        Returns None if the position is not an integral non-wall position inside the border,
+        in which case the caller should fall back to `pacai.core.actions.Actions`.
+        """
+
+        if (self._possibleActions is None):
+            self._buildActionTables()
+
+        return self._possibleActions.get(position)
+
+    def getZobristTable(self):
+        """
+        Get the `pacai.core.zobrist.ZobristTable` used to hash states on this layout.
+        """
+
+        if (self._zobristTable is None):
+            self._zobristTable = ZobristTable(self)
+
+        return self._zobristTable
+
     def isWall(self, pos):
         x, col = pos
         return self.walls[x][col]
@@ -78,6 +126,33 @@ class Layout(object):
     def deepCopy(self):
         return Layout(self.layoutText[:])
 
+    def _buildActionTables(self):
+        possibleActions = {}
+        ghostActions = {}
+
+        # Skip the border, since those positions have neighbors off the board.
+        for x in range(1, self.width - 1):
+            for y in range(1, self.height - 1):
+                if (self.walls[x][y]):
+                    continue
+
+                position = (x, y)
+                actions = Actions.getPossibleActions(position, Directions.STOP, self.walls)
+                possibleActions[position] = tuple(actions)
+
+                moves = [action for action in actions if (action != Directions.STOP)]
+                for direction in Directions.REVERSE:
+                    reverse = Directions.REVERSE[direction]
+
+                    legal = moves
+                    if (reverse in moves and len(moves) > 1):
+                        legal = [action for action in moves if (action != reverse)]
+
+                    ghostActions[(position, direction)] = tuple(legal)
+
+        self._possibleActions = possibleActions
+        self._ghostActions = ghostActions
+
     def processLayoutText(self, layoutText, maxGhosts):
         """
         Coordinates are flipped from the input format to the (x, y) convention here
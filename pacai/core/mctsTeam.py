@@ -0,0 +1,12 @@
+from pacai.agents.capture.mcts import MCTSCaptureAgent
+
+def createTeam(firstIndex, secondIndex, isRed, **args):
+    """
+    A team of two `pacai.agents.capture.mcts.MCTSCaptureAgent`s.
+    Any arguments (e.g. 'moveTime=0.2') are passed to both agents.
+    """
+
+    return [
+        MCTSCaptureAgent(firstIndex, **args),
+        MCTSCaptureAgent(secondIndex, **args),
+    ]
@@ -0,0 +1,269 @@
+"""
+Profiling for games.
+
+A `GameProfiler` can be set as a `pacai.core.game.Game`'s profiler,
+and will collect timings across every game it is attached to:
+how long each agent takes to move (as percentiles), how long each agent spends starting up,
+how many successors each agent generates or moves it applies in place (and how long that takes),
+and how long the game itself spends generating successors, updating the display,
+and processing the rules.
+Optionally, each agent can also be run under `cProfile`.
+"""
+
+import contextlib
+import cProfile
+import json
+import math
+import os
+import time
+
+AGENT_PHASES = ['registerInitialState', 'getAction']
+GAME_PHASES = ['generateSuccessor', 'display', 'rules']
+
+PERCENTILES = [50, 95, 99]
+
+# The number of slowest moves to report for each agent.
+NUM_SLOWEST_MOVES = 5
+
+def percentile(values, percent):
+    """
+    Get the nearest-rank percentile of some sorted values (None if there are no values).
+    """
+
+    if (len(values) == 0):
+        return None
+
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(0, rank - 1)]
+
+class AgentProfile(object):
+    """
+    The timings for a single agent.
+    """
+
+    def __init__(self, index, useCProfile = False):
+        self.index = index
+
+        # (game number, move number, seconds) for every move.
+        self.moves = []
+        self.startupTime = 0.0
+
+        self.numSuccessors = 0
+        self.successorTime = 0.0
+
+        self.profile = None
+        if (useCProfile):
+            self.profile = cProfile.Profile()
+
+    def getReport(self):
+        latencies = sorted([seconds for (_, _, seconds) in self.moves])
+        slowest = sorted(self.moves, key = lambda move: move[2], reverse = True)
+
+        report = {
+            'index': self.index,
+            'moves': len(latencies),
+            'registerInitialState': self.startupTime,
+            'getAction': {
+                'total': sum(latencies),
+                'mean': None,
+                'max': None,
+            },
+            'slowestMoves': [{'game': game, 'move': move, 'time': seconds}
+                    for (game, move, seconds) in slowest[:NUM_SLOWEST_MOVES]],
+            'successors': {
+                'count': self.numSuccessors,
+                'time': self.successorTime,
+            },
+        }
+
+        if (len(latencies) > 0):
+            report['getAction']['mean'] = sum(latencies) / len(latencies)
+            report['getAction']['max'] = latencies[-1]
+
+        for percent in PERCENTILES:
+            report['getAction']['p%d' % (percent)] = percentile(latencies, percent)
+
+        return report
+
+class GameProfiler(object):
+    """
+    Collects timings from every game it is attached to.
+
+    For the duration of each game, the profiler wraps the parts of the game it times
+    (each agent's `registerInitialState` and `getAction`, the display's `update`,
+    the rules' `process`, and the state class' `generateSuccessor` and `applyMove`),
+    so games without a profiler do not pay anything.
+    Successors generated (or moves applied in place) while an agent is taking a turn
+    (or starting up) are counted as successors for that agent,
+    and successors generated by the game itself are timed as a game phase.
+    """
+
+    def __init__(self, useCProfile = False):
+        self._useCProfile = useCProfile
+
+        self._agents = {}
+        self._phaseTimes = {phase: 0.0 for phase in GAME_PHASES}
+
+        self._numGames = 0
+        self._numMoves = 0
+        # The number of moves in the current game.
+        self._gameMoves = 0
+
+        # The agent that is currently taking a turn.
+        self._currentAgent = None
+        # Successors generated by successors (e.g. through a helper) are only counted once.
+        self._successorDepth = 0
+
+        # (object, attribute name, original value) for everything wrapped in the current game.
+        self._wrapped = []
+
+    def getReport(self):
+        return {
+            'games': self._numGames,
+            'moves': self._numMoves,
+            'phases': dict(self._phaseTimes),
+            'agents': [self._agents[index].getReport() for index in sorted(self._agents)],
+        }
+
+    @contextlib.contextmanager
+    def profileGame(self, game):
+        """
+        Profile a single `pacai.core.game.Game`.
+        """
+
+        self._numGames += 1
+        self._gameMoves = 0
+
+        for (index, agent) in enumerate(game.agents):
+            # Agents that failed to load are handled by the game.
+            if (not agent):
+                continue
+
+            for phase in AGENT_PHASES:
+                self._wrap(agent, phase, self._timeAgent(index, phase, getattr(agent, phase)))
+
+        self._wrap(game.display, 'update', self._timePhase('display', game.display.update))
+        self._wrap(game.rules, 'process', self._timePhase('rules', game.rules.process))
+
+        stateClass = type(game.state)
+        self._wrap(stateClass, 'generateSuccessor',
+                self._timeSuccessors(stateClass.generateSuccessor))
+        # Searches can also walk a single state with applyMove() (and undoMove()).
+        self._wrap(stateClass, 'applyMove', self._timeSuccessors(stateClass.applyMove))
+
+        try:
+            yield
+        finally:
+            self._unwrap()
+
+            self._currentAgent = None
+            self._successorDepth = 0
+
+    def writeReport(self, path):
+        """
+        Write the report as JSON.
+        If agents were run under `cProfile`, each agent's stats are also dumped
+        next to the report (e.g. `profile.json` gets `profile.agent-0.prof`).
+        """
+
+        report = self.getReport()
+
+        base = os.path.splitext(path)[0]
+        for agentReport in report['agents']:
+            agent = self._agents[agentReport['index']]
+            if (agent.profile is None):
+                continue
+
+            agentReport['cProfile'] = '%s.agent-%d.prof' % (base, agent.index)
+            agent.profile.dump_stats(agentReport['cProfile'])
+
+        with open(path, 'w') as file:
+            json.dump(report, file, indent = 4)
+
+        return report
+
+    def _getAgent(self, agentIndex):
+        if (agentIndex not in self._agents):
+            self._agents[agentIndex] = AgentProfile(agentIndex, self._useCProfile)
+
+        return self._agents[agentIndex]
+
+    def _timeAgent(self, agentIndex, phase, function):
+        profiler = self
+        agent = self._getAgent(agentIndex)
+
+        def wrapper(*args, **kwargs):
+            profiler._currentAgent = agent
+            if (agent.profile is not None):
+                agent.profile.enable()
+
+            startTime = time.perf_counter()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timeTaken = time.perf_counter() - startTime
+
+                if (agent.profile is not None):
+                    agent.profile.disable()
+                profiler._currentAgent = None
+
+                if (phase == 'registerInitialState'):
+                    agent.startupTime += timeTaken
+                else:
+                    agent.moves.append((profiler._numGames, profiler._gameMoves, timeTaken))
+                    profiler._gameMoves += 1
+                    profiler._numMoves += 1
+
+        return wrapper
+
+    def _timePhase(self, phase, function):
+        phaseTimes = self._phaseTimes
+
+        def wrapper(*args, **kwargs):
+            startTime = time.perf_counter()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                phaseTimes[phase] += time.perf_counter() - startTime
+
+        return wrapper
+
+    def _timeSuccessors(self, generateSuccessor):
+        profiler = self
+        gamePhase = self._timePhase('generateSuccessor', generateSuccessor)
+
+        def wrapper(state, *args, **kwargs):
+            agent = profiler._currentAgent
+            if (agent is None):
+                return gamePhase(state, *args, **kwargs)
+
+            if (profiler._successorDepth > 0):
+                return generateSuccessor(state, *args, **kwargs)
+
+            profiler._successorDepth += 1
+            startTime = time.perf_counter()
+
+            try:
+                return generateSuccessor(state, *args, **kwargs)
+            finally:
+                agent.successorTime += time.perf_counter() - startTime
+                agent.numSuccessors += 1
+                profiler._successorDepth -= 1
+
+        return wrapper
+
+    def _unwrap(self):
+        for (target, name, original) in reversed(self._wrapped):
+            if (original is None):
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+
+        self._wrapped = []
+
+    def _wrap(self, target, name, wrapper):
+        # Remember if the target had its own value (or just got one from its class).
+        self._wrapped.append((target, name, vars(target).get(name)))
+        setattr(target, name, wrapper)
@@ -0,0 +1,425 @@
+"""
+A compact binary format for recorded games.
+
+A replay file holds any number of games.
+Each game is a header (the layout text and any metadata, as JSON)
+followed by one byte per move, and moves are appended while the game is being played.
+When the file is closed, an index of where each game starts is appended to the end,
+so that any game can be found without reading the ones before it.
+Files that are missing an index (e.g. the process was killed) can still be read by scanning.
+
+Move bytes pack the agent index in the high 5 bits and the direction in the low 3 bits.
+Every so often (when a state is available), a keyframe (a snapshot of the game state)
+is written between moves, so a replay can start from the middle of a game
+without simulating every move before it.
+
+The old format (a single pickled dict) can still be read.
+"""
+
+import json
+import os
+import pickle
+import struct
+
+from pacai.core.directions import Directions
+from pacai.core.layout import Layout
+
+FILE_MAGIC = b'PACR'
+FORMAT_VERSION = 2
+# Version 1 is the same format without keyframes.
+SUPPORTED_VERSIONS = [1, 2]
+
+GAME_MARKER = b'G'
+INDEX_MARKER = b'I'
+
+# Index offset and magic.
+FOOTER = struct.Struct('<Q4s')
+FOOTER_MAGIC = b'PACX'
+
+# The length of a game's header.
+HEADER_LENGTH = struct.Struct('<I')
+INDEX_COUNT = struct.Struct('<I')
+INDEX_OFFSET = struct.Struct('<Q')
+KEYFRAME_LENGTH = struct.Struct('<I')
+
+DEFAULT_KEYFRAME_INTERVAL = 100
+
+DIRECTION_BITS = 3
+DIRECTION_MASK = (1 << DIRECTION_BITS) - 1
+
+# These bytes cannot be real moves, since there are only five directions.
+END_OF_GAME = 0xFF
+KEYFRAME = 0xFE
+MAX_AGENTS = (KEYFRAME >> DIRECTION_BITS)
+
+DIRECTIONS = [
+    Directions.NORTH,
+    Directions.SOUTH,
+    Directions.EAST,
+    Directions.WEST,
+    Directions.STOP,
+]
+DIRECTION_CODES = {direction: code for (code, direction) in enumerate(DIRECTIONS)}
+
+def encodeMove(agentIndex, action):
+    if (agentIndex < 0 or agentIndex >= MAX_AGENTS):
+        raise ValueError('Replays support at most %d agents, found index %d.'
+                % (MAX_AGENTS, agentIndex))
+
+    return (agentIndex << DIRECTION_BITS) | DIRECTION_CODES[action]
+
+def decodeMove(move):
+    return (move >> DIRECTION_BITS, DIRECTIONS[move & DIRECTION_MASK])
+
+class ReplayWriter(object):
+    """
+    Writes games to a replay file as they are being played.
+
+    A `pacai.core.game.Game` will call `ReplayWriter.recordMove` for each move
+    when this writer is set as the game's recorder.
+    Every `keyframeInterval` moves (when the move comes with its resulting state),
+    a snapshot of the state is also written.
+
+    Example:
+    ```
+    with ReplayWriter(path) as writer:
+        writer.startGame(layout, length = 1200)
+        game.recorder = writer
+        game.run()
+        writer.endGame()
+    ```
+    """
+
+    def __init__(self, path, keyframeInterval = DEFAULT_KEYFRAME_INTERVAL):
+        self._path = path
+        self._file = open(path, 'wb')
+        self._file.write(FILE_MAGIC + bytes([FORMAT_VERSION]))
+
+        self._keyframeInterval = keyframeInterval
+
+        self._offsets = []
+        self._inGame = False
+        self._numMoves = 0
+
+    def close(self):
+        """
+        Finish any open game, write the index, and close the file.
+        """
+
+        if (self._file is None):
+            return
+
+        if (self._inGame):
+            self.endGame()
+
+        indexOffset = self._file.tell()
+
+        self._file.write(INDEX_MARKER)
+        self._file.write(INDEX_COUNT.pack(len(self._offsets)))
+        for offset in self._offsets:
+            self._file.write(INDEX_OFFSET.pack(offset))
+
+        self._file.write(FOOTER.pack(indexOffset, FOOTER_MAGIC))
+
+        self._file.close()
+        self._file = None
+
+    def endGame(self):
+        self._file.write(bytes([END_OF_GAME]))
+        self._file.flush()
+        self._inGame = False
+
+    def getPath(self):
+        return self._path
+
+    def recordMove(self, agentIndex, action, state = None):
+        """
+        Record a move.
+        If the state after the move is given, it may be saved as a keyframe.
+        """
+
+        self._file.write(bytes([encodeMove(agentIndex, action)]))
+        self._numMoves += 1
+
+        if (state is not None and self._keyframeInterval > 0
+                and self._numMoves % self._keyframeInterval == 0):
+            self._writeKeyframe(state.getSnapshot())
+
+    def recordMoves(self, moves, keyframes = []):
+        """
+        Record many moves at once.
+        Keyframes are (the number of moves before the keyframe, a state snapshot),
+        e.g. as collected by a `KeyframeRecorder` on another process.
+        """
+
+        start = 0
+        for (moveNumber, snapshot) in keyframes:
+            self._recordMoveBytes(moves[start:moveNumber])
+            self._writeKeyframe(snapshot)
+            start = moveNumber
+
+        self._recordMoveBytes(moves[start:])
+
+    def startGame(self, layout, **metadata):
+        """
+        Start recording a new game.
+        Any metadata must be JSON serializable,
+        and will be passed back as keyword arguments when the game is read.
+        """
+
+        if (self._inGame):
+            self.endGame()
+
+        header = {
+            'layoutText': layout.layoutText,
+            'maxGhosts': layout.getNumGhosts(),
+            'metadata': metadata,
+        }
+        header = json.dumps(header).encode('utf-8')
+
+        self._offsets.append(self._file.tell())
+        self._file.write(GAME_MARKER)
+        self._file.write(HEADER_LENGTH.pack(len(header)))
+        self._file.write(header)
+
+        self._inGame = True
+        self._numMoves = 0
+
+    def _recordMoveBytes(self, moves):
+        self._file.write(bytes([encodeMove(agentIndex, action) for (agentIndex, action) in moves]))
+        self._numMoves += len(moves)
+
+    def _writeKeyframe(self, snapshot):
+        snapshot = pickle.dumps(snapshot, protocol = pickle.HIGHEST_PROTOCOL)
+
+        self._file.write(bytes([KEYFRAME]))
+        self._file.write(KEYFRAME_LENGTH.pack(len(snapshot)))
+        self._file.write(snapshot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+class KeyframeRecorder(object):
+    """
+    A stand-in for a `ReplayWriter` that only keeps the keyframes a writer would have written.
+    This lets a game be played on one process and recorded (with `ReplayWriter.recordMoves`)
+    on another, without sending every state back.
+    """
+
+    def __init__(self, keyframeInterval = DEFAULT_KEYFRAME_INTERVAL):
+        self._keyframeInterval = keyframeInterval
+        self._numMoves = 0
+
+        self.keyframes = []
+
+    def recordMove(self, agentIndex, action, state = None):
+        self._numMoves += 1
+
+        if (state is not None and self._keyframeInterval > 0
+                and self._numMoves % self._keyframeInterval == 0):
+            self.keyframes.append((self._numMoves, state.getSnapshot()))
+
+class ReplayReader(object):
+    """
+    Reads games from a replay file (in either the binary or the old pickle format).
+    Games are returned as dicts with a 'layout', a list of (agentIndex, action) 'actions',
+    and any metadata they were recorded with.
+    When a starting move is requested, the dict also has a 'startMove'
+    and the nearest 'keyframe' at or before it (see `ReplayReader.getGame`).
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._legacyGame = None
+        self._offsets = []
+
+        with open(path, 'rb') as file:
+            magic = file.read(len(FILE_MAGIC) + 1)
+
+            if (magic[:len(FILE_MAGIC)] != FILE_MAGIC):
+                file.seek(0)
+                self._legacyGame = pickle.load(file)
+                return
+
+            if (magic[len(FILE_MAGIC)] not in SUPPORTED_VERSIONS):
+                raise ValueError("Unsupported replay version (%d) in '%s'."
+                        % (magic[len(FILE_MAGIC)], path))
+
+            self._offsets = self._readIndex(file)
+            if (self._offsets is None):
+                self._offsets = self._scan(file)
+
+    def getGame(self, index = 0, startMove = None):
+        """
+        Get a recorded game.
+
+        If a starting move is given, the game will also include the 'startMove'
+        and a 'keyframe': a tuple of (the number of moves before the keyframe, the state).
+        The keyframe is the closest one to (but not after) the starting move,
+        or None if there is no such keyframe (the game must be simulated from the start).
+        """
+
+        if (startMove is not None and startMove < 0):
+            raise ValueError('The starting move cannot be negative, found %d.' % (startMove))
+
+        if (self._legacyGame is not None):
+            if (index != 0):
+                raise IndexError('Old style replays only contain one game.')
+
+            game = dict(self._legacyGame)
+            keyframe = None
+        else:
+            with open(self._path, 'rb') as file:
+                file.seek(self._offsets[index])
+                layout, metadata = self._readHeader(file)
+                moves, keyframes = self._readMoves(file)
+
+                keyframe = None
+                if (startMove is not None):
+                    keyframe = self._readKeyframe(file, layout, keyframes, startMove)
+
+            game = dict(metadata)
+            game['layout'] = layout
+            game['actions'] = [decodeMove(move) for move in moves]
+
+        if (startMove is not None):
+            game['startMove'] = startMove
+            game['keyframe'] = keyframe
+
+        return game
+
+    def getGames(self):
+        return [self.getGame(index) for index in range(self.getNumGames())]
+
+    def getNumGames(self):
+        if (self._legacyGame is not None):
+            return 1
+
+        return len(self._offsets)
+
+    def _readHeader(self, file):
+        if (file.read(len(GAME_MARKER)) != GAME_MARKER):
+            raise ValueError("Corrupt replay file: '%s'." % (self._path))
+
+        length, = HEADER_LENGTH.unpack(file.read(HEADER_LENGTH.size))
+        header = json.loads(file.read(length).decode('utf-8'))
+
+        layout = Layout(header['layoutText'], header['maxGhosts'])
+        return layout, header['metadata']
+
+    def _readIndex(self, file):
+        """
+        Read the index from the end of the file, or return None if there is no valid index.
+        """
+
+        end = file.seek(0, os.SEEK_END)
+        if (end < len(FILE_MAGIC) + 1 + FOOTER.size):
+            return None
+
+        file.seek(end - FOOTER.size)
+        indexOffset, magic = FOOTER.unpack(file.read(FOOTER.size))
+        if (magic != FOOTER_MAGIC or indexOffset >= end):
+            return None
+
+        file.seek(indexOffset)
+        if (file.read(len(INDEX_MARKER)) != INDEX_MARKER):
+            return None
+
+        count, = INDEX_COUNT.unpack(file.read(INDEX_COUNT.size))
+        data = file.read(count * INDEX_OFFSET.size)
+        if (len(data) != count * INDEX_OFFSET.size):
+            return None
+
+        return [INDEX_OFFSET.unpack_from(data, i * INDEX_OFFSET.size)[0] for i in range(count)]
+
+    def _readKeyframe(self, file, layout, keyframes, startMove):
+        best = None
+        for (moveNumber, offset) in keyframes:
+            if (moveNumber <= startMove):
+                best = (moveNumber, offset)
+
+        if (best is None):
+            return None
+
+        moveNumber, offset = best
+
+        file.seek(offset + 1)
+        length, = KEYFRAME_LENGTH.unpack(file.read(KEYFRAME_LENGTH.size))
+        snapshot = pickle.loads(file.read(length))
+
+        stateClass = snapshot[0]
+        return (moveNumber, stateClass.fromSnapshot(snapshot, layout))
+
+    def _readMoves(self, file):
+        """
+        Read the moves of the game starting at the current position,
+        and leave the file just past the end of the game.
+        Returns the moves (as bytes) and a list of keyframes as
+        (the number of moves before the keyframe, the offset of the keyframe).
+        """
+
+        moves = bytearray()
+        keyframes = []
+
+        while (True):
+            position = file.tell()
+            chunk = file.read(4096)
+
+            # A game that was not finished (e.g. a crash) just runs to the end of the file.
+            if (len(chunk) == 0):
+                return moves, keyframes
+
+            ends = [chunk.find(marker) for marker in (END_OF_GAME, KEYFRAME)]
+            ends = [end for end in ends if (end != -1)]
+            if (len(ends) == 0):
+                moves += chunk
+                continue
+
+            end = min(ends)
+            moves += chunk[:end]
+            file.seek(position + end + 1)
+
+            if (chunk[end] == END_OF_GAME):
+                return moves, keyframes
+
+            # An unfinished game can also be cut off anywhere in a keyframe.
+            data = file.read(KEYFRAME_LENGTH.size)
+            if (len(data) != KEYFRAME_LENGTH.size):
+                return moves, keyframes
+
+            length, = KEYFRAME_LENGTH.unpack(data)
+            if (file.seek(length, os.SEEK_CUR) > os.fstat(file.fileno()).st_size):
+                return moves, keyframes
+
+            keyframes.append((len(moves), position + end))
+
+    def _scan(self, file):
+        """
+        Find the start of every game by reading the file from the beginning.
+        """
+
+        offsets = []
+
+        file.seek(len(FILE_MAGIC) + 1)
+        while (True):
+            offset = file.tell()
+            marker = file.read(len(GAME_MARKER))
+            if (marker != GAME_MARKER):
+                break
+
+            data = file.read(HEADER_LENGTH.size)
+            if (len(data) != HEADER_LENGTH.size):
+                break
+
+            length, = HEADER_LENGTH.unpack(data)
+            file.seek(length, os.SEEK_CUR)
+
+            # Skip to the end of this game.
+            self._readMoves(file)
+
+            offsets.append(offset)
+
+        return offsets
@@ -0,0 +1,92 @@
+"""
+Zobrist hashing for game states.
+
+Every component of a game state (a food pellet in a cell, a capsule in a cell, an agent's
+configuration, the score, ...) is assigned a random key,
+and the hash of a state is the XOR of the keys of all the components it contains.
+Because XOR is its own inverse, a state can update its hash in O(1) whenever a
+single component changes, instead of rehashing the whole board.
+"""
+
+import random
+
+# Use a fixed seed (and a private generator) so that the global random state
+# (and therefore seeded games) is never disturbed by hashing.
+ZOBRIST_SEED = 0x9ac1
+KEY_BITS = 64
+
+class ZobristTable(object):
+    """
+    The random keys used to hash states on a specific `pacai.core.layout.Layout`.
+
+    Keys for cells are precomputed.
+    Keys for components with an open range of values (scores, agent configurations)
+    are generated the first time they are seen and memoized.
+    """
+
+    def __init__(self, layout):
+        self._rng = random.Random(ZOBRIST_SEED)
+
+        self._height = layout.getHeight()
+        numCells = layout.getWidth() * layout.getHeight()
+
+        self._foodKeys = [self._newKey() for i in range(numCells)]
+        self._capsuleKeys = [self._newKey() for i in range(numCells)]
+
+        self._agentKeys = {}
+        self._scoreKeys = {}
+        self._endKeys = {}
+
+        # The hash of the board components of a fresh state on this layout.
+        self._initialHash = self.scoreKey(0) ^ self.endKey(False, False)
+
+        for (x, y) in layout.food.asList():
+            self._initialHash ^= self.foodKey(x, y)
+
+        for (x, y) in layout.capsules:
+            self._initialHash ^= self.capsuleKey(x, y)
+
+    def agentKey(self, agentIndex, position, direction, scaredTimer, isPacman):
+        key = (agentIndex, position, direction, scaredTimer, isPacman)
+
+        value = self._agentKeys.get(key)
+        if (value is None):
+            value = self._newKey()
+            self._agentKeys[key] = value
+
+        return value
+
+    def capsuleKey(self, x, y):
+        return self._capsuleKeys[x * self._height + y]
+
+    def endKey(self, gameover, win):
+        key = (gameover, win)
+
+        value = self._endKeys.get(key)
+        if (value is None):
+            value = self._newKey()
+            self._endKeys[key] = value
+
+        return value
+
+    def foodKey(self, x, y):
+        return self._foodKeys[x * self._height + y]
+
+    def getInitialHash(self):
+        """
+        Get the hash of the board components (food, capsules, score, and game over status)
+        of a state that was just created from the layout.
+        """
+
+        return self._initialHash
+
+    def scoreKey(self, score):
+        value = self._scoreKeys.get(score)
+        if (value is None):
+            value = self._newKey()
+            self._scoreKeys[score] = value
+
+        return value
+
+    def _newKey(self):
+        return self._rng.getrandbits(KEY_BITS)
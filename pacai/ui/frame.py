@@ -5,9 +5,7 @@ the view chooses.
 """
 
 import abc
-
-from PIL import Image
-from PIL import ImageDraw
+import collections
 
 from pacai.ui import spritesheet
 from pacai.ui import token
@@ -19,6 +17,13 @@ MAX_HIGHLIGHT_INTENSITY_RANGE = 150
 SCORE_X_POSITION = 0.55
 SCORE_Y_POSITION = -0.95
 
+# The most boards with only walls on them to keep (the least recently used are dropped).
+MAX_WALL_BOARDS = 16
+
+# Boards with only walls on them, keyed by the type of frame and the walls.
+# See `Frame._getWallBoard`.
+_wallBoards = collections.OrderedDict()
+
 class Frame(abc.ABC):
     """
     A general representation of that can be seen on-screen at a given time.
@@ -63,6 +68,9 @@ class Frame(abc.ABC):
     def getBoardHeight(self):
         return self._boardHeight
 
+    def getHighlightLocations(self):
+        return self._highlightLocations
+
     def getImageHeight(self):
         # +1 for the score.
         return (self._boardHeight + 1) * spritesheet.SQUARE_SIZE
@@ -70,69 +78,121 @@ class Frame(abc.ABC):
     def getImageWidth(self):
         return self._boardWidth * spritesheet.SQUARE_SIZE
 
+    def getScore(self):
+        return self._score
+
     def getToken(self, x, y):
         return self._board[x][y]
 
     def getCol(self, x):
         return self._board[x]
 
+    def getTokenImage(self, objectToken, sprites = {}):
+        """
+        Get the image for a single token: its sprite, or a square of its color.
+        """
+
+        from PIL import Image
+
+        if (objectToken in sprites):
+            return sprites[objectToken]
+
+        size = (spritesheet.SQUARE_SIZE, spritesheet.SQUARE_SIZE)
+        return Image.new('RGBA', size, self._tokenToColor(objectToken) + (255,))
+
     def getBoardWidth(self):
         return self._boardWidth
 
-    def toImage(self, sprites = {}, font = None):
-        # Height is +1 for the score.
-        size = (
-            self._boardWidth * spritesheet.SQUARE_SIZE,
-            (self._boardHeight + 1) * spritesheet.SQUARE_SIZE
-        )
+    def toImage(self, sprites = {}, font = None, cache = None):
+        """
+        Render this frame.
+        If a `BoardImageCache` is given, the board (walls, food, and capsules)
+        is copied from the cache instead of being drawn from scratch.
+        """
 
-        image = Image.new('RGB', size, (0, 0, 0, 255))
-        draw = ImageDraw.Draw(image)
+        # PIL is only imported when frames are drawn, so headless runs never need it.
+        from PIL import ImageDraw
 
-        # First, draw any highlights.
-        for i in range(len(self._highlightLocations)):
-            (x, y) = self._highlightLocations[i]
-            startPoint = self._toImageCoords(x, y)
-            endPoint = self._toImageCoords(x + 1, y - 1)
+        if (cache is not None and len(self._highlightLocations) == 0):
+            image = cache.getBoardImage(self, sprites).copy()
+            draw = ImageDraw.Draw(image)
+        else:
+            image, draw = self._newImage()
 
-            intensity = int((i / len(self._highlightLocations)) * MAX_HIGHLIGHT_INTENSITY_RANGE)
+            # First, draw any highlights.
+            for i in range(len(self._highlightLocations)):
+                (x, y) = self._highlightLocations[i]
+                startPoint = self._toImageCoords(x, y)
+                endPoint = self._toImageCoords(x + 1, y - 1)
 
-            draw.rectangle([startPoint, endPoint], fill = (255, intensity, intensity))
+                intensity = int((i / len(self._highlightLocations))
+                        * MAX_HIGHLIGHT_INTENSITY_RANGE)
 
-        # Then, draw the board.
-        for x in range(self._boardWidth):
-            for y in range(self._boardHeight):
-                if (self._board[x][y] != token.EMPTY_TOKEN):
-                    self._placeToken(x, y, self._board[x][y], sprites, image, draw)
+                draw.rectangle([startPoint, endPoint], fill = (255, intensity, intensity))
+
+            # Then, draw the board.
+            self._drawBoard(sprites, image, draw)
 
         # Finally, overlay the agents.
         for ((x, y), agentToken) in self._agentTokens.items():
             self._placeToken(x, y, agentToken, sprites, image, draw)
 
-        # Draw score
-        position = self._toImageCoords(SCORE_X_POSITION, SCORE_Y_POSITION)
-        scoreText = "Score: %d" % (self._score)
-        draw.text(position, scoreText, self._getTextColor(), font)
+        self._drawScore(draw, font)
+
+        return image
+
+    def toScoreImage(self, font = None):
+        """
+        Render only the score (the row under the board).
+        """
+
+        from PIL import Image
+        from PIL import ImageDraw
+
+        size = (self.getImageWidth(), spritesheet.SQUARE_SIZE)
+        image = Image.new('RGB', size, (0, 0, 0, 255))
+
+        self._drawScore(ImageDraw.Draw(image), font, -self._boardHeight * spritesheet.SQUARE_SIZE)
 
         return image
 
     def _buildBoard(self, state):
-        board = self._boardWidth * [None]
-        for x in range(self._boardWidth):
+        board = [list(column) for column in self._getWallBoard(state)]
 
-            items = self._boardHeight * [token.EMPTY_TOKEN]
-            for y in range(self._boardHeight):
-                if (state.hasWall(x, y)):
-                    items[y] = self._getWallToken(x, y, state)
-                elif (state.hasFood(x, y)):
-                    items[y] = self._getFoodToken(x, y, state)
-                elif (state.hasCapsule(x, y)):
-                    items[y] = self._getCapsuleToken(x, y, state)
+        # Walls are drawn over food, and food over capsules.
+        for (x, y) in state.getCapsules():
+            if (board[x][y] == token.EMPTY_TOKEN):
+                board[x][y] = self._getCapsuleToken(x, y, state)
 
-            board[x] = items
+        for (x, y) in state.getFood().asList():
+            if (not token.isWall(board[x][y])):
+                board[x][y] = self._getFoodToken(x, y, state)
 
         return board
 
+    def _drawBoard(self, sprites, image, draw):
+        for x in range(self._boardWidth):
+            for y in range(self._boardHeight):
+                if (self._board[x][y] != token.EMPTY_TOKEN):
+                    self._placeToken(x, y, self._board[x][y], sprites, image, draw)
+
+    def _drawScore(self, draw, font, offsetY = 0):
+        (x, y) = self._toImageCoords(SCORE_X_POSITION, SCORE_Y_POSITION)
+        scoreText = "Score: %d" % (self._score)
+        draw.text((x, y + offsetY), scoreText, self._getTextColor(), font)
+
+    def _redrawCell(self, x, y, sprites, image, draw):
+        """
+        Clear a board cell and draw its current token.
+        """
+
+        startPoint = self._toImageCoords(x, y)
+        endPoint = self._toImageCoords(x + 1, y - 1)
+        draw.rectangle([startPoint, (endPoint[0] - 1, endPoint[1] - 1)], fill = (0, 0, 0))
+
+        if (self._board[x][y] != token.EMPTY_TOKEN):
+            self._placeToken(x, y, self._board[x][y], sprites, image, draw)
+
     @abc.abstractmethod
     def _getAgentBaseToken(self, x, y, agentIndex, state):
         pass
@@ -183,6 +243,36 @@ class Frame(abc.ABC):
     def _getWallBaseToken(self, x, y, state):
         pass
 
+    def _getWallBoard(self, state):
+        """
+        Get a board with only the walls on it.
+        Walls never change, so this is only built once per layout (and type of frame),
+        as long as the layout has been used recently.
+        Callers must not modify the returned board.
+        """
+
+        walls = state.getWalls()
+        key = (type(self), walls)
+
+        board = _wallBoards.get(key)
+        if (board is not None):
+            _wallBoards.move_to_end(key)
+        else:
+            board = self._boardWidth * [None]
+            for x in range(self._boardWidth):
+                items = self._boardHeight * [token.EMPTY_TOKEN]
+                for y in range(self._boardHeight):
+                    if (walls[x][y]):
+                        items[y] = self._getWallToken(x, y, state)
+
+                board[x] = items
+
+            _wallBoards[(type(self), walls.copy())] = board
+            if (len(_wallBoards) > MAX_WALL_BOARDS):
+                _wallBoards.popitem(last = False)
+
+        return board
+
     def _getWallToken(self, x, y, state):
         hasWallN = False
         hasWallE = False
@@ -205,6 +295,19 @@ class Frame(abc.ABC):
 
         return token.getWallToken(baseToken, hasWallN, hasWallE, hasWallS, hasWallW)
 
+    def _newImage(self):
+        from PIL import Image
+        from PIL import ImageDraw
+
+        # Height is +1 for the score.
+        size = (
+            self._boardWidth * spritesheet.SQUARE_SIZE,
+            (self._boardHeight + 1) * spritesheet.SQUARE_SIZE
+        )
+
+        image = Image.new('RGB', size, (0, 0, 0, 255))
+        return image, ImageDraw.Draw(image)
+
     def _placeToken(self, x, y, objectToken, sprites, image, draw):
         startPoint = self._toImageCoords(x, y)
         endPoint = self._toImageCoords(x + 1, y - 1)
@@ -241,3 +344,49 @@ class Frame(abc.ABC):
             return (0, 255, 0)
         else:
             return (0, 0, 0)
+
+class BoardImageCache(object):
+    """
+    A rendered image of the board (walls, food, and capsules) without any agents.
+    Walls never change and food/capsules only come and go one cell at a time,
+    so the image is kept between frames and only the cells that changed are redrawn.
+
+    A cache should only be used by one thread at a time.
+    """
+
+    def __init__(self):
+        self._image = None
+        self._draw = None
+        self._sprites = None
+
+        # The board tokens currently drawn on the image.
+        self._board = None
+
+    def getBoardImage(self, frame, sprites):
+        """
+        Get the board image for a frame.
+        The returned image is owned by the cache, copy it before drawing on it.
+        """
+
+        if (self._image is None or self._sprites is not sprites
+                or self._image.size != (frame.getImageWidth(), frame.getImageHeight())):
+            self._image, self._draw = frame._newImage()
+            self._sprites = sprites
+
+            frame._drawBoard(sprites, self._image, self._draw)
+            self._board = [list(frame.getCol(x)) for x in range(frame.getBoardWidth())]
+
+            return self._image
+
+        for x in range(frame.getBoardWidth()):
+            column = frame.getCol(x)
+            if (column == self._board[x]):
+                continue
+
+            for y in range(frame.getBoardHeight()):
+                if (column[y] != self._board[x][y]):
+                    frame._redrawCell(x, y, sprites, self._image, self._draw)
+
+            self._board[x] = list(column)
+
+        return self._image
@@ -0,0 +1,151 @@
+"""
+Write animated gifs one frame at a time.
+
+Instead of holding every image until the end of a game,
+each frame is rasterized, quantized to a shared palette, and encoded as soon as it arrives.
+So, memory does not grow with the length of the game.
+"""
+
+import queue
+import threading
+
+from PIL import GifImagePlugin
+from PIL import Image
+
+from pacai.ui.frame import BoardImageCache
+
+# Loop the gif forever.
+GIF_LOOP = 0
+
+# The end of a gif file.
+GIF_TRAILER = b';'
+
+MAX_PALETTE_COLORS = 256
+
+# The most frames that can be waiting on the background encoder.
+DEFAULT_QUEUE_SIZE = 32
+
+class GifWriter(object):
+    """
+    Streams `pacai.ui.frame.Frame`s into an animated gif.
+
+    All frames share a single (global) palette that is built from the sprites and the first frame,
+    so each frame only costs its own pixels.
+    If `background` is set, frames are rasterized and encoded on another thread
+    (with at most `queueSize` frames waiting).
+
+    Nothing is written until the first frame is added.
+    """
+
+    def __init__(self, path, fps, sprites = {}, font = None,
+            background = False, queueSize = DEFAULT_QUEUE_SIZE):
+        self._path = path
+        self._timePerFrameMS = int(1.0 / fps * 1000.0)
+
+        self._sprites = sprites
+        self._font = font
+        self._boardCache = BoardImageCache()
+
+        self._file = None
+        self._palette = None
+
+        self._queue = None
+        self._thread = None
+        self._error = None
+
+        if (background):
+            self._queue = queue.Queue(maxsize = queueSize)
+            self._thread = threading.Thread(target = self._encodeLoop, daemon = True)
+            self._thread.start()
+
+    def addFrame(self, frame):
+        if (self._queue is None):
+            self._writeFrame(frame)
+            return
+
+        self._checkError()
+        self._queue.put(frame)
+
+    def close(self):
+        """
+        Finish encoding any waiting frames and close the file.
+        """
+
+        if (self._thread is not None):
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+        if (self._file is not None):
+            self._file.write(GIF_TRAILER)
+            self._file.close()
+            self._file = None
+
+        self._checkError()
+
+    def getPath(self):
+        return self._path
+
+    def _buildPalette(self, image):
+        """
+        Build a palette that covers the first frame and every sprite,
+        since later frames may show sprites (like scared ghosts) that the first one does not.
+        """
+
+        sprites = list(self._sprites.values())
+
+        width = image.width + sum([sprite.width for sprite in sprites])
+        height = max([image.height] + [sprite.height for sprite in sprites])
+
+        sample = Image.new('RGB', (width, height), (0, 0, 0))
+        sample.paste(image, (0, 0))
+
+        x = image.width
+        for sprite in sprites:
+            sample.paste(sprite, (x, 0), sprite)
+            x += sprite.width
+
+        return sample.quantize(colors = MAX_PALETTE_COLORS)
+
+    def _checkError(self):
+        if (self._error is not None):
+            error = self._error
+            self._error = None
+            raise error
+
+    def _encodeLoop(self):
+        while (True):
+            frame = self._queue.get()
+            if (frame is None):
+                return
+
+            # After a failure, keep draining so the producer never blocks.
+            if (self._error is not None):
+                continue
+
+            try:
+                self._writeFrame(frame)
+            except Exception as ex:
+                self._error = ex
+
+    def _writeFrame(self, frame):
+        image = frame.toImage(self._sprites, self._font, self._boardCache)
+
+        if (self._file is None):
+            self._palette = self._buildPalette(image)
+            image = image.quantize(palette = self._palette, dither = 0)
+
+            header, _ = GifImagePlugin.getheader(image, info = {
+                'loop': GIF_LOOP,
+                'duration': self._timePerFrameMS,
+                'optimize': False,
+            })
+
+            self._file = open(self._path, 'wb')
+            for data in header:
+                self._file.write(data)
+        else:
+            image = image.quantize(palette = self._palette, dither = 0)
+
+        for data in GifImagePlugin.getdata(image, duration = self._timePerFrameMS):
+            self._file.write(data)
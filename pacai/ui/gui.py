@@ -8,6 +8,8 @@ from PIL import ImageTk
 
 from pacai.ui.keyboard import Keyboard
 from pacai.ui import spritesheet
+from pacai.ui import token
+from pacai.ui.frame import BoardImageCache
 from pacai.ui.view import AbstractView
 
 MAX_FPS = 1000
@@ -17,15 +19,26 @@ DEATH_SLEEP_TIME = 0.5
 MIN_WINDOW_HEIGHT = 100
 MIN_WINDOW_WIDTH = 100
 
+# The canvas tag for all the items drawn by a `DirtyRegionRenderer`.
+TILE_TAG = 'tile'
+BACKGROUND_COLOR = 'black'
+
 class AbstractGUIView(AbstractView):
     """
     Most of the functionality necessary to draw graphics in a window.
     `tkinter` is used, so Tk must be installed on the machine.
+
+    With `dirtyRegions`, frames are drawn with a `DirtyRegionRenderer`
+    (only the parts of the window that changed are updated)
+    instead of converting a full image of the frame every time.
     """
 
-    def __init__(self, fps = 0, title = 'pacai', **kwargs):
+    def __init__(self, fps = 0, title = 'pacai', dirtyRegions = False, **kwargs):
         super().__init__(**kwargs)
 
+        self._dirtyRegions = dirtyRegions
+        self._renderer = None
+
         self._fps = int(max(0, min(MAX_FPS, fps)))
 
         # To make computations easier, we will actually convert "unlimited FPS" to our FPS max.
@@ -53,6 +66,7 @@ class AbstractGUIView(AbstractView):
 
         self._canvas = None
         self._imageArea = None
+        self._boardCache = BoardImageCache()
 
         self._height = None
         self._width = None
@@ -65,6 +79,7 @@ class AbstractGUIView(AbstractView):
         super().finish()
 
         self._canvas.delete("all")
+        self._renderer = None
 
     def getKeyboard(self):
         # tkinter is not good with multiple keybinds.
@@ -143,21 +158,31 @@ class AbstractGUIView(AbstractView):
 
     # Override
     def _drawFrame(self, state, frame, forceDraw = False):
-        if (self._dead):
-            self._cleanup()
+        # Highlights are drawn under the board, so they always need a full image.
+        if (self._dirtyRegions and len(frame.getHighlightLocations()) == 0):
+            self._drawDirtyRegions(frame)
+        else:
+            self._drawFullFrame(frame)
 
-        self._totalDrawRequests += 1
+        self._root.update_idletasks()
+        self._root.update()
 
-        if (self._firstDrawTime is None):
-            self._firstDrawTime = time.time()
+        self._lastDrawTime = time.time()
 
-            # This is our first frame, we do not have an FPS to stabilize yet.
-            forceDraw = True
+    def _drawDirtyRegions(self, frame):
+        if (self._renderer is None):
+            self._canvas.itemconfig(self._imageArea, image = '')
+            self._renderer = DirtyRegionRenderer(self._canvas, self._getSprites(),
+                    self._getFont())
 
-        if (not forceDraw and self._adjustFPS()):
-            return
+        self._renderer.draw(frame, self._width, self._height)
+
+    def _drawFullFrame(self, frame):
+        if (self._renderer is not None):
+            self._renderer.clear()
+            self._renderer = None
 
-        image = frame.toImage(self._sprites, self._font)
+        image = frame.toImage(self._getSprites(), self._getFont(), self._boardCache)
 
         # Check for a resize.
         if (self._height != frame.getImageHeight() or self._width != frame.getImageWidth()):
@@ -167,10 +192,21 @@ class AbstractGUIView(AbstractView):
         image = ImageTk.PhotoImage(image)
         self._canvas.itemconfig(self._imageArea, image = image)
 
-        self._root.update_idletasks()
-        self._root.update()
+    # Override
+    def _shouldDraw(self, state, forceDraw = False):
+        if (self._dead):
+            self._cleanup()
 
-        self._lastDrawTime = time.time()
+        self._totalDrawRequests += 1
+
+        if (self._firstDrawTime is None):
+            self._firstDrawTime = time.time()
+
+            # This is our first frame, we do not have an FPS to stabilize yet.
+            forceDraw = True
+
+        # Dropped frames are never built.
+        return forceDraw or not self._adjustFPS()
 
     def _resize(self, event):
         if (self._width == event.width and self._height == event.height):
@@ -193,3 +229,169 @@ class AbstractGUIView(AbstractView):
         """
 
         self._dead = True
+
+class DirtyRegionRenderer(object):
+    """
+    Draws frames onto a Tk canvas as a grid of tiles (one canvas image per board cell),
+    one canvas image per agent, and one for the score.
+    Each frame is diffed against the last one, so only the tiles whose tokens changed are updated
+    and agents are just moved.
+    Sprites are resized and converted once per window size.
+    """
+
+    def __init__(self, canvas, sprites, font):
+        self._canvas = canvas
+        self._sprites = sprites
+        self._font = font
+
+        # The size (window and board) the current tiles were laid out for.
+        self._layoutKey = None
+
+        self._scaleX = None
+        self._scaleY = None
+
+        # [x][y] -> canvas item, and the token currently shown by that item.
+        self._tiles = None
+        self._board = None
+
+        self._agentItems = []
+        self._scoreItem = None
+        self._score = None
+        self._scoreImage = None
+
+        # {(token, width, height): tk image}
+        self._images = {}
+
+    def clear(self):
+        self._canvas.delete(TILE_TAG)
+        self._layoutKey = None
+        self._images = {}
+
+    def draw(self, frame, width, height):
+        layoutKey = (width, height, frame.getBoardWidth(), frame.getBoardHeight())
+        if (layoutKey != self._layoutKey):
+            self._layout(frame, width, height)
+            self._layoutKey = layoutKey
+
+        self._drawBoard(frame)
+        self._drawAgents(frame)
+        self._drawScore(frame)
+
+    def _drawAgents(self, frame):
+        agents = list(frame.getAgents().items())
+
+        while (len(self._agentItems) < len(agents)):
+            item = self._canvas.create_image(0, 0, image = '', anchor = tkinter.NW,
+                    tags = TILE_TAG)
+            self._agentItems.append(item)
+
+        tileSize = (round(self._scaleX), round(self._scaleY))
+
+        for i in range(len(self._agentItems)):
+            item = self._agentItems[i]
+
+            if (i >= len(agents)):
+                self._canvas.itemconfig(item, image = '')
+                continue
+
+            ((x, y), agentToken) = agents[i]
+            image = self._getImage(frame, agentToken, tileSize)
+
+            self._canvas.coords(item, *self._toCanvasCoords(frame, x, y))
+            self._canvas.itemconfig(item, image = image)
+
+    def _drawBoard(self, frame):
+        for x in range(frame.getBoardWidth()):
+            column = frame.getCol(x)
+            if (column == self._board[x]):
+                continue
+
+            for y in range(frame.getBoardHeight()):
+                if (column[y] == self._board[x][y]):
+                    continue
+
+                image = ''
+                if (column[y] != token.EMPTY_TOKEN):
+                    image = self._getImage(frame, column[y], self._getTileSize(frame, x, y))
+
+                self._canvas.itemconfig(self._tiles[x][y], image = image)
+
+            self._board[x] = list(column)
+
+    def _drawScore(self, frame):
+        if (frame.getScore() == self._score):
+            return
+
+        width = round(frame.getBoardWidth() * self._scaleX)
+        height = round(self._scaleY)
+
+        image = frame.toScoreImage(self._font)
+        if (image.size != (width, height)):
+            image = image.resize((width, height), resample = Image.LANCZOS)
+
+        self._scoreImage = self._toPhotoImage(image)
+        self._canvas.itemconfig(self._scoreItem, image = self._scoreImage)
+        self._score = frame.getScore()
+
+    def _getImage(self, frame, objectToken, size):
+        key = (objectToken, size[0], size[1])
+
+        image = self._images.get(key)
+        if (image is None):
+            image = frame.getTokenImage(objectToken, self._sprites)
+            if (image.size != size):
+                image = image.resize(size, resample = Image.LANCZOS)
+
+            image = self._toPhotoImage(image)
+            self._images[key] = image
+
+        return image
+
+    def _getTileSize(self, frame, x, y):
+        (left, top) = self._toCanvasCoords(frame, x, y)
+        (right, bottom) = self._toCanvasCoords(frame, x + 1, y - 1)
+
+        return (right - left, bottom - top)
+
+    def _layout(self, frame, width, height):
+        """
+        Create (empty) canvas items for a new window or board size.
+        """
+
+        self.clear()
+
+        # Empty tiles are not drawn, so let the canvas show through.
+        self._canvas.config(background = BACKGROUND_COLOR)
+
+        # Height is +1 for the score.
+        self._scaleX = width / frame.getBoardWidth()
+        self._scaleY = height / (frame.getBoardHeight() + 1)
+
+        self._tiles = []
+        self._board = []
+
+        for x in range(frame.getBoardWidth()):
+            column = []
+            for y in range(frame.getBoardHeight()):
+                column.append(self._canvas.create_image(*self._toCanvasCoords(frame, x, y),
+                        image = '', anchor = tkinter.NW, tags = TILE_TAG))
+
+            self._tiles.append(column)
+            self._board.append(frame.getBoardHeight() * [token.EMPTY_TOKEN])
+
+        # Agents are created after the tiles, so they are always drawn on top.
+        self._agentItems = []
+
+        self._scoreItem = self._canvas.create_image(*self._toCanvasCoords(frame, 0, -1),
+                image = '', anchor = tkinter.NW, tags = TILE_TAG)
+        self._score = None
+
+    def _toCanvasCoords(self, frame, x, y):
+        # Tk has (0, 0) as the upper-left, while pacai has it as the lower-left.
+        return (
+            round(x * self._scaleX),
+            round((frame.getBoardHeight() - 1 - y) * self._scaleY)
+        )
+
+    def _toPhotoImage(self, image):
+        return ImageTk.PhotoImage(image)
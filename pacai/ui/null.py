@@ -8,14 +8,11 @@ class AbstractNullView(AbstractView):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-    # Override
-    def _createFrame(self, state):
-        # Only create frames if we are creating a gif and this is not a skip frame.
-        if (self._saveFrames and (self._frameCount % self._skipFrames == 0)):
-            return super()._createFrame(state)
-
-        return None
-
     # Override
     def _drawFrame(self, state, frame, forceDraw = False):
         pass
+
+    # Override
+    def _shouldDraw(self, state, forceDraw = False):
+        # Frames will only be created if we are creating a gif.
+        return False
@@ -3,8 +3,6 @@ The graphics for pacman are held in a spritesheet.
 This file knows how to read a spritesheet and map sprites to tokens.
 """
 
-from PIL import Image
-
 from pacai.core.directions import Directions
 from pacai.ui import token
 
@@ -66,7 +64,26 @@ SPRITE_SHEET_AGENTS = [
     (token.GHOST_6, 12),
 ]
 
+# Sprite sheets that have already been loaded (by path).
+# Sprites are never modified, so every view in the process can share them.
+_spriteSheets = {}
+
+def getSpriteSheet(path):
+    """
+    Get the sprites from a sprite sheet, only loading it the first time it is asked for.
+    """
+
+    sprites = _spriteSheets.get(path)
+    if (sprites is None):
+        sprites = loadSpriteSheet(path)
+        _spriteSheets[path] = sprites
+
+    return sprites
+
 def loadSpriteSheet(path):
+    # Defer importing PIL until something is actually drawn.
+    from PIL import Image
+
     spritesheet = Image.open(path)
 
     sprites = {}
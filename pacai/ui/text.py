@@ -1,38 +1,69 @@
+import sys
+import time
+
 from pacai.ui import token
 from pacai.ui.view import AbstractView
 
+ANSI_CLEAR_SCREEN = '\x1b[2J'
+ANSI_CLEAR_LINE = '\x1b[K'
+ANSI_HIDE_CURSOR = '\x1b[?25l'
+ANSI_SHOW_CURSOR = '\x1b[?25h'
+# Move to a (1-indexed) row and column.
+ANSI_MOVE_CURSOR = '\x1b[%d;%dH'
+
 class AbstractTextView(AbstractView):
     """
     A view that outputs to stdout.
+
+    By default, every frame is printed below the last one.
+    With `ansi`, the board is drawn once and then updated in place
+    (only the cells that changed since the last frame are written).
+    A positive `refreshRate` limits how many frames are drawn per second,
+    and any frames in between are skipped (the final frame is always drawn).
+    Each frame is written to stdout all at once.
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, ansi = False, refreshRate = 0, **kwargs):
         super().__init__(**kwargs)
 
-    # Override
-    def _drawFrame(self, state, frame, forceDraw = False):
-        # Only draw after agents moves.
-        if (not forceDraw and state.getLastAgentMoved() != 0):
-            return
+        self._ansi = ansi
 
-        print()
+        self._timePerFrame = 0.0
+        if (refreshRate > 0):
+            self._timePerFrame = 1.0 / refreshRate
 
-        agentTokens = frame.getDiscreteAgents()
+        self._lastDrawTime = None
 
-        row = frame.getBoardWidth() * [None]
+        # The rows (as lists of cells) and score currently on screen in ANSI mode.
+        self._screenRows = None
+        self._screenScore = None
 
-        # Start in the upper left (0, height - 1) amd go row-by-row.
-        for y in range(frame.getBoardHeight() - 1, -1, -1):
-            for x in range(0, frame.getBoardWidth(), 1):
-                # Overlay the agent's onto the board at the closest interger position.
-                if ((x, y) in agentTokens):
-                    row[x] = self._convertToken(agentTokens[(x, y)])
-                else:
-                    row[x] = self._convertToken(frame.getToken(x, y))
+    # Override
+    def finish(self):
+        super().finish()
+
+        if (self._ansi and self._screenRows is not None):
+            # Leave the cursor under the board.
+            self._write(ANSI_MOVE_CURSOR % (len(self._screenRows) + 2, 1) + ANSI_SHOW_CURSOR)
+            self._screenRows = None
+
+    # Override
+    def initialize(self, state):
+        super().initialize(state)
 
-            print(''.join(row))
+        # A new game gets a fresh screen.
+        self._screenRows = None
+        self._lastDrawTime = None
 
-        print('Score: %d' % (state.getScore()))
+    # Override
+    def _drawFrame(self, state, frame, forceDraw = False):
+        rows = self._getRows(frame)
+        score = 'Score: %d' % (state.getScore())
+
+        if (self._ansi):
+            self._write(self._getScreenUpdate(rows, score))
+        else:
+            self._write('\n' + '\n'.join([''.join(row) for row in rows]) + '\n' + score + '\n')
 
     def _convertToken(self, objectToken):
         if (objectToken == token.EMPTY_TOKEN):
@@ -51,3 +82,96 @@ class AbstractTextView(AbstractView):
             return 'S'
         else:
             return "%02d" % (objectToken)
+
+    def _getRows(self, frame):
+        """
+        Get the board as a list of rows (top to bottom), each a list of cell strings.
+        """
+
+        agentTokens = frame.getDiscreteAgents()
+
+        rows = []
+
+        # Start in the upper left (0, height - 1) amd go row-by-row.
+        for y in range(frame.getBoardHeight() - 1, -1, -1):
+            row = frame.getBoardWidth() * [None]
+
+            for x in range(0, frame.getBoardWidth(), 1):
+                # Overlay the agent's onto the board at the closest interger position.
+                if ((x, y) in agentTokens):
+                    row[x] = self._convertToken(agentTokens[(x, y)])
+                else:
+                    row[x] = self._convertToken(frame.getToken(x, y))
+
+            rows.append(row)
+
+        return rows
+
+    def _getScreenUpdate(self, rows, score):
+        """
+        Get the ANSI output that takes the screen from the last frame to this one.
+        """
+
+        scoreRow = len(rows) + 1
+
+        # Draw everything the first time (or if the board changed size).
+        if (self._screenRows is None or len(self._screenRows) != len(rows)
+                or any([len(old) != len(new) for (old, new) in zip(self._screenRows, rows)])):
+            self._screenRows = rows
+            self._screenScore = score
+
+            return (ANSI_HIDE_CURSOR + ANSI_CLEAR_SCREEN + ANSI_MOVE_CURSOR % (1, 1)
+                    + '\n'.join([''.join(row) for row in rows]) + '\n' + score + ANSI_CLEAR_LINE)
+
+        output = []
+
+        for rowIndex in range(len(rows)):
+            oldRow = self._screenRows[rowIndex]
+            newRow = rows[rowIndex]
+            if (oldRow == newRow):
+                continue
+
+            # Write each run of changed cells after a single cursor move.
+            column = 1
+            runStart = None
+            for x in range(len(newRow) + 1):
+                changed = (x < len(newRow) and oldRow[x] != newRow[x])
+
+                if (changed and runStart is None):
+                    runStart = x
+                    output.append(ANSI_MOVE_CURSOR % (rowIndex + 1, column))
+                elif (not changed and runStart is not None):
+                    output.append(''.join(newRow[runStart:x]))
+                    runStart = None
+
+                if (x < len(newRow)):
+                    column += len(newRow[x])
+
+        if (score != self._screenScore):
+            output.append(ANSI_MOVE_CURSOR % (scoreRow, 1) + score + ANSI_CLEAR_LINE)
+
+        self._screenRows = rows
+        self._screenScore = score
+
+        return ''.join(output)
+
+    # Override
+    def _shouldDraw(self, state, forceDraw = False):
+        # Only draw after agents moves.
+        if (not forceDraw and state.getLastAgentMoved() != 0):
+            return False
+
+        now = time.time()
+        if (not forceDraw and self._lastDrawTime is not None
+                and (now - self._lastDrawTime) < self._timePerFrame):
+            return False
+
+        self._lastDrawTime = now
+        return True
+
+    def _write(self, text):
+        if (len(text) == 0):
+            return
+
+        sys.stdout.write(text)
+        sys.stdout.flush()
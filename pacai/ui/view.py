@@ -1,8 +1,6 @@
 import abc
 import os
 
-from PIL import ImageFont
-
 from pacai.ui import spritesheet
 
 DEFAULT_GIF_FPS = 10
@@ -14,6 +12,27 @@ DEFAULT_SPRITES = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'pac
 
 THIS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)))
 FONT_PATH = os.path.join(THIS_DIR, 'fonts', 'roboto', 'RobotoMono-Regular.ttf')
+FONT_SIZE = spritesheet.SQUARE_SIZE - 14
+
+# Fonts that have already been loaded (by path and size), shared by every view in the process.
+_fonts = {}
+
+def getFont(path = FONT_PATH, size = FONT_SIZE):
+    """
+    Get a font, only loading it the first time it is asked for.
+    """
+
+    key = (path, size)
+
+    font = _fonts.get(key)
+    if (font is None):
+        # Defer importing PIL until something is actually drawn.
+        from PIL import ImageFont
+
+        font = ImageFont.truetype(path, size)
+        _fonts[key] = font
+
+    return font
 
 class AbstractView(abc.ABC):
     """
@@ -21,18 +40,25 @@ class AbstractView(abc.ABC):
     view should implement.
     The ability to produce a gif is inherent to all views,
     even if they do not produce graphics at runtime.
+    Key frames are streamed into the gif as they are produced
+    (on a background thread if `gifThread` is set), see `pacai.ui.gif.GifWriter`.
+
+    Sprites and fonts are only loaded the first time something is drawn,
+    so views that never draw (e.g. null views without a gif) never load them.
     """
 
     def __init__(self, spritesPath = DEFAULT_SPRITES,
-            gifPath = None, gifFPS = DEFAULT_GIF_FPS, skipFrames = DEFAULT_SKIP_FRAMES):
+            gifPath = None, gifFPS = DEFAULT_GIF_FPS, skipFrames = DEFAULT_SKIP_FRAMES,
+            gifThread = False):
         self._spritesPath = spritesPath
 
         self._gifPath = gifPath
         self._gifFPS = max(MIN_GIF_FPS, int(gifFPS))
+        self._gifThread = gifThread
+        self._gifWriter = None
 
         self._saveFrames = (self._gifPath is not None)
         self._skipFrames = max(1, int(skipFrames))
-        self._keyFrames = []
 
         # The number of frames this view has produced.
         self._frameCount = 0
@@ -40,21 +66,15 @@ class AbstractView(abc.ABC):
         # (Tracked by the number of times agent 0 has been animated.)
         self._turnCount = 0
 
-        self._sprites = spritesheet.loadSpriteSheet(spritesPath)
-        self._font = ImageFont.truetype(FONT_PATH, spritesheet.SQUARE_SIZE - 14)
-
     def finish(self):
         """
         Signal that the game is over and the UI should cleanup.
         """
 
-        # Save the gif.
-        if (self._saveFrames and len(self._keyFrames) > 0):
-            gifTimePerFrameMS = int(1.0 / self._gifFPS * 1000.0)
-
-            images = [frame.toImage(self._sprites, self._font) for frame in self._keyFrames]
-            images[0].save(self._gifPath, save_all = True, append_images = images,
-                    duration = gifTimePerFrameMS, loop = 0, optimize = False)
+        # Finish the gif.
+        if (self._gifWriter is not None):
+            self._gifWriter.close()
+            self._gifWriter = None
 
     def getKeyboard(self):
         """
@@ -78,12 +98,19 @@ class AbstractView(abc.ABC):
         if (state.isOver()):
             forceDraw = True
 
-        frame = self._createFrame(state)
-        if (frame is not None and self._saveFrames
-                and (state.isOver() or (self._frameCount % self._skipFrames == 0))):
-            self._keyFrames.append(frame)
+        saveFrame = (self._saveFrames
+                and (state.isOver() or (self._frameCount % self._skipFrames == 0)))
+        drawFrame = self._shouldDraw(state, forceDraw = forceDraw)
 
-        self._drawFrame(state, frame, forceDraw = forceDraw)
+        # Only build a frame if something is going to use it.
+        if (saveFrame or drawFrame):
+            frame = self._createFrame(state)
+
+            if (saveFrame):
+                self._saveKeyFrame(frame)
+
+            if (drawFrame):
+                self._drawFrame(state, frame, forceDraw = forceDraw)
 
         self._frameCount += 1
         if (state.getLastAgentMoved() == 0):
@@ -98,11 +125,37 @@ class AbstractView(abc.ABC):
 
         pass
 
+    def _getFont(self):
+        return getFont()
+
+    def _getSprites(self):
+        return spritesheet.getSpriteSheet(self._spritesPath)
+
+    def _saveKeyFrame(self, frame):
+        if (self._gifWriter is None):
+            # Defer importing the gif writer (and PIL) unless we actually need it.
+            from pacai.ui.gif import GifWriter
+
+            self._gifWriter = GifWriter(self._gifPath, self._gifFPS,
+                    self._getSprites(), self._getFont(), background = self._gifThread)
+
+        self._gifWriter.addFrame(frame)
+
     @abc.abstractmethod
     def _drawFrame(self, state, frame, forceDraw = False):
         """
         The real work for each view implementation.
         From a frame, output to whatever medium this view utilizes.
+        Only called when `AbstractView._shouldDraw` says to.
         """
 
         pass
+
+    def _shouldDraw(self, state, forceDraw = False):
+        """
+        Decide if this state will be drawn.
+        Views that skip some states should say so here,
+        so that frames are not built for states that will never be drawn.
+        """
+
+        return True
@@ -0,0 +1,205 @@
+import random
+import time
+import unittest
+
+from pacai.agents.search.multiagent import AlphaBetaSearchAgent
+from pacai.bin.capture import CaptureGameState
+from pacai.bin.pacman import PacmanGameState
+from pacai.core import distance
+from pacai.core import adversarial
+from pacai.core.adversarial import AlphaBetaSearch
+from pacai.core.adversarial import RootParallelSearch
+from pacai.core.layout import getLayout
+
+def _evaluate(state):
+    # Break ties in the score, so that there is something to prune.
+    pacmanPosition = state.getPacmanPosition()
+    food = state.getFood().asList()
+
+    closest = 0
+    if (len(food) > 0):
+        closest = min([distance.manhattan(pacmanPosition, position) for position in food])
+
+    return 10 * state.getScore() - closest
+
+"""
+Test the adversarial search engine against a plain minimax search.
+"""
+class AlphaBetaSearchTest(unittest.TestCase):
+    def test_minimax_value(self):
+        layout = getLayout('smallClassic')
+        rng = random.Random(3)
+
+        state = PacmanGameState(layout)
+        search = AlphaBetaSearch(_evaluate)
+
+        for i in range(60):
+            if (state.isOver()):
+                break
+
+            agentIndex = i % state.getNumAgents()
+
+            if (agentIndex == 0 and i % 6 == 0):
+                for depth in [1, 2]:
+                    expected = self._minimax(state, 0, depth * state.getNumAgents())
+
+                    action = search.search(state, 0, maxDepth = depth)
+                    self.assertIn(action, state.getLegalActions(0))
+                    self.assertEqual(search.getStats()['depth'], depth)
+                    self.assertEqual(search.getStats()['value'], expected)
+
+            action = rng.choice(state.getLegalActions(agentIndex))
+            state = state.generateSuccessor(agentIndex, action)
+
+    def test_state_unchanged(self):
+        layout = getLayout('tinyCapture')
+
+        state = CaptureGameState(layout, 1200)
+        expected = CaptureGameState(layout, 1200)
+
+        search = AlphaBetaSearch(lambda state: state.getScore())
+        search.search(state, 0, maxDepth = 2, maximizers = [0, 2])
+
+        self.assertEqual(state, expected)
+        self.assertEqual(hash(state), hash(expected))
+        self.assertEqual(state.getNumFood(), expected.getNumFood())
+
+    def test_time_limit(self):
+        layout = getLayout('mediumClassic')
+        state = PacmanGameState(layout)
+
+        search = AlphaBetaSearch(_evaluate)
+
+        startTime = time.perf_counter()
+        action = search.search(state, 0, timeLimit = 0.2)
+        timeTaken = time.perf_counter() - startTime
+
+        self.assertIn(action, state.getLegalActions(0))
+        self.assertLess(timeTaken, 0.5)
+        self.assertGreater(search.getStats()['depth'], 1)
+
+    def test_agent_move_time(self):
+        # Without a move time or time fraction, the search is only limited by depth.
+        agent = AlphaBetaSearchAgent(0)
+        agent.setMoveWarningTime(30.0)
+        self.assertIsNone(agent.getMoveTime())
+
+        agent = AlphaBetaSearchAgent(0, depth = 0)
+        agent.setMoveWarningTime(30.0)
+        self.assertRaises(ValueError, agent.getAction, PacmanGameState(getLayout('smallClassic')))
+
+        agent = AlphaBetaSearchAgent(0, depth = 0, timeFraction = 0.5)
+        self.assertIsNone(agent.getMoveTime())
+
+        agent.setMoveWarningTime(1.0)
+        self.assertEqual(agent.getMoveTime(), 0.5)
+
+        agent = AlphaBetaSearchAgent(0, moveTime = 0.1)
+        agent.setMoveWarningTime(1.0)
+        self.assertEqual(agent.getMoveTime(), 0.1)
+
+        state = PacmanGameState(getLayout('smallClassic'))
+        self.assertIn(agent.getAction(state), state.getLegalActions(0))
+
+    def test_root_parallel(self):
+        layout = getLayout('mediumClassic')
+        state = PacmanGameState(layout)
+
+        serial = AlphaBetaSearch(_evaluate)
+        serial.search(state, 0, maxDepth = 2)
+
+        search = RootParallelSearch(_evaluate, 2)
+        try:
+            action = search.search(state, 0, maxDepth = 2)
+            self.assertIn(action, state.getLegalActions(0))
+            self.assertEqual(search.getStats()['depth'], 2)
+            self.assertEqual(search.getStats()['value'], serial.getStats()['value'])
+
+            startTime = time.perf_counter()
+            action = search.search(state, 0, timeLimit = 0.2)
+            timeTaken = time.perf_counter() - startTime
+
+            self.assertIn(action, state.getLegalActions(0))
+            self.assertLess(timeTaken, 0.5)
+        finally:
+            search.close()
+
+    def test_root_parallel_consecutive(self):
+        # Workers keep their tables between searches, which must not change any values.
+        # The serial search hashes states on its own copy of the layout,
+        # so that it does not change the keys of the layout the game is played on.
+        layout = getLayout('smallClassic')
+        serialLayout = getLayout('smallClassic')
+        rng = random.Random(5)
+
+        state = PacmanGameState(layout)
+        serial = AlphaBetaSearch(_evaluate)
+
+        search = RootParallelSearch(_evaluate, 2)
+        try:
+            for i in range(60):
+                if (state.isOver()):
+                    break
+
+                agentIndex = i % state.getNumAgents()
+
+                if (agentIndex == 0 and i % 4 == 0):
+                    action = search.search(state, 0, maxDepth = 2)
+
+                    serial.clear()
+                    serialState = PacmanGameState.fromSnapshot(state.getSnapshot(), serialLayout)
+                    self.assertEqual(action, serial.search(serialState, 0, maxDepth = 2))
+                    self.assertEqual(search.getStats()['value'], serial.getStats()['value'])
+
+                action = rng.choice(state.getLegalActions(agentIndex))
+                state = state.generateSuccessor(agentIndex, action)
+
+            # A new layout gets new workers.
+            state = PacmanGameState(getLayout('mediumClassic'))
+            serial.clear()
+            serial.search(state, 0, maxDepth = 2)
+
+            search.search(state, 0, maxDepth = 2)
+            self.assertEqual(search.getStats()['value'], serial.getStats()['value'])
+        finally:
+            search.close()
+
+    def test_merge_root_actions(self):
+        actions = ['North', 'South', 'East']
+
+        # East ran out of time first, so every action is compared at depth two.
+        results = {
+            'North': ([1, 5, 9], False),
+            'South': ([2, 6, 1], False),
+            'East': ([3, 4], False),
+        }
+        self.assertEqual(adversarial._mergeRootActions(actions, results, True),
+                (2, 6, 'South'))
+        self.assertEqual(adversarial._mergeRootActions(actions, results, False),
+                (2, 4, 'East'))
+
+        # The game always ends right after East, so its value holds at any depth.
+        results['East'] = ([3], True)
+        self.assertEqual(adversarial._mergeRootActions(actions, results, False),
+                (3, 1, 'South'))
+
+        # Missing actions are left out, and nothing finished falls back to the first action.
+        self.assertEqual(adversarial._mergeRootActions(actions, {'East': ([3], False)}, True),
+                (1, 3, 'East'))
+        self.assertEqual(adversarial._mergeRootActions(actions, {}, True), (0, None, 'North'))
+
+    def _minimax(self, state, agentIndex, plies):
+        if (state.isOver() or plies == 0):
+            return _evaluate(state)
+
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        values = [self._minimax(state.generateSuccessor(agentIndex, action), nextAgent, plies - 1)
+                for action in state.getLegalActions(agentIndex)]
+
+        if (agentIndex == 0):
+            return max(values)
+
+        return min(values)
+
+if __name__ == '__main__':
+    unittest.main()
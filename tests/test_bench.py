@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pacai.bin import bench
+
+"""
+Test the benchmark suite.
+"""
+class BenchTest(unittest.TestCase):
+    def test_compare(self):
+        baseline = _results({'fast': 1.0, 'slow': 1.0, 'same': 1.0, 'removed': 1.0})
+        results = _results({'fast': 0.5, 'slow': 1.5, 'same': 1.05, 'added': 1.0})
+
+        comparisons = bench.compareResults(baseline, results, threshold = 0.10)
+
+        self.assertEqual(sorted(comparisons), ['fast', 'same', 'slow'])
+        self.assertEqual(comparisons['fast']['status'], 'improvement')
+        self.assertEqual(comparisons['slow']['status'], 'regression')
+        self.assertEqual(comparisons['same']['status'], 'same')
+        self.assertAlmostEqual(comparisons['slow']['ratio'], 1.5)
+
+        self.assertIn('regression', bench.formatComparisons(comparisons))
+
+    def test_benchmarks_run(self):
+        # Every benchmark (except the slow distance ones) can be set up and run once.
+        for benchmark in bench.getBenchmarks():
+            if (benchmark.name.startswith('computeDistance')):
+                continue
+
+            benchmark.setup()()
+
+        names = [benchmark.name for benchmark in bench.getBenchmarks()]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertIn('computeDistances.mediumClassic', names)
+
+    def test_main(self):
+        args = ['--filter', '^grid\\.', '--repeat', '2', '--min-time', '0.001', '--quiet']
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = os.path.join(tempDir, 'baseline.json')
+
+            results, comparisons = bench.main(args + ['--output', path])
+            self.assertIsNone(comparisons)
+            self.assertEqual(sorted(results['benchmarks']), ['grid.copy', 'grid.count'])
+
+            with open(path, 'r') as file:
+                self.assertEqual(json.load(file), results)
+
+            results, comparisons = bench.main(args + ['--baseline', path])
+            self.assertEqual(sorted(comparisons), ['grid.copy', 'grid.count'])
+
+    def test_help(self):
+        try:
+            bench.main(['--help'])
+        except SystemExit as status:
+            if status.code != 0:
+                self.fail("Error occured when running --help.")
+
+def _results(times):
+    return {'benchmarks': {name: {'best': time} for (name, time) in times.items()}}
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,16 @@
+import os
+import sys
+import tempfile
+import textwrap
 import unittest
 
+from pacai.agents.ghost.random import RandomGhost
 from pacai.bin import capture
 from pacai.bin import gridworld
 from pacai.bin import pacman
+from pacai.bin import tournament
+from pacai.core.layout import getLayout
+from pacai.ui.pacman.null import PacmanNullView
 
 """
 This is a test class to assess the executables of this project.
@@ -33,6 +41,11 @@ class BinTest(unittest.TestCase):
         # Run game of capture with default agents.
         capture.main(['--null-graphics'])
 
+    def test_capture_mcts(self):
+        # Run a short game of capture with an MCTS team (with a quick move time).
+        capture.main(['--null-graphics', '--seed', '1234', '--max-moves', '40',
+                '--red', 'pacai.core.mctsTeam', '--red-args', 'moveTime=0.01'])
+
     def test_capture_help(self):
         # Show all capture arguments.
         try:
@@ -60,6 +73,54 @@ class BinTest(unittest.TestCase):
         # Run game of pacman with seed value entry.
         pacman.main(['-p', 'GreedyAgent', '--null-graphics', '--seed', '1234'])
 
+    def test_pacman_parallel(self):
+        # The results of parallel games should not depend on the number of workers.
+        args = ['-p', 'GreedyAgent', '--null-graphics', '--layout', 'smallClassic',
+                '--seed', '1234', '--num-games', '4']
+
+        serial = pacman.main(args + ['--workers', '1'])
+        parallel = pacman.main(args + ['--workers', '2'])
+
+        self.assertEqual([result.score for result in serial],
+                [result.score for result in parallel])
+        self.assertEqual([result.moveHistory for result in serial],
+                [result.moveHistory for result in parallel])
+
+    def test_pacman_plain_agent(self):
+        # Agents only need the methods the game calls, they do not have to be BaseAgents.
+        layout = getLayout('smallClassic')
+        ghosts = [RandomGhost(index) for index in range(1, 3)]
+
+        game = pacman.ClassicGameRules(30).newGame(layout, PlainAgent(), ghosts,
+                PacmanNullView(), True)
+        game.run()
+
+        self.assertFalse(game.agentCrashed)
+        self.assertGreater(len(game.moveHistory), 0)
+
+    def test_pacman_headless(self):
+        # Headless games play out the same, but do not keep their history.
+        args = ['-p', 'GreedyAgent', '--null-graphics', '--layout', 'smallClassic',
+                '--seed', '1234', '--num-games', '2']
+
+        normal = pacman.main(args)
+        headless = pacman.main(args + ['--headless'])
+
+        self.assertEqual([game.state.getScore() for game in normal],
+                [game.state.getScore() for game in headless])
+        self.assertTrue(all([len(game.moveHistory) > 0 for game in normal]))
+        self.assertEqual([game.moveHistory for game in headless], [[], []])
+
+        # Parallel games seed each game on its own.
+        normal = pacman.main(args + ['--workers', '2'])
+        headless = pacman.main(args + ['--headless', '--workers', '2'])
+        self.assertEqual([result.score for result in normal],
+                [result.score for result in headless])
+        self.assertEqual([result.moveHistory for result in headless], [[], []])
+
+        # Headless games cannot have a display.
+        self.assertRaises(ValueError, pacman.main, args[:2] + ['--headless'])
+
     def test_capture_seeded_maze_generations(self):
         # Run game of capture with random generated map without seed value.
         capture.main(['--null-graphics', '--layout', 'RANDOM']) 
@@ -67,5 +128,102 @@ class BinTest(unittest.TestCase):
         # Run game of capture with random generated map with seed value.
         capture.main(['--null-graphics', '--layout', 'RANDOM94'])
 
+    def test_tournament(self):
+        teams = ['pacai.core.baselineTeam', 'pacai.student.myTeam', 'pacai.student.missingTeam']
+        results, standings = tournament.main(['--teams'] + teams + ['--layouts', 'RANDOM94',
+                '--max-moves', '100', '--workers', '2', '--seed', '1234', '--quiet'])
+
+        # Every team plays every other team once on each side.
+        self.assertEqual(len(results), 6)
+        self.assertEqual([record.getPlayed() for record in standings], [4, 4, 4])
+
+        # A team that cannot be loaded forfeits all its matches.
+        self.assertEqual(standings[-1].name, 'pacai.student.missingTeam')
+        self.assertEqual(standings[-1].losses, 4)
+
+        # Neither team loading is no contest (instead of a tie).
+        result = tournament._playMatch(('pacai.student.missingTeam', 'pacai.student.otherTeam',
+                'RANDOM94', 100, 1234))
+        self.assertIsNone(result.score)
+
+    def test_tournament_failures(self):
+        teams = {
+            # Never returns from getAction.
+            'pacai_unittest_hangingTeam': 'while True: time.sleep(1)',
+            # Kills its own process.
+            'pacai_unittest_crashingTeam': 'os._exit(1)',
+        }
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            for (name, action) in teams.items():
+                with open(os.path.join(tempDir, name + '.py'), 'w') as file:
+                    file.write(TEAM_TEMPLATE % (action))
+
+            # Exits while it is being loaded.
+            with open(os.path.join(tempDir, 'pacai_unittest_exitingTeam.py'), 'w') as file:
+                file.write('import sys\nsys.exit(1)\n')
+
+            sys.path.insert(0, tempDir)
+            try:
+                teams = ['pacai.core.baselineTeam', 'pacai_unittest_hangingTeam',
+                        'pacai_unittest_crashingTeam', 'pacai_unittest_exitingTeam']
+                results, standings = tournament.main(['--teams'] + teams + ['--layouts',
+                        'RANDOM94', '--max-moves', '100', '--workers', '2', '--seed', '1234',
+                        '--match-timeout', '3', '--quiet'])
+            finally:
+                sys.path.remove(tempDir)
+
+        records = {record.name: record for record in standings}
+
+        # Matches that hang or crash do not count, so only the forfeits are left.
+        for team in teams[:3]:
+            self.assertEqual(records[team].getPlayed(), 2)
+            self.assertEqual(records[team].wins, 2)
+
+        self.assertEqual(records['pacai_unittest_exitingTeam'].losses, 6)
+
+        self.assertEqual(len([result for result in results if (result.score is None)]), 6)
+
+        for result in results:
+            opponents = set([result.redTeam, result.blueTeam])
+            if (opponents == set(['pacai.core.baselineTeam', 'pacai_unittest_hangingTeam'])):
+                self.assertIn('timed out', result.error)
+            elif (opponents == set(['pacai.core.baselineTeam', 'pacai_unittest_crashingTeam'])):
+                self.assertIn('died', result.error)
+
+    def test_tournament_help(self):
+        try:
+            tournament.main(['--help'])
+        except SystemExit as status:
+            if status.code != 0:
+                self.fail("Error occured when running --help.")
+
+class PlainAgent(object):
+    def registerInitialState(self, state):
+        pass
+
+    def observationFunction(self, state):
+        pass
+
+    def getAction(self, state):
+        return state.getLegalActions(0)[0]
+
+    def final(self, state):
+        pass
+
+TEAM_TEMPLATE = textwrap.dedent("""
+    import os
+    import time
+
+    from pacai.agents.base import BaseAgent
+
+    class BadAgent(BaseAgent):
+        def getAction(self, state):
+            %s
+
+    def createTeam(firstIndex, secondIndex, isRed):
+        return [BadAgent(firstIndex), BadAgent(secondIndex)]
+""")
+
 if __name__ == '__main__':
     unittest.main()
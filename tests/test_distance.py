@@ -0,0 +1,208 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from pacai.core import distanceCalculator
+from pacai.core.layout import getLayout
+
+"""
+Test the maze distance calculator.
+"""
+class DistanceTest(unittest.TestCase):
+    def test_matrix_matches_ucs(self):
+        layout = getLayout('mediumCapture')
+
+        expected = distanceCalculator.computeDistances(layout)
+        matrix = distanceCalculator.computeDistanceMatrix(layout)
+
+        for ((pos1, pos2), distance) in expected.items():
+            self.assertEqual(matrix.getDistance(pos1, pos2), distance)
+
+        self.assertIsNone(matrix.getDistance((0, 0), (1, 3)))
+
+    def test_distancer(self):
+        distancer = distanceCalculator.Distancer(getLayout('mediumCapture'))
+        self.assertFalse(distancer.isReadyForMazeDistance())
+
+        distancer.getMazeDistances()
+        self.assertTrue(distancer.isReadyForMazeDistance())
+
+        self.assertEqual(distancer.getDistance((1, 3), (1, 3)), 0)
+        self.assertEqual(distancer.getDistance((1.0, 3.0), (1, 4)), 1)
+        self.assertEqual(distancer.getDistance((1, 3.5), (1, 3)), 0.5)
+
+    def test_disk_cache(self):
+        layout = getLayout('mediumCapture')
+        expected = distanceCalculator.computeDistanceMatrix(layout)
+
+        with tempfile.TemporaryDirectory() as cacheDir:
+            path = distanceCalculator.getCachePath(layout, cacheDir)
+            self.assertFalse(os.path.isfile(path))
+
+            distanceCalculator.loadDistanceMatrix(layout, cacheDir)
+            self.assertTrue(os.path.isfile(path))
+
+            wallsKey = distanceCalculator._getWallsKey(layout)
+            cached = distanceCalculator.readDistanceMatrix(path, wallsKey)
+            self.assertEqual(cached.getCells(), expected.getCells())
+
+            for pos1 in expected.getCells():
+                for pos2 in expected.getCells():
+                    self.assertEqual(cached.getDistance(pos1, pos2),
+                            expected.getDistance(pos1, pos2))
+
+            # Drop the mapped buffers before the directory is removed.
+            del cached
+
+            # A file for other walls is not used.
+            otherKey = distanceCalculator._getWallsKey(getLayout('tinyCapture'))
+            self.assertIsNone(distanceCalculator.readDistanceMatrix(path, otherKey))
+
+            # Neither is a file with extra data at the end.
+            with open(path, 'ab') as file:
+                file.write(b'\0\0')
+            self.assertIsNone(distanceCalculator.readDistanceMatrix(path, wallsKey))
+
+    @unittest.skipIf(not hasattr(os, 'getuid'), 'File ownership is not available.')
+    def test_disk_cache_untrusted(self):
+        layout = getLayout('mediumCapture')
+        wallsKey = distanceCalculator._getWallsKey(layout)
+
+        with tempfile.TemporaryDirectory() as cacheDir:
+            distanceCalculator.loadDistanceMatrix(layout, cacheDir)
+            path = distanceCalculator.getCachePath(layout, cacheDir)
+
+            # Files that other users can write to are not trusted.
+            os.chmod(path, 0o666)
+            self.assertIsNone(distanceCalculator.readDistanceMatrix(path, wallsKey))
+
+            os.chmod(path, 0o600)
+            self.assertIsNotNone(distanceCalculator.readDistanceMatrix(path, wallsKey))
+
+    def test_disk_cache_opt_in(self):
+        previous = os.environ.pop(distanceCalculator.CACHE_DIR_ENV, None)
+        try:
+            self.assertIsNone(distanceCalculator.getCacheDir())
+
+            os.environ[distanceCalculator.CACHE_DIR_ENV] = '/some/dir'
+            self.assertEqual(distanceCalculator.getCacheDir(), '/some/dir')
+        finally:
+            os.environ.pop(distanceCalculator.CACHE_DIR_ENV, None)
+            if (previous is not None):
+                os.environ[distanceCalculator.CACHE_DIR_ENV] = previous
+
+    def test_disk_cache_corrupt(self):
+        with tempfile.TemporaryDirectory() as cacheDir:
+            path = os.path.join(cacheDir, 'bad' + distanceCalculator.CACHE_FILE_EXTENSION)
+            with open(path, 'wb') as file:
+                file.write(b'not a distance matrix')
+
+            wallsKey = distanceCalculator._getWallsKey(getLayout('mediumCapture'))
+            self.assertIsNone(distanceCalculator.readDistanceMatrix(path, wallsKey))
+            self.assertIsNone(distanceCalculator.readDistanceMatrix(path + '.missing', wallsKey))
+
+    def test_registry(self):
+        layout = getLayout('mediumCapture')
+
+        first = distanceCalculator.Distancer(layout)
+        first.getMazeDistances()
+
+        # A different layout object with the same walls.
+        second = distanceCalculator.Distancer(getLayout('mediumCapture'))
+        second.getMazeDistances()
+
+        self.assertIs(first._distances, second._distances)
+
+    def test_registry_limit(self):
+        previousLimit = distanceCalculator.MAX_REGISTERED_MATRICES
+        distanceCalculator.MAX_REGISTERED_MATRICES = 2
+
+        try:
+            layouts = [getLayout(name) for name in ['tinyMaze', 'smallMaze', 'mediumMaze']]
+            first = distanceCalculator.getDistanceMatrix(layouts[0])
+
+            for layout in layouts:
+                distanceCalculator.getDistanceMatrix(layout)
+                self.assertLessEqual(len(distanceCalculator._registry), 2)
+
+            # The oldest matrix was dropped (but still works for anyone holding it).
+            self.assertIsNot(distanceCalculator.getDistanceMatrix(layouts[0]), first)
+            self.assertEqual(distanceCalculator.getDistanceMatrix(layouts[0]).getData(),
+                    first.getData())
+        finally:
+            distanceCalculator.MAX_REGISTERED_MATRICES = previousLimit
+
+    @unittest.skipIf(distanceCalculator.shared_memory is None, 'Shared memory is not available.')
+    def test_shared_memory_release(self):
+        layout = getLayout('mediumCapture')
+        expected = distanceCalculator.computeDistanceMatrix(layout)
+
+        previous = os.environ.get(distanceCalculator.SHARED_MEMORY_TOKEN_ENV)
+        try:
+            with distanceCalculator.SharedDistanceMatrix(layout):
+                # Attach like a worker would.
+                distanceCalculator._registry.clear()
+                distances = distanceCalculator.getDistanceMatrix(layout)
+
+            memory = distances._memory
+            self.assertIsNotNone(memory)
+
+            # Dropping the matrix from the registry keeps its memory open while it is used.
+            distanceCalculator._registry.clear()
+            self.assertEqual(distances.getData(), expected.getData())
+            self.assertIsNotNone(memory.buf)
+
+            del distances
+            self.assertIsNone(memory.buf)
+        finally:
+            if (previous is None):
+                os.environ.pop(distanceCalculator.SHARED_MEMORY_TOKEN_ENV, None)
+            else:
+                os.environ[distanceCalculator.SHARED_MEMORY_TOKEN_ENV] = previous
+
+    @unittest.skipIf(distanceCalculator.shared_memory is None, 'Shared memory is not available.')
+    def test_shared_memory(self):
+        layout = getLayout('mediumCapture')
+        expected = distanceCalculator.computeDistanceMatrix(layout)
+        pairs = [(cell, expected.getCells()[0]) for cell in expected.getCells()]
+
+        with distanceCalculator.SharedDistanceMatrix(layout):
+            with multiprocessing.Pool(2) as pool:
+                distances = pool.map(_attachedDistance, pairs)
+
+        self.assertEqual(distances, [expected.getDistance(*pair) for pair in pairs])
+
+    @unittest.skipIf(distanceCalculator.shared_memory is None, 'Shared memory is not available.')
+    def test_shared_memory_stale(self):
+        layout = getLayout('mediumCapture')
+
+        # A segment left behind by another (crashed) run, full of garbage.
+        name = distanceCalculator.getSharedMemoryName(layout, 'deadbeef')
+        stale = distanceCalculator.shared_memory.SharedMemory(name = name, create = True,
+                size = 64)
+
+        previous = os.environ.get(distanceCalculator.SHARED_MEMORY_TOKEN_ENV)
+        try:
+            os.environ[distanceCalculator.SHARED_MEMORY_TOKEN_ENV] = 'deadbeef'
+            self.assertIsNone(distanceCalculator._attachDistanceMatrix(layout))
+
+            # Publishing is not affected by the stale segment.
+            with distanceCalculator.SharedDistanceMatrix(layout):
+                self.assertNotEqual(os.environ[distanceCalculator.SHARED_MEMORY_TOKEN_ENV],
+                        'deadbeef')
+        finally:
+            stale.close()
+            stale.unlink()
+
+            if (previous is None):
+                os.environ.pop(distanceCalculator.SHARED_MEMORY_TOKEN_ENV, None)
+            else:
+                os.environ[distanceCalculator.SHARED_MEMORY_TOKEN_ENV] = previous
+
+def _attachedDistance(pair):
+    distances = distanceCalculator._attachDistanceMatrix(getLayout('mediumCapture'))
+    return distances.getDistance(*pair)
+
+if __name__ == '__main__':
+    unittest.main()
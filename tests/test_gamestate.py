@@ -0,0 +1,221 @@
+import pickle
+import random
+import unittest
+
+from pacai.bin.capture import CaptureGameState
+from pacai.bin.pacman import PacmanGameState
+from pacai.core.agentstate import AgentState
+from pacai.core.layout import getLayout
+
+"""
+Test game state hashing, equality, and counts.
+"""
+class GameStateTest(unittest.TestCase):
+    def test_zobrist_hash(self):
+        layout = getLayout('smallClassic')
+        rng = random.Random(4)
+
+        state = PacmanGameState(layout)
+        for i in range(200):
+            if (state.isOver()):
+                break
+
+            agentIndex = i % state.getNumAgents()
+            action = rng.choice(state.getLegalActions(agentIndex))
+            state = state.generateSuccessor(agentIndex, action)
+
+            self.assertEqual(hash(state), self._fullHash(state))
+
+    def test_equal_states(self):
+        layout = getLayout('smallClassic')
+        rng = random.Random(10)
+
+        state = PacmanGameState(layout)
+        other = PacmanGameState(layout)
+        self.assertEqual(state, other)
+        self.assertEqual(hash(state), hash(other))
+
+        for i in range(50):
+            if (state.isOver()):
+                break
+
+            agentIndex = i % state.getNumAgents()
+            action = rng.choice(state.getLegalActions(agentIndex))
+            state = state.generateSuccessor(agentIndex, action)
+            other = other.generateSuccessor(agentIndex, action)
+
+            self.assertEqual(state, other)
+            self.assertEqual(hash(state), hash(other))
+
+    def test_shared_agent_states(self):
+        layout = getLayout('smallClassic')
+        rng = random.Random(3)
+
+        state = PacmanGameState(layout)
+        for i in range(100):
+            if (state.isOver()):
+                break
+
+            agentIndex = i % state.getNumAgents()
+            parentHash = hash(state)
+            parentAgents = [(agentState.getPosition(), agentState.getScaredTimer())
+                    for agentState in state.getAgentStates()]
+
+            action = rng.choice(state.getLegalActions(agentIndex))
+            successor = state.generateSuccessor(agentIndex, action)
+
+            # Agents that did not change are shared, and the parent never changes.
+            self.assertIs(successor.getAgentState((agentIndex + 1) % state.getNumAgents()),
+                    state.getAgentState((agentIndex + 1) % state.getNumAgents()))
+            self.assertEqual(hash(state), parentHash)
+            self.assertEqual(parentAgents, [(agentState.getPosition(), agentState.getScaredTimer())
+                    for agentState in state.getAgentStates()])
+
+            # Mutable agent states belong to one game state.
+            mutable = successor.getMutableAgentState(agentIndex)
+            self.assertIs(mutable, successor.getMutableAgentState(agentIndex))
+            self.assertIsNot(mutable, state.getAgentState(agentIndex))
+
+            state = successor
+
+    def test_apply_undo(self):
+        pacmanLayout = getLayout('smallClassic')
+        captureLayout = getLayout('tinyCapture')
+
+        newStates = [
+            lambda: PacmanGameState(pacmanLayout),
+            lambda: CaptureGameState(captureLayout, 1200),
+        ]
+
+        for newState in newStates:
+            rng = random.Random(7)
+
+            # Walk down the same line of play with successors and with applied moves.
+            line = [newState()]
+            walker = newState()
+            tokens = []
+
+            for i in range(1000):
+                if (walker.isOver()):
+                    break
+
+                agentIndex = i % walker.getNumAgents()
+                action = rng.choice(walker.getLegalActions(agentIndex))
+
+                line.append(line[-1].generateSuccessor(agentIndex, action))
+                tokens.append(walker.applyMove(agentIndex, action))
+
+                self.assertEqual(walker, line[-1])
+                self.assertEqual(hash(walker), hash(line[-1]))
+                self._checkCounts(walker)
+
+                # A successor made along the way is not changed by later moves or undoing.
+                if (i == 50):
+                    sideIndex = (agentIndex + 1) % walker.getNumAgents()
+                    sideAction = walker.getLegalActions(sideIndex)[0]
+                    side = walker.generateSuccessor(sideIndex, sideAction)
+                    expectedSide = line[-1].generateSuccessor(sideIndex, sideAction)
+
+            self.assertLess(walker.getNumFood(), line[0].getNumFood())
+
+            # Undo back to the start.
+            while (len(tokens) > 0):
+                line.pop()
+                walker.undoMove(tokens.pop())
+
+                self.assertEqual(walker, line[-1])
+                self.assertEqual(hash(walker), hash(line[-1]))
+                self._checkCounts(walker)
+
+            self.assertEqual(side, expectedSide)
+            self.assertEqual(hash(side), self._fullHash(expectedSide))
+
+            # Illegal moves leave the state as it was.
+            self.assertRaises(ValueError, walker.applyMove, 0, 'Nowhere')
+            self.assertEqual(walker, line[0])
+            self.assertEqual(hash(walker), hash(line[0]))
+
+    def test_agent_state_pickle(self):
+        agentState = AgentState((1, 2), 'North', True)
+        agentState.setScaredTimer(3)
+
+        copy = pickle.loads(pickle.dumps(agentState, protocol = pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy, agentState)
+        self.assertEqual(copy.getScaredTimer(), 3)
+
+        # Agent states used to be pickled as a plain dict.
+        old = AgentState.__new__(AgentState)
+        old.__setstate__({
+            '_startPosition': (1, 2), '_startDirection': 'North', '_startIsPacman': True,
+            '_position': (1, 2), '_direction': 'North', '_isPacman': True, '_scaredTimer': 3,
+        })
+        self.assertEqual(old, agentState)
+
+    def test_food_counts(self):
+        states = [
+            PacmanGameState(getLayout('smallClassic')),
+            CaptureGameState(getLayout('tinyCapture'), 1200),
+        ]
+
+        for state in states:
+            rng = random.Random(7)
+            initialFood = state.getNumFood()
+
+            for i in range(1000):
+                if (state.isOver()):
+                    break
+
+                agentIndex = i % state.getNumAgents()
+                action = rng.choice(state.getLegalActions(agentIndex))
+                successor = state.generateSuccessor(agentIndex, action)
+
+                # Eating in a successor does not change the parent.
+                self.assertEqual(state.getNumFood(), state.getFood().count())
+
+                state = successor
+                self._checkCounts(state)
+
+            self.assertLess(state.getNumFood(), initialFood)
+
+            # Counts are rebuilt for snapshots (even ones without counts).
+            stateClass, data = state.getSnapshot()
+            del data['_numFood']
+            self._checkCounts(stateClass.fromSnapshot((stateClass, data),
+                    state.getInitialLayout()))
+
+    def _checkCounts(self, state):
+        self.assertEqual(state.getNumFood(), state.getFood().count())
+        self.assertEqual(state.getNumCapsules(), len(state.getCapsules()))
+
+        if (isinstance(state, CaptureGameState)):
+            self.assertEqual(state.getNumRedFood(), state.getRedFood().count())
+            self.assertEqual(state.getNumBlueFood(), state.getBlueFood().count())
+            self.assertEqual(state.getNumRedCapsules(), len(state.getRedCapsules()))
+            self.assertEqual(state.getNumBlueCapsules(), len(state.getBlueCapsules()))
+
+    def _fullHash(self, state):
+        """
+        Compute a state's Zobrist hash from scratch.
+        """
+
+        table = state.getInitialLayout().getZobristTable()
+
+        hashCode = table.scoreKey(state.getScore())
+        hashCode ^= table.endKey(state.isOver(), state.isWin())
+
+        for (x, y) in state.getFood().asList():
+            hashCode ^= table.foodKey(x, y)
+
+        for (x, y) in state.getCapsules():
+            hashCode ^= table.capsuleKey(x, y)
+
+        for agentIndex in range(state.getNumAgents()):
+            agentState = state.getAgentState(agentIndex)
+            hashCode ^= table.agentKey(agentIndex, agentState.getPosition(),
+                    agentState.getDirection(), agentState.getScaredTimer(),
+                    agentState.isPacman())
+
+        return hash(hashCode)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from pacai.core.grid import Grid
+
+"""
+Test the bitboard-backed grid.
+"""
+class GridTest(unittest.TestCase):
+    def test_read_write(self):
+        grid = Grid(3, 4)
+        self.assertFalse(grid[2][3])
+
+        grid[2][3] = True
+        grid[0][1] = True
+        self.assertTrue(grid[2][3])
+        self.assertTrue(grid[0][1])
+        self.assertFalse(grid[1][1])
+
+        grid[2][3] = False
+        self.assertFalse(grid[2][3])
+
+        self.assertTrue(Grid(2, 2, initialValue = True)[1][1])
+
+    def test_copy(self):
+        grid = Grid(3, 4)
+        grid[1][2] = True
+
+        other = grid.copy()
+        self.assertEqual(grid, other)
+        self.assertEqual(hash(grid), hash(other))
+
+        other[1][2] = False
+        self.assertTrue(grid[1][2])
+        self.assertNotEqual(grid, other)
+
+    def test_count(self):
+        grid = Grid(3, 4)
+        grid[0][0] = True
+        grid[2][3] = True
+
+        self.assertEqual(grid.count(), 2)
+        self.assertEqual(grid.count(False), 10)
+        self.assertEqual(Grid(5, 5, initialValue = True).count(), 25)
+
+    def test_as_list(self):
+        grid = Grid(3, 4)
+        grid[2][1] = True
+        grid[0][3] = True
+        grid[1][0] = True
+
+        self.assertEqual(grid.asList(), [(0, 3), (1, 0), (2, 1)])
+        self.assertEqual(len(grid.asList(False)), 9)
+
+    def test_hash(self):
+        # The hash matches the value of the bit index (x * height + y).
+        grid = Grid(3, 4)
+        grid[1][2] = True
+        self.assertEqual(hash(grid), hash(1 << 6))
+
+    def test_bounds(self):
+        grid = Grid(3, 4)
+
+        with self.assertRaises(IndexError):
+            grid[3][0]
+
+        with self.assertRaises(IndexError):
+            grid[0][4] = True
+
+if __name__ == '__main__':
+    unittest.main()
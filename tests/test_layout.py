@@ -0,0 +1,46 @@
+import unittest
+
+from pacai.core.actions import Actions
+from pacai.core.directions import Directions
+from pacai.core.layout import getLayout
+
+LAYOUTS = ['mediumClassic', 'defaultCapture', 'tinyMaze']
+
+"""
+Test the precomputed layout tables.
+"""
+class LayoutTest(unittest.TestCase):
+    def test_possible_actions(self):
+        for layoutName in LAYOUTS:
+            layout = getLayout(layoutName)
+
+            for x in range(1, layout.getWidth() - 1):
+                for y in range(1, layout.getHeight() - 1):
+                    if (layout.isWall((x, y))):
+                        self.assertIsNone(layout.getPossibleActions((x, y)))
+                        continue
+
+                    expected = Actions.getPossibleActions((x, y), Directions.STOP, layout.walls)
+                    self.assertEqual(list(layout.getPossibleActions((x, y))), expected)
+
+    def test_ghost_actions(self):
+        layout = getLayout('mediumClassic')
+
+        for (x, y) in layout.walls.asList(False):
+            if (x in (0, layout.getWidth() - 1) or y in (0, layout.getHeight() - 1)):
+                continue
+
+            for direction in Directions.REVERSE:
+                actions = layout.getGhostActions((x, y), direction)
+                self.assertNotIn(Directions.STOP, actions)
+
+                reverse = Directions.REVERSE[direction]
+                if (len(actions) > 1):
+                    self.assertNotIn(reverse, actions)
+
+    def test_fractional_position(self):
+        layout = getLayout('mediumClassic')
+        self.assertIsNone(layout.getPossibleActions((1.5, 1)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import random
+import unittest
+
+from pacai.agents.capture.mcts import MCTSCaptureAgent
+from pacai.bin.capture import CaptureGameState
+from pacai.core.layout import getLayout
+
+"""
+Test the MCTS capture agent.
+"""
+class MCTSCaptureAgentTest(unittest.TestCase):
+    def test_choose_action(self):
+        random.seed(5)
+        layout = getLayout('defaultCapture')
+
+        state = CaptureGameState(layout, 1200)
+        expected = CaptureGameState(layout, 1200)
+
+        agent = MCTSCaptureAgent(0, simulations = 200)
+        agent.registerInitialState(state)
+
+        action = agent.getAction(state)
+        self.assertIn(action, state.getLegalActions(0))
+
+        # The search walks the state, but puts it back.
+        self.assertEqual(state, expected)
+        self.assertEqual(hash(state), hash(expected))
+        self.assertEqual(state.getNumFood(), expected.getNumFood())
+
+        stats = agent.getSimulationStats()
+        self.assertEqual(stats['simulations'], 200)
+        self.assertEqual(stats['lastSimulations'], 200)
+        self.assertGreater(stats['perSecond'], 0.0)
+
+    def test_tree_reuse(self):
+        random.seed(6)
+        state = CaptureGameState(getLayout('defaultCapture'), 1200)
+
+        agent = MCTSCaptureAgent(0, simulations = 500)
+        agent.registerInitialState(state)
+
+        action = agent.getAction(state)
+        self.assertEqual(agent.getSimulationStats()['lastReused'], 0)
+
+        # Every other agent makes its most explored move, so that part of the tree is kept.
+        node = agent._root.children[action]
+        state = state.generateSuccessor(0, action)
+
+        for agentIndex in range(1, state.getNumAgents()):
+            action = max(node.children, key = lambda action: node.children[action].visits)
+            node = node.children[action]
+            state = state.generateSuccessor(agentIndex, action)
+
+        agent.getAction(state)
+        self.assertEqual(agent.getSimulationStats()['lastReused'], node.visits - 500)
+        self.assertGreater(agent.getSimulationStats()['lastReused'], 0)
+
+    def test_move_time(self):
+        agent = MCTSCaptureAgent(0)
+        self.assertIsNone(agent.getMoveTime())
+
+        state = CaptureGameState(getLayout('defaultCapture'), 1200)
+        agent.registerInitialState(state)
+        self.assertRaises(ValueError, agent.getAction, state)
+
+        agent.setMoveWarningTime(1.0)
+        self.assertEqual(agent.getMoveTime(), 0.5)
+
+        agent = MCTSCaptureAgent(0, moveTime = 0.05)
+        agent.registerInitialState(state)
+        self.assertIn(agent.getAction(state), state.getLegalActions(0))
+        self.assertGreater(agent.getSimulationStats()['lastSimulations'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
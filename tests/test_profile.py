@@ -0,0 +1,89 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from pacai.agents.base import BaseAgent
+from pacai.bin import pacman
+from pacai.core import profile
+from pacai.core.layout import getLayout
+from pacai.ui.pacman.null import PacmanNullView
+
+"""
+Test profiling games.
+"""
+class ProfileTest(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(profile.percentile(values, 50), 50)
+        self.assertEqual(profile.percentile(values, 99), 99)
+        self.assertEqual(profile.percentile([3], 95), 3)
+        self.assertIsNone(profile.percentile([], 50))
+
+    def test_report(self):
+        unprofiled = _playGame(None)
+        original = pacman.PacmanGameState.__dict__['generateSuccessor']
+
+        profiler = profile.GameProfiler(useCProfile = True)
+        game = _playGame(profiler)
+
+        # Profiling does not change the game, and leaves the state class as it was.
+        self.assertEqual(game.state.getScore(), unprofiled.state.getScore())
+        self.assertIs(pacman.PacmanGameState.__dict__['generateSuccessor'], original)
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = os.path.join(tempDir, 'profile.json')
+            profiler.writeReport(path)
+
+            with open(path, 'r') as file:
+                report = json.load(file)
+
+            self.assertEqual(report['games'], 1)
+            self.assertEqual(report['moves'], len(game.moveHistory))
+            self.assertEqual(sum([agent['moves'] for agent in report['agents']]),
+                    len(game.moveHistory))
+            self.assertEqual(set(report['phases']), set(profile.GAME_PHASES))
+
+            # Greedy pacman looks at the successor of every legal action, random ghosts do not.
+            pacmanReport = report['agents'][0]
+            self.assertGreaterEqual(pacmanReport['successors']['count'], pacmanReport['moves'])
+            self.assertEqual(report['agents'][1]['successors']['count'], 0)
+
+            latencies = pacmanReport['getAction']
+            self.assertLessEqual(latencies['p50'], latencies['p95'])
+            self.assertLessEqual(latencies['p99'], latencies['max'])
+
+            for agent in report['agents']:
+                self.assertTrue(os.path.isfile(agent['cProfile']))
+
+    def test_in_place_successors(self):
+        original = pacman.PacmanGameState.__dict__.get('applyMove')
+
+        # Alpha-beta walks a single state with applyMove(), which still counts as successors.
+        profiler = profile.GameProfiler()
+        game = _playGame(profiler, 'AlphaBetaSearchAgent', {'depth': 1})
+
+        pacmanReport = profiler.getReport()['agents'][0]
+        self.assertGreater(pacmanReport['successors']['count'], 0)
+        self.assertGreaterEqual(pacmanReport['successors']['count'],
+                len([move for move in game.moveHistory if (move[0] == 0)]))
+
+        self.assertIs(pacman.PacmanGameState.__dict__.get('applyMove'), original)
+
+def _playGame(profiler, agentName = 'GreedyAgent', agentArgs = {}):
+    random.seed(1234)
+
+    layout = getLayout('smallClassic')
+    agent = BaseAgent.loadAgent(agentName, 0, agentArgs)
+    ghosts = [BaseAgent.loadAgent('RandomGhost', index) for index in range(1, 3)]
+
+    game = pacman.ClassicGameRules(30).newGame(layout, agent, ghosts, PacmanNullView())
+    game.profiler = profiler
+    game.run()
+
+    return game
+
+if __name__ == '__main__':
+    unittest.main()
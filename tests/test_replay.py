@@ -1,9 +1,16 @@
 import os
+import pickle
 import tempfile
 import unittest
 
 from pacai.bin import capture
 from pacai.bin import pacman
+from pacai.core.game import Game
+from pacai.core.layout import getLayout
+from pacai.core.replay import ReplayReader
+from pacai.core.replay import KEYFRAME
+from pacai.core.replay import KEYFRAME_LENGTH
+from pacai.core.replay import ReplayWriter
 
 PACMAN_FILENAME = 'pacai_unittest_pacman.replay'
 CAPTURE_FILENAME = 'pacai_unittest_capture.replay'
@@ -35,5 +42,153 @@ class ReplayTest(unittest.TestCase):
 
         os.remove(replayPath)
 
+    def test_multiple_games(self):
+        replayPath = os.path.join(tempfile.gettempdir(), PACMAN_FILENAME)
+
+        games = pacman.main(['--null-graphics', '-p', 'GreedyAgent', '--num-games', '3',
+                '--record', replayPath])
+
+        reader = ReplayReader(replayPath)
+        self.assertEqual(reader.getNumGames(), 3)
+
+        for i in range(3):
+            self.assertEqual(reader.getGame(i)['actions'], games[i].moveHistory)
+
+        pacman.main(['--null-graphics', '--replay', replayPath, '--replay-game', '2'])
+
+        os.remove(replayPath)
+
+    def test_parallel_keyframes(self):
+        replayPath = os.path.join(tempfile.gettempdir(), PACMAN_FILENAME)
+
+        games = pacman.main(['--null-graphics', '-p', 'GreedyAgent', '--num-games', '2',
+                '--seed', '1234', '--workers', '2', '--record', replayPath])
+
+        # Only games played on workers come back as results.
+        self.assertIsInstance(games[0], pacman.GameResult)
+        self.assertIsInstance(pacman.main(['--null-graphics', '-p', 'GreedyAgent'])[0], Game)
+
+        reader = ReplayReader(replayPath)
+        for i in range(2):
+            actions = games[i].moveHistory
+            self.assertGreater(len(actions), 100)
+
+            game = reader.getGame(i, len(actions))
+            self.assertEqual(game['actions'], actions)
+
+            moveNumber, state = game['keyframe']
+            self.assertEqual(moveNumber, len(actions) - (len(actions) % 100))
+
+            # The keyframe should match simulating every move up to it.
+            expected = pacman.PacmanGameState(game['layout'])
+            for action in actions[:moveNumber]:
+                expected = expected.generateSuccessor(*action)
+
+            self.assertEqual(_describe(state), _describe(expected))
+
+            # And the final state should match simulating every move.
+            for action in actions[moveNumber:]:
+                expected = expected.generateSuccessor(*action)
+
+            self.assertEqual(_describe(games[i].state), _describe(expected))
+
+        os.remove(replayPath)
+
+    def test_unfinished_file(self):
+        replayPath = os.path.join(tempfile.gettempdir(), CAPTURE_FILENAME)
+        layout = getLayout('mediumCapture')
+        moves = [(0, 'North'), (1, 'South'), (2, 'Stop'), (3, 'West')]
+
+        # Write a file without an index (like if the writer was killed).
+        writer = ReplayWriter(replayPath)
+        writer.startGame(layout, length = 10)
+        writer.recordMoves(moves)
+        writer.endGame()
+        writer.startGame(layout, length = 20)
+        writer.recordMoves(moves[:2])
+        writer._file.close()
+
+        reader = ReplayReader(replayPath)
+        self.assertEqual(reader.getNumGames(), 2)
+        self.assertEqual(reader.getGame(0)['actions'], moves)
+        self.assertEqual(reader.getGame(0)['length'], 10)
+        self.assertEqual(reader.getGame(1)['actions'], moves[:2])
+        self.assertEqual(reader.getGame(1)['layout'].layoutText, layout.layoutText)
+
+        # Cut the file off inside a keyframe: just after its marker, and part way into it.
+        state = capture.CaptureGameState(layout, 20)
+        writer = ReplayWriter(replayPath, keyframeInterval = 2)
+        writer.startGame(layout, length = 20)
+        writer.recordMoves(moves[:3])
+        # The keyframe comes right after the last move.
+        keyframeStart = writer._file.tell() + 1
+        writer.recordMove(*moves[3], state = state)
+        writer._file.close()
+
+        with open(replayPath, 'rb') as file:
+            data = file.read()
+
+        self.assertEqual(data[keyframeStart], KEYFRAME)
+        for cut in [keyframeStart + 1, keyframeStart + 1 + KEYFRAME_LENGTH.size + 2]:
+            with open(replayPath, 'wb') as file:
+                file.write(data[:cut])
+
+            reader = ReplayReader(replayPath)
+            self.assertEqual(reader.getNumGames(), 1)
+
+            game = reader.getGame(0, len(moves))
+            self.assertEqual(game['actions'], moves)
+            self.assertIsNone(game['keyframe'])
+
+        os.remove(replayPath)
+
+    def test_keyframes(self):
+        replayPath = os.path.join(tempfile.gettempdir(), CAPTURE_FILENAME)
+
+        capture.main(['--null-graphics', '--record', replayPath, '--max-moves', '300'])
+
+        reader = ReplayReader(replayPath)
+        actions = reader.getGame()['actions']
+        startMove = len(actions) - 5
+
+        game = reader.getGame(0, startMove)
+        self.assertEqual(game['startMove'], startMove)
+
+        moveNumber, state = game['keyframe']
+        self.assertEqual(moveNumber, startMove - (startMove % 100))
+
+        # The keyframe should match simulating every move up to it.
+        expected = capture.CaptureGameState(game['layout'], 300)
+        for action in actions[:moveNumber]:
+            expected = expected.generateSuccessor(*action)
+
+        self.assertEqual(state, expected)
+        self.assertEqual(hash(state), hash(expected))
+        self.assertEqual(state.getTimeleft(), expected.getTimeleft())
+
+        self.assertIsNone(reader.getGame(0, 50)['keyframe'])
+
+        capture.main(['--null-graphics', '--replay', replayPath, '--replay-start', str(startMove)])
+
+        os.remove(replayPath)
+
+    def test_pickle_replay(self):
+        replayPath = os.path.join(tempfile.gettempdir(), PACMAN_FILENAME)
+
+        games = pacman.main(['--null-graphics', '-p', 'GreedyAgent', '--layout', 'smallClassic'])
+        components = {'layout': getLayout('smallClassic'), 'actions': games[0].moveHistory}
+        with open(replayPath, 'wb') as file:
+            pickle.dump(components, file)
+
+        self.assertEqual(ReplayReader(replayPath).getGame()['actions'], games[0].moveHistory)
+        pacman.main(['--null-graphics', '--replay', replayPath])
+
+        os.remove(replayPath)
+
+def _describe(state):
+    # States on different layout objects are never equal, so only compare what is on the board.
+    return (state.getScore(), state.getFood(), state.getPacmanPosition(),
+            state.getGhostPositions())
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,32 @@
+import contextlib
+import io
+import os
+import random
+import re
 import shutil
 import subprocess
+import sys
+import tempfile
 import unittest
 
+from PIL import Image
+from PIL import ImageChops
+
+from pacai.agents.ghost.random import RandomGhost
+from pacai.agents.greedy import GreedyAgent
+from pacai.bin import capture
+from pacai.bin import pacman
+from pacai.core.layout import getLayout
+from pacai.ui import frame as uiframe
+from pacai.ui import spritesheet
+from pacai.ui import view
+from pacai.ui.capture.frame import CaptureFrame
+from pacai.ui.frame import BoardImageCache
+from pacai.ui.gui import DirtyRegionRenderer
+from pacai.ui.pacman.frame import PacmanFrame
+from pacai.ui.pacman.null import PacmanNullView
+from pacai.ui.pacman.text import PacmanTextView
+
 """
 Test standard graphics under xvfb.
 """
@@ -51,5 +76,254 @@ class UITest(unittest.TestCase):
 
         subprocess.run(args, shell = False, check = True)
 
+    def test_gif(self):
+        for thread in [False, True]:
+            with tempfile.TemporaryDirectory() as tempDir:
+                gifPath = os.path.join(tempDir, 'game.gif')
+
+                args = ['--null-graphics', '-p', 'GreedyAgent', '--layout', 'smallClassic',
+                        '--gif', gifPath, '--gif-skip-frames', '1']
+                if (thread):
+                    args.append('--gif-thread')
+
+                games = pacman.main(args)
+
+                with Image.open(gifPath) as image:
+                    # One frame for each move, plus the initial state.
+                    self.assertEqual(image.n_frames, len(games[0].moveHistory) + 1)
+                    self.assertEqual(image.info['loop'], 0)
+
+    def test_headless_without_pil(self):
+        # Run in a fresh interpreter, since other tests have already loaded PIL.
+        code = '; '.join([
+            'import sys',
+            'from pacai.bin import pacman',
+            "pacman.main(['--null-graphics', '-p', 'GreedyAgent', '--layout', 'testClassic'])",
+            "assert ('PIL' not in sys.modules), 'PIL was loaded.'",
+        ])
+
+        subprocess.run([sys.executable, '-c', code], shell = False, check = True)
+
+    def test_text_ansi(self):
+        args = ['--text-graphics', '-p', 'GreedyAgent', '--layout', 'smallClassic', '-s', '5', '-q']
+
+        plain = io.StringIO()
+        with contextlib.redirect_stdout(plain):
+            pacman.main(args)
+
+        ansi = io.StringIO()
+        with contextlib.redirect_stdout(ansi):
+            pacman.main(args + ['--text-ansi'])
+
+        # The in-place screen should end up looking like the last full frame.
+        lastFrame = plain.getvalue().strip('\n').split('\n\n')[-1]
+        screen = _emulateTerminal(ansi.getvalue())
+
+        self.assertEqual(screen.strip('\n'), lastFrame)
+        self.assertLess(len(ansi.getvalue()), len(plain.getvalue()))
+
+    def test_lazy_frames(self):
+        layout = getLayout('smallClassic')
+
+        nullView = CountingNullView()
+        self._playGame(layout, nullView)
+        self.assertEqual(nullView.createdFrames, 0)
+
+        # Text views only draw after pacman moves (and at the end).
+        textView = CountingTextView()
+        with contextlib.redirect_stdout(io.StringIO()):
+            game = self._playGame(layout, textView)
+
+        pacmanMoves = len([move for move in game.moveHistory if (move[0] == 0)])
+        self.assertLessEqual(textView.createdFrames, pacmanMoves + 2)
+
+    def _playGame(self, layout, display):
+        random.seed(11)
+
+        agents = [GreedyAgent(0)] + [RandomGhost(i + 1) for i in range(2)]
+        game = pacman.ClassicGameRules().newGame(layout, agents[0], agents[1:], display)
+        game.run()
+
+        return game
+
+    def test_board_cache(self):
+        sprites = spritesheet.getSpriteSheet(view.DEFAULT_SPRITES)
+        cache = BoardImageCache()
+        rng = random.Random(7)
+
+        state = pacman.PacmanGameState(getLayout('smallClassic'))
+        initialFood = state.getNumFood()
+
+        for i in range(60):
+            if (state.isOver()):
+                break
+
+            agentIndex = i % state.getNumAgents()
+            action = rng.choice(state.getLegalActions(agentIndex))
+            state = state.generateSuccessor(agentIndex, action)
+
+            frame = PacmanFrame(i, state, i)
+            expected = frame.toImage(sprites)
+            actual = frame.toImage(sprites, cache = cache)
+
+            self.assertIsNone(ImageChops.difference(expected, actual).getbbox())
+
+        # Make sure the cache had to redraw some cells.
+        self.assertLess(state.getNumFood(), initialFood)
+
+    def test_wall_board_limit(self):
+        first = capture.CaptureGameState(capture.loadLayout('RANDOM1'), 100)
+        board = CaptureFrame(0, first, 0)._getWallBoard(first)
+
+        # The same walls share a board.
+        self.assertIs(CaptureFrame(1, first, 1)._getWallBoard(first), board)
+
+        for seed in range(2, uiframe.MAX_WALL_BOARDS + 4):
+            state = capture.CaptureGameState(capture.loadLayout('RANDOM%d' % (seed)), 100)
+            CaptureFrame(0, state, 0)._getWallBoard(state)
+
+            self.assertLessEqual(len(uiframe._wallBoards), uiframe.MAX_WALL_BOARDS)
+
+        # The oldest board was dropped, but can be built again.
+        rebuilt = CaptureFrame(0, first, 0)._getWallBoard(first)
+        self.assertIsNot(rebuilt, board)
+        self.assertEqual(rebuilt, board)
+
+    def test_dirty_regions(self):
+        sprites = spritesheet.getSpriteSheet(view.DEFAULT_SPRITES)
+        canvas = FakeCanvas()
+        font = view.getFont()
+        renderer = FakeRenderer(canvas, sprites, font)
+        rng = random.Random(3)
+
+        state = pacman.PacmanGameState(getLayout('smallClassic'))
+        for i in range(40):
+            if (state.isOver()):
+                break
+
+            agentIndex = i % state.getNumAgents()
+            action = rng.choice(state.getLegalActions(agentIndex))
+            state = state.generateSuccessor(agentIndex, action)
+
+            frame = PacmanFrame(i, state, i)
+
+            canvas.updates = 0
+            renderer.draw(frame, frame.getImageWidth(), frame.getImageHeight())
+
+            expected = frame.toImage(sprites, font)
+            actual = canvas.render(expected.size)
+            self.assertIsNone(ImageChops.difference(expected, actual).getbbox())
+
+            # After the first frame, only the agents and a few cells should be touched.
+            if (i > 0):
+                self.assertLess(canvas.updates, 10)
+
+def _emulateTerminal(output):
+    """
+    Apply the (few) ANSI codes used by the text view to a blank screen.
+    """
+
+    screen = {}
+    row = 1
+    column = 1
+
+    for part in re.split(r'(\x1b\[[^A-Za-z]*[A-Za-z])', output):
+        if (part.startswith('\x1b')):
+            if (part.endswith('H')):
+                row, column = [int(value) for value in part[2:-1].split(';')]
+            elif (part == '\x1b[2J'):
+                screen = {}
+            elif (part == '\x1b[K'):
+                for key in [key for key in screen if (key[0] == row and key[1] >= column)]:
+                    del screen[key]
+
+            continue
+
+        for char in part:
+            if (char == '\n'):
+                row += 1
+                column = 1
+            else:
+                screen[(row, column)] = char
+                column += 1
+
+    lines = []
+    for lineRow in range(1, max([key[0] for key in screen]) + 1):
+        columns = [key[1] for key in screen if (key[0] == lineRow)]
+        width = max(columns + [0])
+        lines.append(''.join([screen.get((lineRow, i), ' ') for i in range(1, width + 1)]))
+
+    return '\n'.join(lines)
+
+class CountingNullView(PacmanNullView):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.createdFrames = 0
+
+    def _createFrame(self, state):
+        self.createdFrames += 1
+        return super()._createFrame(state)
+
+class CountingTextView(PacmanTextView):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.createdFrames = 0
+
+    def _createFrame(self, state):
+        self.createdFrames += 1
+        return super()._createFrame(state)
+
+class FakeRenderer(DirtyRegionRenderer):
+    """
+    A renderer that keeps PIL images (since there is no Tk to convert them for).
+    """
+
+    def _toPhotoImage(self, image):
+        return image
+
+class FakeCanvas(object):
+    """
+    Just enough of a Tk canvas to track image items.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.updates = 0
+
+    def config(self, **kwargs):
+        pass
+
+    def coords(self, item, x, y):
+        self.items[item]['coords'] = (x, y)
+        self.updates += 1
+
+    def create_image(self, x, y, image = None, anchor = None, tags = None):
+        item = len(self.items) + 1
+        self.items[item] = {'coords': (x, y), 'image': image}
+        return item
+
+    def delete(self, tag):
+        self.items = {}
+
+    def itemconfig(self, item, image = None):
+        self.items[item]['image'] = image
+        self.updates += 1
+
+    def render(self, size):
+        # Items are drawn in the order they were created.
+        image = Image.new('RGB', size, (0, 0, 0))
+        for item in sorted(self.items):
+            sprite = self.items[item]['image']
+            if (sprite is None or sprite == ''):
+                continue
+
+            mask = None
+            if (sprite.mode == 'RGBA'):
+                mask = sprite
+
+            image.paste(sprite, self.items[item]['coords'], mask)
+
+        return image
+
 if __name__ == '__main__':
     unittest.main()